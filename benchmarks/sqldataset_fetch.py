@@ -0,0 +1,88 @@
+"""Benchmark of SQLDataset row fetching against SQLite.
+
+Compares the per-row cost of fetching rows one by one (``cursor.fetchone``)
+with the batched ``cursor.fetchmany`` used by :class:`onmydesk.core.datasets.SQLDataset`.
+
+Usage::
+
+    $ python benchmarks/sqldataset_fetch.py [rows]
+"""
+
+import os
+import sys
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}})
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from onmydesk.core.datasets import SQLDataset  # noqa: E402
+
+QUERY = 'SELECT * FROM bench_ledger'
+
+
+def create_table(rows):
+    cursor = connection.cursor()
+    cursor.execute('DROP TABLE IF EXISTS bench_ledger')
+    cursor.execute('CREATE TABLE bench_ledger (id INTEGER PRIMARY KEY, account TEXT, '
+                   'amount REAL, description TEXT)')
+    cursor.executemany(
+        'INSERT INTO bench_ledger (id, account, amount, description) VALUES (%s, %s, %s, %s)',
+        ((i, 'account-{}'.format(i % 100), i * 1.5, 'entry {}'.format(i)) for i in range(rows)))
+    cursor.close()
+
+
+def iterate_fetchone():
+    """Previous SQLDataset.iterate implementation (a fetchone call for each row)."""
+    cursor = connection.cursor()
+    cursor.execute(QUERY, [])
+    cols = tuple(c[0] for c in cursor.description)
+
+    one = cursor.fetchone()
+    while one is not None:
+        yield OrderedDict(zip(cols, one))
+        one = cursor.fetchone()
+
+    cursor.close()
+
+
+def iterate_fetchmany(fetch_size):
+    with SQLDataset(QUERY, fetch_size=fetch_size) as dataset:
+        for row in dataset.iterate():
+            yield row
+
+
+def measure(label, iterable, rows):
+    start = timer()
+    count = 0
+    for _ in iterable:
+        count += 1
+    elapsed = timer() - start
+
+    assert count == rows, 'Expected {} rows, got {}'.format(rows, count)
+
+    print('{:<24} {:>10.3f} s {:>10.3f} us/row'.format(label, elapsed, elapsed / rows * 1e6))
+    return elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+    create_table(rows)
+    print('Fetching {} rows from SQLite'.format(rows))
+
+    baseline = measure('fetchone', iterate_fetchone(), rows)
+    for fetch_size in (100, 1000, 10000):
+        elapsed = measure('fetchmany({})'.format(fetch_size), iterate_fetchmany(fetch_size), rows)
+        print('{:<24} {:>10.2f}x'.format('', baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
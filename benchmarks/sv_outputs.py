@@ -0,0 +1,98 @@
+"""Benchmark of CSVOutput and TSVOutput throughput.
+
+Compares the previous serialization (a list of `str` values built for each row and written
+with ``writerow``) with the current :class:`onmydesk.core.outputs.SVOutput` one (rows given
+as they are to ``writerows``), in rows per second of CPU time.
+
+Usage::
+
+    $ python benchmarks/sv_outputs.py [rows]
+"""
+
+import os
+import sys
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from time import process_time as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from onmydesk.core.outputs import CSVOutput, TSVOutput  # noqa: E402
+
+BATCH_SIZE = 1000
+
+
+def gen_rows(rows):
+    for i in range(rows):
+        yield OrderedDict([
+            ('id', i),
+            ('account', 'account-{}'.format(i % 100)),
+            ('amount', Decimal(i) / 100),
+            ('rate', i * 1.5),
+            ('created', date(2016, 1 + i % 12, 1 + i % 28)),
+            ('description', 'entry {}'.format(i)),
+        ])
+
+
+def write_str_rows(output, rows):
+    """Previous SVOutput.out implementation."""
+    for content in rows:
+        output.writer.writerow([str(i) for i in content.values()])
+
+
+def write_rows(output, rows):
+    for content in rows:
+        output.out(content)
+
+
+def write_batches(output, rows):
+    batch = []
+    for content in rows:
+        batch.append(content)
+        if len(batch) >= BATCH_SIZE:
+            output.out_many(batch)
+            batch = []
+    output.out_many(batch)
+
+
+def measure(label, output, write, rows, repeat=3):
+    """Return best time of `repeat` runs."""
+    data = list(gen_rows(rows))
+
+    elapsed = None
+    for _ in range(repeat):
+        start = timer()
+        with output:
+            write(output, data)
+        run = timer() - start
+
+        os.remove(output.filepath)
+        elapsed = run if elapsed is None else min(elapsed, run)
+
+    print('{:<32} {:>10.3f} s {:>12.0f} rows/s'.format(label, elapsed, rows / elapsed))
+    return elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    print('Writing {} rows'.format(rows))
+
+    for output_class in (CSVOutput, TSVOutput):
+        name = output_class.__name__
+        baseline = measure('{} str lists'.format(name), output_class(), write_str_rows, rows)
+
+        variants = (
+            ('{} out'.format(name), output_class(), write_rows),
+            ('{} out_many'.format(name), output_class(), write_batches),
+            ('{} out_many (1MB buffer)'.format(name),
+             output_class(buffer_size=1024 * 1024), write_batches),
+        )
+        for label, output, write in variants:
+            elapsed = measure(label, output, write, rows)
+            print('{:<32} {:>10.2f}x'.format('', baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark of XLSXOutput column width strategies.
+
+Compares the CPU time spent computing column widths by each width strategy of
+:class:`onmydesk.core.outputs.XLSXOutput` (40 columns by default). Only the code measuring
+rows (`_measure_row` and `get_column_widths`) is timed: the rest of an export (values
+written by xlsxwriter) costs the same with any strategy, and its run to run noise would
+hide the saving.
+
+Each measure is repeated and the best time is kept.
+
+Usage::
+
+    $ python benchmarks/xlsx_widths.py [rows] [columns] [repeat]
+"""
+
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from time import process_time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from onmydesk.core.outputs import XLSXOutput  # noqa: E402
+
+# Rows are generated once and reused by width computation, so it's the only code timed
+CHUNK_SIZE = 10000
+
+
+def gen_rows(rows, columns):
+    kinds = (
+        lambda i: 'customer-{}'.format(i),
+        lambda i: i,
+        lambda i: i * 1.5,
+        lambda i: Decimal(i) / 100,
+        lambda i: date(2016, 1 + i % 12, 1 + i % 28),
+    )
+    values = [kinds[c % len(kinds)] for c in range(columns)]
+
+    for i in range(rows):
+        yield [v(i) for v in values]
+
+
+def best_of(repeat, func):
+    return min(func() for _ in range(repeat))
+
+
+def measure_widths(output, rows, chunk):
+    with output:
+        output.header(['column_{}'.format(c) for c in range(len(chunk[0]))])
+        measure_row = output._measure_row
+
+        start = process_time()
+        for _ in range(rows // len(chunk)):
+            for row in chunk:
+                measure_row(row)
+        for row in chunk[:rows % len(chunk)]:
+            measure_row(row)
+        output.get_column_widths()
+        elapsed = process_time() - start
+
+    for filepath in output.filepaths:
+        os.remove(filepath)
+
+    return elapsed
+
+
+def report(label, elapsed, rows, baseline=None):
+    line = '{:<24} {:>10.3f} s {:>10.3f} us/row'.format(label, elapsed, elapsed / rows * 1e6)
+    if baseline is not None:
+        line += ' {:>8.1f}% CPU saved'.format((1 - elapsed / baseline) * 100)
+    print(line)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    strategies = (
+        ('full', dict(width_strategy=XLSXOutput.WIDTH_FULL)),
+        ('first_rows(1000)', dict(width_strategy=XLSXOutput.WIDTH_FIRST_ROWS)),
+        ('sample(1000)', dict(width_strategy=XLSXOutput.WIDTH_SAMPLE)),
+        ('fixed', dict(width_strategy=XLSXOutput.WIDTH_FIXED, column_widths=[15] * columns)),
+    )
+
+    chunk = list(islice(gen_rows(CHUNK_SIZE, columns), min(rows, CHUNK_SIZE)))
+
+    print('Width computation of {} rows with {} columns (best of {})'.format(
+        rows, columns, repeat))
+    baseline = None
+    for label, kwargs in strategies:
+        elapsed = best_of(repeat, lambda: measure_widths(
+            XLSXOutput(constant_memory=True, **kwargs), rows, chunk))
+        report(label, elapsed, rows, baseline)
+        baseline = baseline or elapsed
+
+
+if __name__ == '__main__':
+    main()
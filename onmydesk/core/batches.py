@@ -0,0 +1,114 @@
+"""Row batches from library.
+
+A row batch keeps many rows stored by column, so datasets, cleaners and outputs can handle
+them with a few calls (vectorized with NumPy when it's installed).
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RowBatch(object):
+    """A batch of rows stored by column (columnar).
+
+    Each column is a NumPy array when NumPy is installed (and `use_numpy` is True), or a
+    list otherwise. E.g.::
+
+        batch = RowBatch.from_rows(('name', 'amount'), [('Alisson', 10.5), ('Joao', 2)])
+
+        batch['amount'] = batch['amount'] * 100   # Vectorized with NumPy
+        print(batch['amount'].sum())
+
+        for row in batch:
+            print(row)   # --> ('Alisson', 1050.0)
+
+    Numeric columns use NumPy numeric types, other ones (strings, dates, decimals, None
+    values) use object arrays.
+    """
+
+    def __init__(self, columns, arrays, use_numpy=True):
+        """Class initializer.
+
+        :param list columns: Column names.
+        :param list arrays: One sequence of values for each column.
+        :param bool use_numpy: Store columns as NumPy arrays when it's installed.
+        """
+        self.columns = tuple(columns)
+        self.use_numpy = use_numpy and numpy is not None
+        self.arrays = [self._to_array(a) for a in arrays]
+
+        if len(self.columns) != len(self.arrays):
+            raise ValueError('Got {} columns and {} arrays'.format(
+                len(self.columns), len(self.arrays)))
+
+    @classmethod
+    def from_rows(cls, columns, rows, use_numpy=True):
+        """Return a batch built from rows (sequences or dicts).
+
+        :param list columns: Column names. If None, dict keys from the first row or
+            column indexes are used.
+        :param list rows: Rows to be stored.
+        :param bool use_numpy: Store columns as NumPy arrays when it's installed.
+        :returns: Batch with rows.
+        :rtype: RowBatch
+        """
+        rows = list(rows)
+
+        if rows and isinstance(rows[0], dict):
+            columns = columns or tuple(rows[0].keys())
+            rows = [tuple(r.values()) for r in rows]
+        elif columns is None:
+            columns = tuple(range(len(rows[0]))) if rows else ()
+
+        arrays = list(zip(*rows)) if rows else [() for _ in columns]
+        return cls(columns, arrays, use_numpy=use_numpy)
+
+    def __len__(self):
+        """Return number of rows."""
+        return len(self.arrays[0]) if self.arrays else 0
+
+    def __iter__(self):
+        """Iterate over rows (tuples)."""
+        return self.rows()
+
+    def __getitem__(self, name):
+        """Return a column given its name."""
+        return self.arrays[self.columns.index(name)]
+
+    def __setitem__(self, name, values):
+        """Replace a column or add a new one (a computed column, for example)."""
+        values = self._to_array(values)
+
+        if self.arrays and len(values) != len(self):
+            raise ValueError('Column "{}" has {} values, expected {}'.format(
+                name, len(values), len(self)))
+
+        if name in self.columns:
+            self.arrays[self.columns.index(name)] = values
+        else:
+            self.columns += (name,)
+            self.arrays.append(values)
+
+    def rows(self):
+        """Return an iterator with rows as tuples of python values."""
+        return zip(*[a.tolist() if hasattr(a, 'tolist') else a for a in self.arrays])
+
+    def _to_array(self, values):
+        if not hasattr(values, '__len__'):
+            values = list(values)
+
+        if not self.use_numpy:
+            return values if isinstance(values, list) else list(values)
+
+        if isinstance(values, numpy.ndarray):
+            return values
+
+        array = numpy.asarray(values)
+        if array.dtype.kind not in 'biuf':
+            # Strings, dates and mixed values are kept as python objects
+            array = numpy.empty(len(values), dtype=object)
+            array[:] = values
+
+        return array
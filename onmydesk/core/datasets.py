@@ -5,11 +5,18 @@ Datasets are used to get data from any source and return them to reports in a si
 
 from abc import ABCMeta, abstractmethod
 from collections import OrderedDict
+from datetime import timedelta
+from itertools import chain, islice
+from multiprocessing import Pool, cpu_count
 
-from django.db import connection, connections
+from django.db import connection, connections, transaction
 
+from onmydesk.core.batches import RowBatch
 from onmydesk.utils import with_metaclass
 
+_WAIT_TIMEOUT = 0.1
+"""Seconds waited for a partition before checking if another one finished first."""
+
 
 @with_metaclass(ABCMeta)
 class BaseDataset(object):
@@ -33,6 +40,12 @@ class BaseDataset(object):
                 print(row)
     """
 
+    ROW_DICT = 'dict'
+    ROW_TUPLE = 'tuple'
+
+    columns = None
+    """Column names of the rows returned by :func:`iterate`, when dataset knows them."""
+
     @abstractmethod
     def iterate(self, params=None):
         """Return an iterable object.
@@ -41,6 +54,26 @@ class BaseDataset(object):
         """
         raise NotImplemented()
 
+    def iterate_batches(self, params=None, batch_size=1000):
+        """Return an iterable with rows grouped in columnar batches.
+
+        Rows from :func:`iterate` (sequences or dicts) are grouped in batches. Datasets able
+        to read rows in batches should override it.
+
+        :param dict params: Parameters to be used by dataset
+        :param int batch_size: Number of rows by batch.
+        :returns: Batches with rows.
+        :rtype: Iterator with :class:`onmydesk.core.batches.RowBatch` items.
+        """
+        rows = iter(self.iterate(params=params))
+        return self._group_batches(rows, batch_size)
+
+    def _group_batches(self, rows, batch_size):
+        batch = list(islice(rows, batch_size))
+        while batch:
+            yield RowBatch.from_rows(self.columns, batch)
+            batch = list(islice(rows, batch_size))
+
     def __enter__(self):
         """*Enter* from context manager to lock some resource (for example)."""
         return self
@@ -70,26 +103,57 @@ class SQLDataset(BaseDataset):
 
             # RIGHT WAY:
             mydataset = SQLDataset('SELECT * FROM users where age > %d', [18])
+
+    Rows are OrderedDicts by default. With `row_mode=SQLDataset.ROW_TUPLE` rows are plain
+    tuples (as returned by database) and column names are available at :attr:`columns`
+    once :func:`iterate` is called. It avoids a dict allocation for each row.
+
+    To export results larger than the available memory use `server_side=True`. On PostgreSQL
+    it opens a named (server side) cursor and rows are streamed from the server `itersize`
+    rows at a time. Backends without server side cursors (SQLite, MySQL) and databases with
+    `DISABLE_SERVER_SIDE_CURSORS` setting fall back to a regular cursor.
     """
 
-    def __init__(self, query, query_params=[], db_alias=None):
+    fetch_size = 1000
+    """Default number of rows fetched from database on each round trip."""
+
+    itersize = 2000
+    """Default number of rows transferred by each fetch from a server side cursor."""
+
+    def __init__(self, query, query_params=[], db_alias=None, fetch_size=None,
+                 server_side=False, itersize=None, row_mode=BaseDataset.ROW_DICT):
         """Init method.
 
         :param str query: Raw sql query.
         :param list query_params: Params to be evaluated with query.
         :param str db_alias: Database alias from django settings. Optional.
+        :param int fetch_size: Number of rows fetched by each `cursor.fetchmany` call.
+            Optional, default is :attr:`fetch_size`.
+        :param bool server_side: Use a server side cursor when database backend supports it.
+        :param int itersize: Number of rows transferred by each fetch from a server side
+            cursor. Optional, default is :attr:`itersize`.
+        :param str row_mode: :attr:`ROW_DICT` (default) to get OrderedDict rows or
+            :attr:`ROW_TUPLE` to get tuple rows.
         """
         self.query = query
         self.query_params = query_params
         self.db_alias = db_alias
+        self.fetch_size = fetch_size or self.fetch_size
+        self.server_side = server_side
+        self.itersize = itersize or self.itersize
+        self.row_mode = row_mode
+        self.columns = None
         self.cursor = None
+        self._batch_size = self.fetch_size
 
     def iterate(self, params=None):
-        """Return an iterable rows (ordered dicts).
+        """Return an iterable rows (ordered dicts or tuples, see `row_mode`).
+
+        Query is executed by this call, so :attr:`columns` is filled when it returns.
 
         :param dict params: Parameters to be used by dataset.
         :returns: Rows from query result.
-        :rtype: Iterator with OrderedDict items.
+        :rtype: Iterator with OrderedDict (or tuple) items.
         """
         # Used if we are not using context manager
         has_cursor = bool(self.cursor)
@@ -97,17 +161,67 @@ class SQLDataset(BaseDataset):
             self._init_cursor()
 
         self.cursor.execute(self.query, self.query_params)
-        cols = tuple(c[0] for c in self.cursor.description)
 
-        one = self.cursor.fetchone()
-        while one is not None:
-            row = OrderedDict(zip(cols, one))
-            yield row
-            one = self.cursor.fetchone()
+        # Rows are fetched in batches to avoid a driver round trip for each row
+        rows = self.cursor.fetchmany(self._batch_size)
+
+        # Server side cursors only have a description after the first fetch
+        self.columns = tuple(c[0] for c in self.cursor.description)
+
+        return self._iterate_rows(rows, close_cursor=not has_cursor)
+
+    def iterate_batches(self, params=None, batch_size=None):
+        """Return an iterable with query rows grouped in columnar batches.
+
+        Rows fetched by each round trip are stored in a batch as they come from database,
+        without building a dict for each row. Query is executed by this call.
 
+        :param dict params: Parameters to be used by dataset.
+        :param int batch_size: Number of rows by batch. Optional, default is the number of
+            rows by round trip (`fetch_size` or `itersize`).
+        :returns: Batches with rows.
+        :rtype: Iterator with :class:`onmydesk.core.batches.RowBatch` items.
+        """
+        has_cursor = bool(self.cursor)
         if not has_cursor:
+            self._init_cursor()
+
+        batch_size = batch_size or self._batch_size
+
+        self.cursor.execute(self.query, self.query_params)
+        rows = self.cursor.fetchmany(batch_size)
+        self.columns = tuple(c[0] for c in self.cursor.description)
+
+        return self._iterate_batches(rows, batch_size, close_cursor=not has_cursor)
+
+    def _iterate_batches(self, rows, batch_size, close_cursor):
+        while rows:
+            yield RowBatch.from_rows(self.columns, rows)
+            rows = self.cursor.fetchmany(batch_size)
+
+        if close_cursor:
+            self._close_cursor()
+
+    def _iterate_rows(self, rows, close_cursor):
+        cols = self.columns
+        as_tuple = self.row_mode == self.ROW_TUPLE
+
+        for page in self._fetch_pages(rows):
+            if not as_tuple:
+                page = [OrderedDict(zip(cols, one)) for one in page]
+
+            for one in page:
+                yield one
+
+        if close_cursor:
             self._close_cursor()
 
+    def _fetch_pages(self, rows):
+        """Yield already fetched rows and then the next `fetchmany` pages from cursor."""
+        while rows:
+            yield rows
+            rows = self.cursor.fetchmany(self._batch_size)
+
     def __enter__(self):
         """*Enter* from context manager to open a cursor with database."""
         self._init_cursor()
@@ -122,7 +236,423 @@ class SQLDataset(BaseDataset):
         self.cursor = None
 
     def _init_cursor(self):
-        if self.db_alias:
-            self.cursor = connections[self.db_alias].cursor()
+        conn = connections[self.db_alias] if self.db_alias else connection
+
+        # chunked_cursor returns a named cursor on PostgreSQL and a regular one on
+        # backends without server side cursors. Rows are read by fetchmany, so each
+        # round trip transfers `itersize` rows.
+        if self._use_server_side(conn):
+            self.cursor = conn.chunked_cursor()
+            self._batch_size = self.itersize
         else:
-            self.cursor = connection.cursor()
+            self.cursor = conn.cursor()
+            self._batch_size = self.fetch_size
+
+    def _use_server_side(self, conn):
+        # chunked_cursor doesn't check it, only QuerySet.iterator does (e.g. disabled
+        # behind pgbouncer transaction pooling)
+        if not self.server_side or not hasattr(conn, 'chunked_cursor'):
+            return False
+        return not conn.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS')
+
+
+class KeysetSQLDataset(SQLDataset):
+    """A SQLDataset that reads query results in pages using a key column (keyset pagination).
+
+    Instead of keeping one long query opened, successive bounded queries are made, each one
+    in its own short transaction::
+
+        SELECT * FROM (<query>) onmydesk_keyset WHERE <key> > <last key> ORDER BY <key> LIMIT <page_size>
+
+    Rows from all pages are returned as one iterator. E.g.::
+
+        dataset = KeysetSQLDataset('SELECT id, amount FROM ledger WHERE amount > %s', 'id', [0])
+
+        for row in dataset.iterate():
+            print(row)
+
+    Key column must be unique, increasing and present in query result. The key of the last
+    row consumed (the next one was requested) is available at :attr:`last_key`, so an
+    export can be resumed with `start_after`. Rows read ahead (e.g. by a prefetch thread)
+    are consumed before being written, reports keep their own
+    :attr:`onmydesk.core.reports.KeysetSQLReport.last_key`.
+    """
+
+    page_size = 10000
+    """Default number of rows read by each page query."""
+
+    def __init__(self, query, key, query_params=[], db_alias=None, page_size=None,
+                 start_after=None, row_mode=BaseDataset.ROW_DICT):
+        """Init method.
+
+        :param str query: Raw sql query.
+        :param str key: Name of a unique and increasing column from query result.
+        :param list query_params: Params to be evaluated with query.
+        :param str db_alias: Database alias from django settings. Optional.
+        :param int page_size: Number of rows read by each page query. Optional, default
+            is :attr:`page_size`.
+        :param start_after: Key value to start after (used to resume an export). Optional.
+        :param str row_mode: :attr:`ROW_DICT` (default) to get OrderedDict rows or
+            :attr:`ROW_TUPLE` to get tuple rows.
+        """
+        super(KeysetSQLDataset, self).__init__(query, query_params, db_alias,
+                                               row_mode=row_mode)
+        self.key = key
+        self.page_size = page_size or self.page_size
+        self.start_after = start_after
+        self.last_key = start_after
+
+    def iterate(self, params=None):
+        """Return an iterable with rows from all pages (ordered dicts or tuples).
+
+        First page is read by this call, so :attr:`columns` is filled when it returns.
+
+        :param dict params: Parameters to be used by dataset.
+        :returns: Rows from query result ordered by key.
+        :rtype: Iterator with OrderedDict (or tuple) items.
+        """
+        self.last_key = self.start_after
+        rows = self._fetch_page(self.last_key)
+        return self._iterate_pages(rows)
+
+    def iterate_batches(self, params=None, batch_size=None):
+        """Return an iterable with rows from all pages grouped in columnar batches.
+
+        First page is read by this call, so :attr:`columns` is filled when it returns.
+
+        :param dict params: Parameters to be used by dataset.
+        :param int batch_size: Number of rows by batch. Optional, default is
+            :attr:`page_size`.
+        :returns: Batches with rows ordered by key.
+        :rtype: Iterator with :class:`onmydesk.core.batches.RowBatch` items.
+        """
+        self.last_key = self.start_after
+        rows = self._fetch_page(self.last_key)
+        return self._group_batches(self._iterate_pages(rows, as_tuple=True),
+                                   batch_size or self.page_size)
+
+    def __enter__(self):
+        """*Enter* from context manager, each page uses its own cursor."""
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """*Exit* from context manager, each page uses its own cursor."""
+        pass
+
+    def _iterate_pages(self, rows, as_tuple=False):
+        cols = self.columns
+        key_index = cols.index(self.key)
+        as_tuple = as_tuple or self.row_mode == self.ROW_TUPLE
+
+        while rows:
+            for one in rows:
+                yield one if as_tuple else OrderedDict(zip(cols, one))
+
+                # Row is consumed once the next one is requested
+                self.last_key = one[key_index]
+
+            if len(rows) < self.page_size:
+                break
+
+            rows = self._fetch_page(self.last_key)
+
+    def _fetch_page(self, last_key):
+        query, query_params = self._get_page_query(last_key)
+        conn = connections[self.db_alias] if self.db_alias else connection
+
+        with transaction.atomic(using=conn.alias):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, query_params)
+                rows = cursor.fetchall()
+                self.columns = tuple(c[0] for c in cursor.description)
+            finally:
+                cursor.close()
+
+        return rows
+
+    def _get_page_query(self, last_key):
+        query_params = list(self.query_params)
+        where = ''
+
+        if last_key is not None:
+            where = ' WHERE {} > %s'.format(self.key)
+            query_params.append(last_key)
+
+        query = 'SELECT * FROM ({}) onmydesk_keyset{} ORDER BY {} LIMIT {:d}'.format(
+            self.query, where, self.key, self.page_size)
+
+        return query, query_params
+
+
+def id_range_partitions(start, stop, count):
+    """Return `count` half-open ranges (`[lower, upper)`) covering ids from `start` to `stop`.
+
+    To be used with :class:`PartitionedSQLDataset` and a query like
+    `SELECT * FROM sales WHERE id >= %s AND id < %s`.
+
+    :param int start: First id.
+    :param int stop: Last id (inclusive).
+    :param int count: Number of partitions.
+    :returns: List of `(lower, upper)` tuples.
+    :rtype: list
+    """
+    size = max(1, (stop - start + count) // count)
+    return [(lower, min(lower + size, stop + 1)) for lower in range(start, stop + 1, size)]
+
+
+def date_partitions(start, end, days=1):
+    """Return half-open date buckets (`[lower, upper)`) of `days` covering `start` to `end`.
+
+    To be used with :class:`PartitionedSQLDataset` and a query like
+    `SELECT * FROM sales WHERE sale_date >= %s AND sale_date < %s`.
+
+    :param date start: First date.
+    :param date end: Last date (inclusive).
+    :param int days: Days by bucket.
+    :returns: List of `(lower, upper)` tuples.
+    :rtype: list
+    """
+    partitions = []
+    lower = start
+    while lower <= end:
+        upper = min(lower + timedelta(days=days), end + timedelta(days=1))
+        partitions.append((lower, upper))
+        lower = upper
+    return partitions
+
+
+def hash_partitions(count):
+    """Return `count` partitions to split rows by `<column> mod count`.
+
+    To be used with :class:`PartitionedSQLDataset` and a query like
+    `SELECT * FROM sales WHERE id %% %s = %s`.
+
+    :param int count: Number of partitions.
+    :returns: List of `(count, remainder)` tuples.
+    :rtype: list
+    """
+    return [(count, remainder) for remainder in range(count)]
+
+
+def _fetch_partition(task):
+    """Fetch all rows from a partition, it runs in a worker process."""
+    query, query_params, db_alias, fetch_size = task
+
+    with SQLDataset(query, query_params, db_alias, fetch_size=fetch_size,
+                    row_mode=BaseDataset.ROW_TUPLE) as dataset:
+        rows = list(dataset.iterate())
+        return dataset.columns, rows
+
+
+class PartitionedSQLDataset(BaseDataset):
+    """A dataset that runs a raw query once by partition using a pool of worker processes.
+
+    Each partition is a list of params appended to `query_params`, so the query must have
+    placeholders to filter a partition. Each worker process uses its own database
+    connection. E.g.::
+
+        dataset = PartitionedSQLDataset(
+            'SELECT * FROM sales WHERE id >= %s AND id < %s',
+            id_range_partitions(1, 1000000, 32))
+
+        for row in dataset.iterate():
+            print(row)
+
+    See also :func:`id_range_partitions`, :func:`date_partitions` and :func:`hash_partitions`.
+
+    With `ordered=True` (default) rows are returned in partitions order, otherwise as soon as
+    a partition is fetched. Rows of a partition are sent at once to the main process and at
+    most one partition by worker is fetched at a time, so main process keeps up to
+    `workers + 1` partitions in memory. It's better to have more (and smaller) partitions
+    than workers.
+
+    .. note:: Database connections from main process are closed before starting workers, so
+       this dataset must not be used inside a transaction.
+    """
+
+    def __init__(self, query, partitions, query_params=[], db_alias=None, workers=None,
+                 ordered=True, fetch_size=None, row_mode=BaseDataset.ROW_DICT):
+        """Init method.
+
+        :param str query: Raw sql query with placeholders to partition params.
+        :param list partitions: List with params of each partition.
+        :param list query_params: Params to be evaluated with query (before partition params).
+        :param str db_alias: Database alias from django settings. Optional.
+        :param int workers: Number of worker processes. Optional, default is the number of
+            CPUs.
+        :param bool ordered: Return rows in partitions order.
+        :param int fetch_size: Number of rows fetched by each round trip. Optional.
+        :param str row_mode: :attr:`ROW_DICT` (default) to get OrderedDict rows or
+            :attr:`ROW_TUPLE` to get tuple rows.
+        """
+        self.query = query
+        self.partitions = partitions
+        self.query_params = query_params
+        self.db_alias = db_alias
+        self.workers = workers
+        self.ordered = ordered
+        self.fetch_size = fetch_size
+        self.row_mode = row_mode
+        self.columns = None
+
+    def iterate(self, params=None):
+        """Return an iterable with rows from all partitions (ordered dicts or tuples).
+
+        Workers are started by this call and :attr:`columns` is filled when it returns.
+
+        :param dict params: Parameters to be used by dataset.
+        :returns: Rows from all partitions.
+        :rtype: Iterator with OrderedDict (or tuple) items.
+        """
+        tasks = [(self.query, list(self.query_params) + list(partition), self.db_alias,
+                  self.fetch_size) for partition in self.partitions]
+
+        if not tasks:
+            return iter([])
+
+        pool = self._create_pool()
+        try:
+            results = self._fetch_partitions(pool, tasks)
+            columns, rows = next(results)
+        except BaseException:
+            pool.terminate()
+            raise
+
+        self.columns = columns
+        return self._iterate_partitions(pool, rows, results)
+
+    def _fetch_partitions(self, pool, tasks):
+        """Return fetched partitions, keeping at most one task by worker in flight."""
+        tasks = iter(tasks)
+        pending = [pool.apply_async(_fetch_partition, (task,))
+                   for task in islice(tasks, self.workers or cpu_count())]
+
+        while pending:
+            result = self._next_result(pending)
+            pending.remove(result)
+            partition = result.get()
+
+            # Next task is only sent when a partition is received
+            pending.extend(pool.apply_async(_fetch_partition, (task,))
+                           for task in islice(tasks, 1))
+            yield partition
+
+    def _next_result(self, pending):
+        if self.ordered:
+            return pending[0]
+
+        while True:
+            for result in pending:
+                if result.ready():
+                    return result
+            pending[0].wait(_WAIT_TIMEOUT)
+
+    def _iterate_partitions(self, pool, rows, results):
+        try:
+            for row in self._partitions_rows(rows, results):
+                yield row
+        except BaseException:
+            pool.terminate()
+            raise
+
+        pool.close()
+        pool.join()
+
+    def _partitions_rows(self, rows, results):
+        rows = chain.from_iterable(chain([rows], (rows for _, rows in results)))
+
+        if self.row_mode == self.ROW_TUPLE:
+            return rows
+
+        cols = self.columns
+        return (OrderedDict(zip(cols, one)) for one in rows)
+
+    def _create_pool(self):
+        # Workers must open their own connections, never the ones inherited from this process
+        connections.close_all()
+        return Pool(processes=self.workers)
+
+
+class QuerySetDataset(BaseDataset):
+    """A QuerySetDataset is used to stream rows from a Django queryset.
+
+    Rows are fetched with `queryset.iterator()`, so the queryset result is never
+    cached in memory. E.g.::
+
+        dataset = QuerySetDataset(User.objects.filter(is_active=True),
+                                  fields=('username', 'email', 'profile__city'))
+
+        for row in dataset.iterate():
+            print(row)   # --> A OrderedDict with fields and values.
+
+    With `fields` rows are built from `values_list` (OrderedDicts by default or tuples
+    with `row_mode=QuerySetDataset.ROW_TUPLE`). Without `fields` rows are model
+    instances, fetched with the `select_related` and `only` projections given.
+    """
+
+    chunk_size = 2000
+    """Default number of rows fetched from database on each round trip."""
+
+    def __init__(self, queryset, fields=None, chunk_size=None, select_related=None,
+                 only=None, db_alias=None, row_mode=BaseDataset.ROW_DICT):
+        """Init method.
+
+        :param QuerySet queryset: Queryset with report rows.
+        :param list fields: Field names (lookups are allowed) used with `values_list`.
+            Optional.
+        :param int chunk_size: Number of rows fetched by each round trip. Optional,
+            default is :attr:`chunk_size`.
+        :param list select_related: Relations to be fetched with model instances. Optional.
+        :param list only: Fields loaded on model instances. Optional.
+        :param str db_alias: Database alias from django settings. Optional.
+        :param str row_mode: :attr:`ROW_DICT` (default) to get OrderedDict rows or
+            :attr:`ROW_TUPLE` to get tuple rows. Used only with `fields`.
+        """
+        self.queryset = queryset
+        self.fields = fields
+        self.chunk_size = chunk_size or self.chunk_size
+        self.select_related = select_related
+        self.only = only
+        self.db_alias = db_alias
+        self.row_mode = row_mode
+        self.columns = None
+
+    def iterate(self, params=None):
+        """Return an iterable with queryset rows.
+
+        :param dict params: Parameters to be used by dataset.
+        :returns: Rows from queryset.
+        :rtype: Iterator with OrderedDict, tuple or model instance items.
+        """
+        queryset = self.queryset
+
+        if self.db_alias:
+            queryset = queryset.using(self.db_alias)
+
+        if not self.fields:
+            self.columns = None
+            return self._iterator(self._get_instances_queryset(queryset))
+
+        self.columns = tuple(self.fields)
+        rows = self._iterator(queryset.values_list(*self.fields))
+
+        if self.row_mode == self.ROW_TUPLE:
+            return rows
+
+        return (OrderedDict(zip(self.columns, row)) for row in rows)
+
+    def _get_instances_queryset(self, queryset):
+        """Return queryset of model instances with `select_related` and `only` applied."""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+    def _iterator(self, queryset):
+        try:
+            return queryset.iterator(chunk_size=self.chunk_size)
+        except TypeError:
+            # Django < 2.0 has no chunk_size
+            return queryset.iterator()
@@ -3,18 +3,111 @@
 Outputs are used to get data and convert it to some representation (like a CSV or XLSX).
 """
 
+import os
 import tempfile
+import codecs
 import csv
+import bz2
+import gzip
+import io
+import json
+import math
+import random
+import sqlite3
 import xlsxwriter
 from slugify import slugify
+from collections import OrderedDict
 from datetime import date
+from decimal import Decimal
 
 from hashlib import sha224
 from uuid import uuid4
 from abc import ABCMeta, abstractmethod
 
+from onmydesk.core.batches import RowBatch
 from onmydesk.utils import with_metaclass
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_BZ2 = 'bz2'
+COMPRESSION_XZ = 'xz'
+
+COMPRESSION_EXTENSIONS = {
+    COMPRESSION_GZIP: 'gz',
+    COMPRESSION_BZ2: 'bz2',
+    COMPRESSION_XZ: 'xz',
+}
+"""File extension suffix by compression."""
+
+
+def open_compressed(filepath, compression, level=None, buffer_size=None):
+    """Open a text file to be written compressing its content while writing.
+
+    :param str filepath: File path.
+    :param str compression: :data:`COMPRESSION_GZIP`, :data:`COMPRESSION_BZ2` or
+        :data:`COMPRESSION_XZ`.
+    :param int level: Compression level (preset for xz). Optional, a fast level (6) is
+        used by default for gzip and library defaults for the other ones.
+    :param int buffer_size: Size in bytes of a write buffer before compressor. Optional.
+    :returns: File object opened in text mode.
+    """
+    mode = 'wb' if buffer_size else 'wt'
+
+    if compression == COMPRESSION_GZIP:
+        fileobj = gzip.open(filepath, mode, compresslevel=6 if level is None else level)
+    elif compression == COMPRESSION_BZ2:
+        fileobj = bz2.open(filepath, mode, compresslevel=9 if level is None else level)
+    elif compression == COMPRESSION_XZ:
+        # lzma module is optional in some python builds
+        import lzma
+        fileobj = lzma.open(filepath, mode, preset=level)
+    else:
+        raise ValueError('Unknown compression "{}"'.format(compression))
+
+    if buffer_size:
+        fileobj = io.TextIOWrapper(io.BufferedWriter(fileobj, buffer_size))
+
+    return fileobj
+
+
+def open_output_file(filepath, compression=None, level=None, buffer_size=None):
+    """Open a text file to be written by an output, compressed or not.
+
+    :param str filepath: File path.
+    :param str compression: Compression (see :func:`open_compressed`). Optional.
+    :param int level: Compression level. Optional.
+    :param int buffer_size: Size in bytes of file write buffer. Optional.
+    :returns: File object opened in text mode.
+    """
+    if compression:
+        return open_compressed(filepath, compression, level, buffer_size)
+    elif buffer_size:
+        return open(filepath, 'w+', buffering=buffer_size)
+
+    return open(filepath, 'w+')
+
+
+def compressed_extension(file_extension, compression):
+    """Return file extension with compression suffix. E.g.: `csv.gz`.
+
+    :param str file_extension: File extension without compression.
+    :param str compression: Compression (see :func:`open_compressed`). Optional.
+    :returns: File extension.
+    :rtype: str
+    """
+    if not compression:
+        return file_extension
+
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError('Unknown compression "{}"'.format(compression))
+
+    return '{}.{}'.format(file_extension, COMPRESSION_EXTENSIONS[compression])
+
 
 @with_metaclass(ABCMeta)
 class BaseOutput(object):
@@ -43,10 +136,22 @@ class BaseOutput(object):
     name = None
     """Name used to compose output filename"""
 
+    columns = None
+    """Column names of rows given to :func:`out`, filled by report when dataset knows them."""
+
+    sink = None
+    """Sink where files are stored (see :mod:`onmydesk.core.sinks`), filled by report when
+    it has one. Without a sink, files are written in temporary directory."""
+
     def __init__(self):
         """Class initializer."""
         self.filepath = None
 
+    @property
+    def filepaths(self):
+        """All files generated by this output (outputs that split results return many)."""
+        return [self.filepath] if self.filepath else []
+
     def header(self, content):
         """Return output a header content.
 
@@ -62,6 +167,17 @@ class BaseOutput(object):
         """
         raise NotImplemented()
 
+    def out_many(self, contents):
+        """Output a batch of normal contents.
+
+        Outputs should override it when they are able to write many rows at once.
+
+        :param list contents: Contents to be written
+        """
+        out = self.out
+        for content in contents:
+            out(content)
+
     def footer(self, content):
         """Output a footer content.
 
@@ -77,10 +193,10 @@ class BaseOutput(object):
         """Used by context manager to exit object."""
         pass
 
-    def gen_tmpfilename(self):
-        """Utility to be used to generate a temporary filename.
+    def gen_filename(self):
+        """Generate a filename. E.g.: `sales-2016-05-16-a1b2c3d.csv`.
 
-        :returns: Temporary filepath.
+        :returns: Filename.
         :rtype: str
         """
         name = ''
@@ -88,27 +204,168 @@ class BaseOutput(object):
             name = '{}-'.format(
                 slugify(self.name, to_lower=True)[:30].strip('-'))
 
-        filename = '{}{}-{}.{}'.format(
+        return '{}{}-{}.{}'.format(
             name,
             date.today().strftime('%Y-%m-%d'),
             sha224(uuid4().hex.encode()).hexdigest()[:7],
             self.file_extension)
 
+    def gen_tmpfilename(self):
+        """Utility to be used to generate a temporary filename.
+
+        :returns: Temporary filepath.
+        :rtype: str
+        """
         return '{}/{}'.format(
-            tempfile.gettempdir(), filename)
+            tempfile.gettempdir(), self.gen_filename())
+
+    def open_file(self, compression=None, level=None, buffer_size=None, filename=None):
+        """Open a text file to be written by output and fill :attr:`filepath`.
+
+        With a :attr:`sink`, content is written directly to it, otherwise to a temporary
+        file. It must be closed with :func:`close_file`.
+
+        :param str compression: Compression (see :func:`open_compressed`). Optional.
+        :param int level: Compression level. Optional.
+        :param int buffer_size: Size in bytes of local file write buffer. Optional.
+        :param str filename: Filename. Optional, default is one from :func:`gen_filename`.
+        :returns: File object opened in text mode.
+        """
+        if self.sink is None:
+            if filename:
+                self.filepath = '{}/{}'.format(tempfile.gettempdir(), filename)
+            else:
+                self.filepath = self.gen_tmpfilename()
+            self.sink_file = None
+            return open_output_file(self.filepath, compression, level, buffer_size)
+
+        self.filepath = self.sink.get_location(filename or self.gen_filename())
+        sink_file = self.sink.open(self.filepath)
+
+        if not compression:
+            # Sinks only need a write method, so no io wrappers are used. Closing this
+            # writer closes sink file too.
+            self.sink_file = None
+            return codecs.getwriter('utf-8')(sink_file)
+
+        # Compressed files don't close file objects given to them
+        self.sink_file = sink_file
+        return open_compressed(sink_file, compression, level)
+
+    def close_file(self, fileobj):
+        """Close a file opened by :func:`open_file`.
+
+        :param fileobj: File object returned by :func:`open_file`.
+        """
+        fileobj.close()
+
+        if getattr(self, 'sink_file', None) is not None:
+            self.sink_file.close()
+            self.sink_file = None
+
+    def store_file(self, filepath):
+        """Store a finished local file in :attr:`sink` (when there is one).
+
+        It's used by outputs that need a local file to be written (like XLSX).
+
+        :param str filepath: Local file path.
+        :returns: File location (filepath itself without a sink).
+        :rtype: str
+        """
+        if self.sink is None:
+            return filepath
+
+        location = self.sink.get_location(os.path.basename(filepath))
+        self.sink.save(filepath, location)
+        return location
+
+    def gen_part_filename(self, filepath, part):
+        """Generate the filename of a part from a split output.
+
+        E.g.: `/tmp/report-2016-05-16-a1b2c3d.csv` part 2 is
+        `/tmp/report-2016-05-16-a1b2c3d-part-0002.csv`.
+
+        :param str filepath: Filepath of first part.
+        :param int part: Part number.
+        :returns: Part filepath.
+        :rtype: str
+        """
+        suffix = '.{}'.format(self.file_extension)
+        root = filepath[:-len(suffix)] if filepath.endswith(suffix) else filepath
+
+        return '{}-part-{:04d}{}'.format(root, part, suffix)
 
 
 @with_metaclass(ABCMeta)
 class SVOutput(BaseOutput):
-    """Abstract separated values output."""
+    """Abstract separated values output.
+
+    Files can be compressed while they are written, so big results use less disk and are
+    faster to upload. E.g.: `CSVOutput(compression=COMPRESSION_GZIP)` generates a
+    `.csv.gz` file.
+
+    Values are converted by the csv module itself (`str` for dates and decimals, None as
+    :attr:`null_value`). Conversions are decided once by column from the first row, so
+    rows are given to the writer as they are when no conversion is needed.
+
+    With `max_rows` or `max_bytes`, results are split in many files (`...-part-0001.csv`,
+    `...-part-0002.csv`...), each one with the header. Footer is written in the last file
+    (it isn't counted by limits). All of them are available at :attr:`filepaths`.
+    """
 
     delimiter = None
 
-    def __init__(self, *args, **kwargs):
-        """Class initializer."""
-        super(SVOutput, self).__init__(*args, **kwargs)
+    null_value = ''
+    """Value written for None values."""
+
+    def __init__(self, compression=None, level=None, buffer_size=None, date_format=None,
+                 null_value=None, max_rows=None, max_bytes=None):
+        """Class initializer.
+
+        :param str compression: Compression used while writing, :data:`COMPRESSION_GZIP`,
+            :data:`COMPRESSION_BZ2` or :data:`COMPRESSION_XZ`. Optional.
+        :param int level: Compression level. Optional.
+        :param int buffer_size: Size in bytes of file write buffer. Optional, default is
+            the system one.
+        :param str date_format: Format (strftime) used to write dates and datetimes.
+            Optional, default is their `str` value.
+        :param str null_value: Value written for None values. Optional, default is
+            :attr:`null_value`.
+        :param int max_rows: Max number of rows by file (header not included). Optional.
+        :param int max_bytes: Max size in bytes by file (before compression). Optional.
+        """
+        super(SVOutput, self).__init__()
         self.writer = None
         self.filepath = None
+        self.compression = compression
+        self.level = level
+        self.buffer_size = buffer_size
+        self.date_format = date_format
+        if null_value is not None:
+            self.null_value = null_value
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._filepaths = []
+
+        self.file_extension = compressed_extension(self.file_extension, compression)
+
+    @property
+    def filepaths(self):
+        """All files generated by this output (more than one when results are split)."""
+        return list(self._filepaths)
+
+    def header(self, content):
+        """Output a header content.
+
+        :param mixed content: Content to be written
+        """
+        if self.splitter:
+            self.splitter.header = True
+
+        self.writer.writerow(self._values(content))
+
+        if self.splitter:
+            self.splitter.header = False
 
     def out(self, content):
         """Output a content to a separated value line.
@@ -116,21 +373,166 @@ class SVOutput(BaseOutput):
         :param mixed content: Content to be written
         """
         if isinstance(content, dict):
-            self.writer.writerow([str(i) for i in content.values()])
-        else:
-            self.writer.writerow([str(i) for i in content])
+            content = content.values()
+
+        if self.converters is None:
+            self._set_converters(content)
+
+        if self.converters:
+            content = self._convert(content, self.converters)
+
+        self.writer.writerow(content)
+
+    def out_many(self, contents):
+        """Output a batch of contents to separated value lines.
+
+        :param list contents: Contents to be written
+        """
+        rows = [c.values() if isinstance(c, dict) else c for c in contents]
+        if not rows:
+            return
+
+        if self.converters is None:
+            self._set_converters(rows[0])
+
+        if self.converters:
+            convert, converters = self._convert, self.converters
+            rows = [convert(row, converters) for row in rows]
+
+        self.writer.writerows(rows)
+
+    def footer(self, content):
+        """Output a footer content.
+
+        :param mixed content: Content to be written
+        """
+        if self.splitter:
+            self.splitter.footer = True
+
+        self.writer.writerow(self._values(content))
+
+    @staticmethod
+    def _values(content):
+        return content.values() if isinstance(content, dict) else content
+
+    @staticmethod
+    def _convert(row, converters):
+        row = list(row)
+        for i, converter in converters:
+            row[i] = converter(row[i])
+        return row
+
+    def _set_converters(self, row):
+        """Decide converters by column from the first row.
+
+        Only columns that need a conversion (the csv module writes other values as they
+        are) are kept as `(position, converter)` pairs.
+        """
+        convert_null, convert_date = self._get_converter_functions()
+
+        self.converters = []
+        for i, value in enumerate(row):
+            if self.date_format and (value is None or isinstance(value, date)):
+                self.converters.append((i, convert_date))
+            elif self.null_value:
+                self.converters.append((i, convert_null))
+
+    def _get_converter_functions(self):
+        """Return converters of null values and of dates (or null values)."""
+        null_value = self.null_value
+        date_format = self.date_format
+
+        def convert_null(value):
+            return null_value if value is None else value
+
+        def convert_date(value):
+            if value is None:
+                return null_value
+            return value.strftime(date_format) if isinstance(value, date) else value
+
+        return convert_null, convert_date
+
+    def _open_part(self, part):
+        filename = self.gen_part_filename(self.base_filename, part)
+        self.tmpfile = self.open_file(self.compression, self.level, self.buffer_size,
+                                      filename=filename)
+        self._filepaths.append(self.filepath)
+        self.filepath = self._filepaths[0]
 
     def __enter__(self):
         """Enter from context manager."""
-        self.filepath = self.gen_tmpfilename()
-        self.tmpfile = open(self.filepath, 'w+')
-        self.writer = csv.writer(self.tmpfile, delimiter=self.delimiter)
+        self._filepaths = []
+        self.splitter = None
+
+        if self.max_rows or self.max_bytes:
+            self.base_filename = self.gen_filename()
+            self._open_part(1)
+
+            # Rows are written through splitter, it knows when a new part is needed
+            self.splitter = _SVSplitter(self, self.max_rows, self.max_bytes)
+            self.writer = csv.writer(self.splitter, delimiter=self.delimiter)
+        else:
+            self.tmpfile = self.open_file(self.compression, self.level, self.buffer_size)
+            self._filepaths.append(self.filepath)
+            self.writer = csv.writer(self.tmpfile, delimiter=self.delimiter)
+
+        self.converters = None
         return self
 
     def __exit__(self, *args, **kwargs):
         """Exit from context manager."""
         super(SVOutput, self).__exit__(*args, **kwargs)
-        self.tmpfile.close()
+        self.close_file(self.tmpfile)
+
+
+class _SVSplitter(object):
+    """File object given to csv writer of split SV outputs.
+
+    csv writers write a line by each `write` call, so lines are counted here and a new
+    part is opened (with header) before the line that would exceed the limits. Header and
+    footer lines aren't counted as rows.
+    """
+
+    def __init__(self, output, max_rows=None, max_bytes=None):
+        self.output = output
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.header = False
+        self.footer = False
+        self.header_line = None
+        self.part = 1
+        self.rows = 0
+        self.bytes = 0
+
+    def write(self, line):
+        size = len(line.encode('utf-8'))
+
+        if self.header:
+            self.header_line = line
+        elif not self.footer:
+            if self.rows and self._is_full(size):
+                self._next_part()
+            self.rows += 1
+
+        self.bytes += size
+        self.output.tmpfile.write(line)
+
+    def _is_full(self, size):
+        if self.max_rows and self.rows >= self.max_rows:
+            return True
+        return bool(self.max_bytes) and self.bytes + size > self.max_bytes
+
+    def _next_part(self):
+        self.output.close_file(self.output.tmpfile)
+
+        self.part += 1
+        self.output._open_part(self.part)
+
+        self.rows = 0
+        self.bytes = 0
+        if self.header_line is not None:
+            self.output.tmpfile.write(self.header_line)
+            self.bytes = len(self.header_line.encode('utf-8'))
 
 
 class CSVOutput(SVOutput):
@@ -147,20 +549,579 @@ class TSVOutput(SVOutput):
     file_extension = 'tsv'
 
 
+class BaseRecordOutput(BaseOutput):
+    """Base of outputs writing rows as records, with column names and no footer.
+
+    Header content is kept to be used as column names and footer isn't written (it's not
+    a record). Rows (values of dict rows) are buffered and given to :func:`_flush` each
+    :attr:`flush_size` rows.
+    """
+
+    flush_size = 1000
+    """Number of buffered rows written by each :func:`_flush`."""
+
+    def header(self, content):
+        """Keep header content to be used as column names.
+
+        :param mixed content: Header content
+        """
+        self.header_content = list(content.values() if isinstance(content, dict) else content)
+
+    def out(self, content):
+        """Output a normal content.
+
+        :param mixed content: Content to be written
+        """
+        self.buffer.append(content.values() if isinstance(content, dict) else content)
+        if len(self.buffer) >= self.flush_size:
+            self._flush()
+
+    def out_many(self, contents):
+        """Output a batch of normal contents.
+
+        :param list contents: Contents to be written
+        """
+        buffer = self.buffer
+        for content in contents:
+            buffer.append(content.values() if isinstance(content, dict) else content)
+
+            if len(buffer) >= self.flush_size:
+                self._flush()
+                buffer = self.buffer
+
+    def footer(self, content):
+        """Footer isn't written (it's not a record).
+
+        :param mixed content: Footer content
+        """
+        pass
+
+    def _flush(self):
+        """Write buffered rows and empty :attr:`buffer` (outputs using buffer override it)."""
+        raise NotImplementedError()
+
+    def __enter__(self):
+        """Enter from context manager."""
+        self.header_content = None
+        self.buffer = []
+        return self
+
+
+class JSONLinesOutput(BaseRecordOutput):
+    """An output to generate JSON Lines files (a JSON object by line).
+
+    Each row is written as soon as it's received. Dict rows keep their keys, other rows
+    are written with :attr:`columns` (or header content) as keys, or as JSON arrays when
+    there are no column names. Header and footer aren't records, so they aren't written.
+
+    E.g.::
+
+        with JSONLinesOutput(compression=COMPRESSION_GZIP) as output:
+            output.header(['name', 'age'])
+            output.out(['Alisson', 39])  # --> {"name":"Alisson","age":39}
+    """
+
+    DECIMAL_STR = 'str'
+    DECIMAL_FLOAT = 'float'
+
+    file_extension = 'jsonl'
+
+    def __init__(self, compression=None, level=None, buffer_size=None, date_format=None,
+                 decimal_as=DECIMAL_STR):
+        """Class initializer.
+
+        :param str compression: Compression used while writing, :data:`COMPRESSION_GZIP`,
+            :data:`COMPRESSION_BZ2` or :data:`COMPRESSION_XZ`. Optional.
+        :param int level: Compression level. Optional.
+        :param int buffer_size: Size in bytes of file write buffer. Optional.
+        :param str date_format: Format (strftime) used to write dates and datetimes.
+            Optional, default is ISO 8601.
+        :param str decimal_as: How decimals are written, :attr:`DECIMAL_STR` (no precision
+            loss) or :attr:`DECIMAL_FLOAT` (JSON numbers).
+        """
+        super(JSONLinesOutput, self).__init__()
+        self.compression = compression
+        self.level = level
+        self.buffer_size = buffer_size
+        self.date_format = date_format
+        self.decimal_as = decimal_as
+        self.file_extension = compressed_extension(self.file_extension, compression)
+
+        # C accelerated encoder is used when there is no indentation
+        self._encode = json.JSONEncoder(default=self._default, ensure_ascii=False,
+                                        check_circular=False, separators=(',', ':')).encode
+
+    def out(self, content):
+        """Output a content as a JSON line.
+
+        :param mixed content: Content to be written
+        """
+        self.tmpfile.write(self._encode(self._record(content, self._get_keys())) + '\n')
+
+    def out_many(self, contents):
+        """Output a batch of contents as JSON lines.
+
+        :param list contents: Contents to be written
+        """
+        # Row batches know their columns (with the ones computed by report)
+        keys = contents.columns if isinstance(contents, RowBatch) else self._get_keys()
+
+        encode, record = self._encode, self._record
+        lines = [encode(record(c, keys)) for c in contents]
+
+        if lines:
+            lines.append('')
+            self.tmpfile.write('\n'.join(lines))
+
+    def _get_keys(self):
+        return self.columns or self.header_content
+
+    @staticmethod
+    def _record(content, keys):
+        if keys and not isinstance(content, dict):
+            return OrderedDict(zip(keys, content))
+        return content
+
+    def _default(self, value):
+        if isinstance(value, date):
+            if self.date_format:
+                return value.strftime(self.date_format)
+            return value.isoformat()
+        elif isinstance(value, Decimal):
+            return float(value) if self.decimal_as == self.DECIMAL_FLOAT else str(value)
+        elif isinstance(value, (set, frozenset)) or hasattr(value, 'tolist'):
+            # Sets and NumPy values (from row batches)
+            return value.tolist() if hasattr(value, 'tolist') else list(value)
+
+        return str(value)
+
+    def __enter__(self):
+        """Enter from context manager."""
+        super(JSONLinesOutput, self).__enter__()
+        self.tmpfile = self.open_file(self.compression, self.level, self.buffer_size)
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        """Exit from context manager."""
+        super(JSONLinesOutput, self).__exit__(*args, **kwargs)
+        self.close_file(self.tmpfile)
+
+
+class ParquetOutput(BaseRecordOutput):
+    """An output to generate Parquet files (columnar files), it requires `pyarrow`.
+
+    Rows are buffered and written in row groups of `row_group_size` rows, so memory usage
+    is bounded by the row group size. Row batches (from reports with `columnar` enabled)
+    are converted to Arrow tables without building rows, and grouped in row groups too.
+
+    Column names come from :attr:`columns` (or header content). Column types are inferred
+    from the first row group, give a `schema` when they must be fixed (e.g. a column
+    with only None values in the first rows). Footer isn't written.
+    """
+
+    file_extension = 'parquet'
+
+    row_group_size = 100000
+    """Default number of rows by row group."""
+
+    def __init__(self, row_group_size=None, compression='snappy', schema=None):
+        """Class initializer.
+
+        :param int row_group_size: Number of rows by row group. Optional, default is
+            :attr:`row_group_size`.
+        :param str compression: Parquet compression codec (snappy, gzip, zstd...).
+        :param mixed schema: A `pyarrow.Schema` or a list of `(name, pyarrow type)`.
+            Optional.
+        """
+        super(ParquetOutput, self).__init__()
+        self.row_group_size = row_group_size or self.row_group_size
+        self.compression = compression
+        self.schema = schema
+
+    @property
+    def flush_size(self):
+        """Rows are buffered by row group."""
+        return self.row_group_size
+
+    def out_many(self, contents):
+        """Output a batch of normal contents.
+
+        :param list contents: Contents to be written
+        """
+        if isinstance(contents, RowBatch):
+            self._flush()
+            if len(contents):
+                self._add_table(self._to_table(contents.arrays, contents.columns))
+            return
+
+        super(ParquetOutput, self).out_many(contents)
+
+    def _flush(self):
+        """Move buffered rows to pending tables."""
+        if not self.buffer:
+            return
+
+        arrays = [list(c) for c in zip(*self.buffer)]
+        self.buffer = []
+        self._add_table(self._to_table(arrays))
+
+    def _to_table(self, arrays, names=None):
+        if self.writer is None:
+            self._open_writer(arrays, names)
+
+        arrays = [pyarrow.array(a, type=f.type) for a, f in zip(arrays, self.arrow_schema)]
+        return pyarrow.Table.from_arrays(arrays, schema=self.arrow_schema)
+
+    def _add_table(self, table):
+        self.tables.append(table)
+        self.tables_rows += table.num_rows
+
+        if self.tables_rows >= self.row_group_size:
+            self._write_tables()
+
+    def _write_tables(self, final=False):
+        """Write pending tables in row groups of `row_group_size` rows.
+
+        Remaining rows are kept to the next row group, unless it's the final call.
+        """
+        if not self.tables:
+            return
+
+        # Tables are concatenated without copying their data
+        table = pyarrow.concat_tables(self.tables)
+        size = table.num_rows if final else table.num_rows - table.num_rows % self.row_group_size
+
+        self.writer.write_table(table.slice(0, size), row_group_size=self.row_group_size)
+
+        rest = table.slice(size)
+        self.tables = [rest] if rest.num_rows else []
+        self.tables_rows = rest.num_rows
+
+    def _open_writer(self, arrays, names=None):
+        """Create parquet writer with given schema or one inferred from first arrays."""
+        schema = self.schema
+        if schema is None:
+            names = names or self.columns or self.header_content or [
+                'column_{}'.format(i) for i in range(len(arrays))]
+
+            fields = []
+            for name, values in zip(names, arrays):
+                arrow_type = pyarrow.array(values).type
+                if arrow_type == pyarrow.null():
+                    arrow_type = pyarrow.string()
+                fields.append((str(name), arrow_type))
+            schema = fields
+
+        if not isinstance(schema, pyarrow.Schema):
+            schema = pyarrow.schema(schema)
+
+        self.arrow_schema = schema
+        self.writer = pyarrow.parquet.ParquetWriter(self.filepath, schema,
+                                                    compression=self.compression)
+
+    def __enter__(self):
+        """Enter from context manager."""
+        if pyarrow is None:
+            raise ImportError('ParquetOutput requires pyarrow (pip install pyarrow)')
+
+        super(ParquetOutput, self).__enter__()
+        self.filepath = self.gen_tmpfilename()
+        self.tables = []
+        self.tables_rows = 0
+        self.writer = None
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        """Exit from context manager."""
+        super(ParquetOutput, self).__exit__(*args, **kwargs)
+        self._flush()
+
+        if self.writer is None:
+            # No rows, a file with the known columns is still created
+            names = self.columns or self.header_content or []
+            self._open_writer([[] for _ in names], names)
+
+        self._write_tables(final=True)
+        self.writer.close()
+        self.filepath = self.store_file(self.filepath)
+
+
+class SQLiteOutput(BaseRecordOutput):
+    """An output to generate a SQLite database file with a table with report rows.
+
+    Results too large to be opened as spreadsheets can be queried locally. Rows are
+    inserted by batches (`executemany`) inside large transactions, with pragmas tuned for a
+    bulk load. Indexes are created after all rows are inserted. E.g.::
+
+        outputs = (SQLiteOutput(table='sales', indexes=['customer', ('year', 'month')]),)
+
+    Column names come from :attr:`columns` (or header content) and column types are
+    inferred from the first row. Footer isn't written.
+    """
+
+    file_extension = 'sqlite3'
+
+    batch_size = 10000
+    """Default number of rows inserted by each `executemany`."""
+
+    transaction_size = 200000
+    """Default number of rows inserted by transaction."""
+
+    column_types = (
+        (bool, 'INTEGER'),
+        (int, 'INTEGER'),
+        (float, 'REAL'),
+        (Decimal, 'NUMERIC'),
+        (date, 'TEXT'),
+        (bytes, 'BLOB'),
+        (str, 'TEXT'),
+    )
+    """SQLite column type by python type (checked in order)."""
+
+    def __init__(self, table='report', indexes=None, batch_size=None, transaction_size=None,
+                 journal_mode='WAL', synchronous='OFF'):
+        """Class initializer.
+
+        :param str table: Table name.
+        :param list indexes: Columns to be indexed after load, each item is a column name
+            or a tuple of column names. Optional.
+        :param int batch_size: Number of rows inserted by each `executemany`. Optional,
+            default is :attr:`batch_size`.
+        :param int transaction_size: Number of rows inserted by transaction. Optional,
+            default is :attr:`transaction_size`.
+        :param str journal_mode: SQLite journal mode used while loading.
+        :param str synchronous: SQLite synchronous mode used while loading. As the file is
+            created from scratch, it doesn't need to survive a crash.
+        """
+        super(SQLiteOutput, self).__init__()
+        self.table = table
+        self.indexes = indexes or []
+        self.batch_size = batch_size or self.batch_size
+        self.transaction_size = transaction_size or self.transaction_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+
+    @property
+    def flush_size(self):
+        """Rows are buffered by `executemany` batch."""
+        return self.batch_size
+
+    def out_many(self, contents):
+        """Output a batch of normal contents.
+
+        :param list contents: Contents to be written
+        """
+        if isinstance(contents, RowBatch) and len(contents):
+            self._flush()
+
+            # Row batches know their columns (with the ones computed by report)
+            if self.insert_sql is None:
+                self._create_table(list(next(iter(contents))), contents.columns)
+
+        super(SQLiteOutput, self).out_many(contents)
+
+    @staticmethod
+    def quote(name):
+        """Return a quoted SQLite identifier."""
+        return '"{}"'.format(str(name).replace('"', '""'))
+
+    def _flush(self):
+        """Insert buffered rows, committing each `transaction_size` rows."""
+        if not self.buffer:
+            return
+
+        rows, self.buffer = self.buffer, []
+        rows = self._prepare_rows(rows)
+
+        if not self.connection.in_transaction:
+            self.connection.execute('BEGIN')
+
+        self.connection.executemany(self.insert_sql, rows)
+
+        self.pending_rows += len(rows)
+        if self.pending_rows >= self.transaction_size:
+            self.connection.commit()
+            self.pending_rows = 0
+
+    def _prepare_rows(self, rows):
+        """Create table on first rows and convert values sqlite3 doesn't know."""
+        if self.insert_sql is None:
+            self._create_table(list(rows[0]))
+
+        if self.converters:
+            rows = [self._convert(row) for row in rows]
+        return rows
+
+    def _convert(self, row):
+        row = list(row)
+        for i in self.converters:
+            value = row[i]
+            if isinstance(value, date):
+                row[i] = value.isoformat()
+            elif isinstance(value, Decimal):
+                row[i] = str(value)
+        return row
+
+    def _create_table(self, first_row=None, names=None):
+        """Create table with columns from first row (and their types)."""
+        first_row = first_row or []
+        names = names or self.columns or self.header_content or [
+            'column_{}'.format(i) for i in range(len(first_row))]
+
+        columns = []
+        self.converters = []
+        for i, name in enumerate(names):
+            value = first_row[i] if i < len(first_row) else None
+            column_type = self._get_column_type(value)
+            columns.append('{} {}'.format(self.quote(name), column_type).strip())
+
+            # sqlite3 doesn't know decimals (and date adapters are deprecated)
+            if value is None or isinstance(value, (date, Decimal)):
+                self.converters.append(i)
+
+        self.connection.execute('CREATE TABLE {} ({})'.format(
+            self.quote(self.table), ', '.join(columns)))
+
+        self.insert_sql = 'INSERT INTO {} VALUES ({})'.format(
+            self.quote(self.table), ', '.join(['?'] * len(names)))
+
+    def _get_column_type(self, value):
+        for python_type, column_type in self.column_types:
+            if isinstance(value, python_type):
+                return column_type
+        return ''
+
+    def _create_indexes(self):
+        for i, index in enumerate(self.indexes):
+            columns = [index] if isinstance(index, str) else list(index)
+            self.connection.execute('CREATE INDEX {} ON {} ({})'.format(
+                self.quote('{}_idx_{}'.format(self.table, i)),
+                self.quote(self.table),
+                ', '.join(self.quote(c) for c in columns)))
+
+    def __enter__(self):
+        """Enter from context manager."""
+        super(SQLiteOutput, self).__enter__()
+        self.filepath = self.gen_tmpfilename()
+        self.insert_sql = None
+        self.converters = []
+        self.pending_rows = 0
+
+        # Transactions are handled by output
+        self.connection = sqlite3.connect(self.filepath, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode={}'.format(self.journal_mode))
+        self.connection.execute('PRAGMA synchronous={}'.format(self.synchronous))
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        """Exit from context manager."""
+        super(SQLiteOutput, self).__exit__(*args, **kwargs)
+
+        try:
+            self._flush()
+            if self.insert_sql is None and (self.columns or self.header_content):
+                # No rows, a table with the known columns is still created
+                self._create_table()
+
+            if self.connection.in_transaction:
+                self.connection.commit()
+
+            if self.insert_sql is not None:
+                self._create_indexes()
+
+            # Back to a single file without WAL
+            self.connection.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            self.connection.close()
+
+        self.filepath = self.store_file(self.filepath)
+
+
 class XLSXOutput(BaseOutput):
-    """Output to generate XLSX files."""
+    """Output to generate XLSX files.
+
+    By default all cells are kept in memory until the file is closed. For large reports use
+    `XLSXOutput(constant_memory=True)`, each row is flushed to disk when the next one is
+    written, so memory usage doesn't grow with the number of rows.
+
+    When a sheet reaches `max_rows` rows (Excel limit by default) or about `max_bytes` of
+    cell content, the next rows go to a new worksheet (:attr:`ROLLOVER_SHEET`, default) or
+    to a new workbook file (:attr:`ROLLOVER_FILE`). Header is repeated on each new sheet
+    and all files are available at :attr:`filepaths`. As with split CSV/TSV outputs, files
+    are named `...-part-0001.xlsx`, `...-part-0002.xlsx`... on file rollover.
+
+    Column widths are computed from the length of cell values. Measuring every cell is
+    costly on wide reports, so `width_strategy` can be:
+
+    - :attr:`WIDTH_FULL`: All rows are measured (default).
+    - :attr:`WIDTH_FIRST_ROWS`: Only the first `width_rows` rows of each sheet.
+    - :attr:`WIDTH_SAMPLE`: A random sample (reservoir) of `width_rows` rows of each sheet.
+    - :attr:`WIDTH_FIXED`: No rows are measured, widths come from `column_widths`.
+
+    Header and footer are always measured (except with :attr:`WIDTH_FIXED`).
+    """
+
+    ROLLOVER_SHEET = 'sheet'
+    ROLLOVER_FILE = 'file'
+
+    WIDTH_FULL = 'full'
+    WIDTH_FIRST_ROWS = 'first_rows'
+    WIDTH_SAMPLE = 'sample'
+    WIDTH_FIXED = 'fixed'
 
     file_extension = 'xlsx'
 
     min_width = 8.43
     """Min width used to set column widths"""
 
+    max_rows = 1048576
+    """Default max number of rows by sheet (Excel limit)."""
+
+    width_rows = 1000
+    """Default number of rows measured by :attr:`WIDTH_FIRST_ROWS` and :attr:`WIDTH_SAMPLE`."""
+
+    def __init__(self, constant_memory=False, max_rows=None, max_bytes=None,
+                 rollover=ROLLOVER_SHEET, width_strategy=WIDTH_FULL, width_rows=None,
+                 column_widths=None):
+        """Class initializer.
+
+        :param bool constant_memory: Use xlsxwriter constant memory mode (rows flushed to
+            disk one by one).
+        :param int max_rows: Max number of rows by sheet (header included). Optional,
+            default is :attr:`max_rows`.
+        :param int max_bytes: Max size of cell contents by sheet (estimated by the length
+            of cell values). Optional.
+        :param str rollover: Where rows go when a limit is hit, :attr:`ROLLOVER_SHEET`
+            or :attr:`ROLLOVER_FILE`.
+        :param str width_strategy: How column widths are computed, :attr:`WIDTH_FULL`,
+            :attr:`WIDTH_FIRST_ROWS`, :attr:`WIDTH_SAMPLE` or :attr:`WIDTH_FIXED`.
+        :param int width_rows: Number of rows measured. Optional, default is
+            :attr:`width_rows`.
+        :param mixed column_widths: Fixed widths, a list (by column position) or a dict
+            (by column position or name). Columns not given use measured widths (or
+            :attr:`min_width` with :attr:`WIDTH_FIXED`).
+        """
+        super(XLSXOutput, self).__init__()
+        self.constant_memory = constant_memory
+        self.max_rows = max_rows or self.max_rows
+        self.max_bytes = max_bytes
+        self.rollover = rollover
+        self.width_strategy = width_strategy
+        self.width_rows = width_rows or self.width_rows
+        self.column_widths = column_widths
+
+    @property
+    def filepaths(self):
+        """All files generated by this output (more than one on file rollover)."""
+        return list(self._filepaths)
+
     def header(self, content):
         """Output a header content.
 
         :param mixed content: Content to be written
         """
         self.has_header = True
+        self.header_content = content
         self._write_row(content, self.header_format)
 
     def out(self, content):
@@ -170,6 +1131,15 @@ class XLSXOutput(BaseOutput):
         """
         self._write_row(content)
 
+    def out_many(self, contents):
+        """Output a batch of normal contents.
+
+        :param list contents: Contents to be written
+        """
+        write_row = self._write_row
+        for content in contents:
+            write_row(content)
+
     def footer(self, content):
         """Output a footer content.
 
@@ -178,11 +1148,18 @@ class XLSXOutput(BaseOutput):
         self._write_row(content, self.footer_format)
 
     def _write_row(self, content, line_format=None):
+        # Tuples and lists are written as they are
         values = content
         if isinstance(content, dict):
-            values = [a for a in content.values()]
+            values = list(content.values())
+
+        self._check_limits(values)
 
-        self._compute_line_widths(values)
+        if line_format is not None:
+            if self.width_strategy != self.WIDTH_FIXED:
+                self._compute_line_widths(values)
+        else:
+            self._measure_row(values)
 
         if line_format:
             self.worksheet.write_row(self.current_row, 0, values, line_format)
@@ -191,35 +1168,169 @@ class XLSXOutput(BaseOutput):
 
         self.current_row += 1
 
+    def _check_limits(self, values):
+        """Rollover before writing values when they don't fit in current sheet."""
+        if self.current_row >= self.max_rows:
+            self._rollover()
+
+        if self.max_bytes:
+            size = sum(len(str(v)) for v in values)
+            if self.current_bytes + size > self.max_bytes and self.current_row > self.first_row:
+                self._rollover()
+            self.current_bytes += size
+
     def _compute_line_widths(self, line):
         for i, v in enumerate(line):
             self.line_widths[i] = max(len(str(v)),
                                       self.line_widths.get(i, self.min_width))
 
-    def __enter__(self):
-        """Enter from a context manager."""
-        self.filepath = self.gen_tmpfilename()
-        self.workbook = xlsxwriter.Workbook(self.filepath)
-        self.worksheet = self.workbook.add_worksheet()
+    def _measure_row(self, values):
+        """Compute widths of a content row according to :attr:`width_strategy`."""
+        strategy = self.width_strategy
+        index = self.content_rows
+        self.content_rows += 1
+
+        if strategy == self.WIDTH_FULL:
+            self._compute_line_widths(values)
+        elif strategy == self.WIDTH_FIRST_ROWS:
+            if index < self.width_rows:
+                self._compute_line_widths(values)
+        elif strategy == self.WIDTH_SAMPLE:
+            self._sample_row(index, values)
+
+    def _sample_row(self, index, values):
+        """Keep a random sample of rows (reservoir sampling, algorithm L).
+
+        Only rows picked by the sample are measured, the other ones are skipped without
+        any call to `str`.
+        """
+        size = self.width_rows
+
+        if index < size:
+            self.reservoir.append(values)
+            if index == size - 1:
+                self._sample_weight = math.exp(math.log(self._random.random()) / size)
+                self._next_sample = index + self._sample_skip()
+            return
+
+        if index == self._next_sample:
+            self.reservoir[self._random.randrange(size)] = values
+            self._sample_weight *= math.exp(math.log(self._random.random()) / size)
+            self._next_sample = index + self._sample_skip()
+
+    def _sample_skip(self):
+        weight = self._sample_weight
+        if weight >= 1:
+            return 1
+        return int(math.log(self._random.random()) / math.log(1 - weight)) + 1
+
+    def get_column_widths(self):
+        """Return column widths of current sheet.
+
+        :returns: Widths by column position.
+        :rtype: dict
+        """
+        widths = dict(self.line_widths)
+
+        for values in self.reservoir:
+            for i, v in enumerate(values):
+                widths[i] = max(len(str(v)), widths.get(i, self.min_width))
+
+        widths.update(self._get_fixed_widths())
+        return widths
+
+    def _get_fixed_widths(self):
+        """Return :attr:`column_widths` by column position (names are looked up)."""
+        fixed = self.column_widths or {}
+        if not isinstance(fixed, dict):
+            fixed = dict(enumerate(fixed))
+
+        names = self._get_column_names()
+
+        widths = {}
+        for key, width in fixed.items():
+            if key in names:
+                key = names.index(key)
+            if isinstance(key, int):
+                widths[key] = width
+
+        return widths
+
+    def _get_column_names(self):
+        names = self.columns or self.header_content or ()
+        if isinstance(names, dict):
+            names = list(names.values())
+        return list(names)
+
+    def _rollover(self):
+        """Continue writing rows in a new sheet or in a new file."""
+        self._close_worksheet()
+
+        if self.rollover == self.ROLLOVER_FILE:
+            self.workbook.close()
+
+            filepath = self.gen_part_filename(self.base_filename, len(self._filepaths) + 1)
+            self._filepaths.append(filepath)
+            self._open_workbook(filepath)
+
+        self._add_worksheet()
+
+        if self.has_header:
+            self._write_row(self.header_content, self.header_format)
+
+        self.first_row = self.current_row
+
+    def _open_workbook(self, filepath):
+        if self.constant_memory:
+            # Frozen pane and column widths are still applied on exit, they are only
+            # written to the file when workbook is closed.
+            self.workbook = xlsxwriter.Workbook(filepath, {'constant_memory': True})
+        else:
+            self.workbook = xlsxwriter.Workbook(filepath)
 
         self.header_format = self.workbook.add_format({'bold': True, 'bg_color': '#C9C9C9'})
         self.footer_format = self.workbook.add_format({'bold': True, 'bg_color': '#DDDDDD'})
 
+    def _add_worksheet(self):
+        self.worksheet = self.workbook.add_worksheet()
+
         self.current_row = 0
+        self.first_row = 0
+        self.current_bytes = 0
 
         self.line_widths = {}
+        self.content_rows = 0
+        self.reservoir = []
 
-        self.has_header = False
-
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        """Exit from context manager."""
+    def _close_worksheet(self):
         # Freeze first row if report has header
         if self.has_header:
             self.worksheet.freeze_panes(1, 0)
 
-        for i, v in self.line_widths.items():
+        for i, v in sorted(self.get_column_widths().items()):
             self.worksheet.set_column(i, i, v)
 
+    def __enter__(self):
+        """Enter from a context manager."""
+        self.base_filename = self.gen_tmpfilename()
+        self.filepath = self.base_filename
+        if self.rollover == self.ROLLOVER_FILE:
+            self.filepath = self.gen_part_filename(self.base_filename, 1)
+        self._filepaths = [self.filepath]
+
+        self.has_header = False
+        self.header_content = None
+        self._random = random.Random()
+
+        self._open_workbook(self.filepath)
+        self._add_worksheet()
+
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        """Exit from context manager."""
+        self._close_worksheet()
         self.workbook.close()
+
+        self._filepaths = [self.store_file(p) for p in self._filepaths]
+        self.filepath = self._filepaths[0]
@@ -0,0 +1,403 @@
+"""Pipelines from library.
+
+Pipelines are used by reports to overlap data fetching from datasets with output writing.
+"""
+
+import multiprocessing
+import threading
+from abc import ABCMeta, abstractmethod
+from itertools import islice
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    # python2
+    from Queue import Queue, Empty, Full
+
+from django.db import connections
+
+from onmydesk.utils import with_metaclass
+
+FANOUT_THREAD = 'thread'
+FANOUT_PROCESS = 'process'
+
+_END = object()
+"""Marker sent by producer thread when there are no more rows."""
+
+_WAIT_TIMEOUT = 0.1
+"""Seconds waited on a blocked queue before checking if pipeline was stopped."""
+
+
+class PrefetchIterator(object):
+    """Iterate over an iterable reading it in batches from a background thread.
+
+    While rows are consumed (cleaned and written by outputs) the next batches are already
+    being fetched by a reader thread. Batches are kept in a bounded queue. E.g.::
+
+        rows = PrefetchIterator(dataset.iterate(), batch_size=1000, queue_size=4)
+
+        for row in rows:
+            output.out(row)
+
+        print(rows.stats)  # --> Queue depth and stall counters.
+
+    Counters in :attr:`stats`:
+
+    - *batches* and *rows*: Number of batches and rows read by reader thread.
+    - *queue_depth_max* and *queue_depth_avg*: Batches waiting in the queue (sampled when
+      a batch is consumed). A queue always empty means the dataset is the bottleneck.
+    - *producer_stalls*: Times reader thread waited because the queue was full (outputs
+      are slower than dataset).
+    - *consumer_stalls*: Times main thread waited because the queue was empty (dataset is
+      slower than outputs).
+
+    Lazy iterables (like :class:`onmydesk.core.datasets.QuerySetDataset` rows or pages of
+    :class:`onmydesk.core.datasets.KeysetSQLDataset`) run their queries in reader thread,
+    on a database connection of that thread (closed when it finishes). So these queries
+    run outside any transaction of the main thread and don't see its uncommitted rows.
+    Other iterables (like :class:`onmydesk.core.datasets.SQLDataset` rows) are read from
+    a cursor of the main thread connection, so consumers (row cleaners, outputs) must not
+    use that connection while rows are read.
+    """
+
+    def __init__(self, iterable, batch_size=1000, queue_size=4):
+        """Class initializer.
+
+        :param iterable iterable: Rows to be read by background thread.
+        :param int batch_size: Number of rows sent by each batch.
+        :param int queue_size: Max number of batches waiting to be consumed.
+        """
+        self.iterable = iterable
+        self.batch_size = batch_size
+        self.queue = Queue(maxsize=queue_size)
+        self.stats = dict(batches=0, rows=0, queue_depth_max=0, queue_depth_avg=0.0,
+                          producer_stalls=0, consumer_stalls=0)
+
+        self._stop = threading.Event()
+        self._error = None
+        self._depth_total = 0
+        self._gets = 0
+
+    def __iter__(self):
+        """Start reader thread and return rows read by it."""
+        thread = threading.Thread(target=self._produce, name='onmydesk-prefetch')
+        thread.daemon = True
+        thread.start()
+
+        try:
+            for batch in iter(self._get, _END):
+                for row in batch:
+                    yield row
+        finally:
+            self._stop.set()
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _produce(self):
+        try:
+            for batch in self._batches():
+                self.stats['batches'] += 1
+                self.stats['rows'] += len(batch)
+                if not self._put(batch):
+                    return
+        except BaseException as e:
+            self._error = e
+        finally:
+            # Connections are by thread, the ones opened by lazy iterables aren't reused
+            for connection in connections.all():
+                connection.close()
+
+            # Consumer is always released, even when reader thread dies
+            self._put(_END)
+
+    def _batches(self):
+        rows = iter(self.iterable)
+        batch = list(islice(rows, self.batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(rows, self.batch_size))
+
+    def _put(self, batch):
+        """Put a batch in the queue, return False if pipeline was stopped."""
+        try:
+            self.queue.put_nowait(batch)
+            return True
+        except Full:
+            self.stats['producer_stalls'] += 1
+
+        return self._wait_put(batch)
+
+    def _wait_put(self, batch):
+        """Wait for room in the queue to put a batch, return False if pipeline was stopped."""
+        while not self._stop.is_set():
+            try:
+                self.queue.put(batch, timeout=_WAIT_TIMEOUT)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def _get(self):
+        depth = self.queue.qsize()
+        self._gets += 1
+        self._depth_total += depth
+        self.stats['queue_depth_max'] = max(self.stats['queue_depth_max'], depth)
+        self.stats['queue_depth_avg'] = float(self._depth_total) / self._gets
+
+        try:
+            return self.queue.get_nowait()
+        except Empty:
+            self.stats['consumer_stalls'] += 1
+
+        return self.queue.get()
+
+
+def _consume_output(output, get):
+    """Write messages received from a channel into an output (used by output workers).
+
+    :returns: Output filepaths.
+    """
+    def set_columns(columns):
+        output.columns = columns
+
+    # Any other kind ('end') finishes the output
+    handlers = {
+        'rows': output.out_many,
+        'header': output.header,
+        'footer': output.footer,
+        'columns': set_columns,
+    }
+
+    with output:
+        while True:
+            kind, content = get()
+
+            handler = handlers.get(kind)
+            if handler is None:
+                break
+
+            handler(content)
+
+    return output.filepaths
+
+
+def _run_output_process(output, channel, results):
+    """Target of output worker processes."""
+    try:
+        results.put(('ok', _consume_output(output, channel.get)))
+    except Exception as e:
+        results.put(('error', e))
+
+
+@with_metaclass(ABCMeta)
+class BaseOutputWorker(object):
+    """An output that sends its content to a real output running in a worker.
+
+    Rows are grouped in batches and sent through a bounded channel, so each output writes
+    at its own pace. It's used as an output by reports with `fanout` enabled. E.g.::
+
+        with ThreadOutputWorker(XLSXOutput()) as output:
+            output.header(['Name', 'Age'])
+            output.out(['Alisson', 39])
+
+        print(output.filepath)
+    """
+
+    def __init__(self, output, batch_size=1000, queue_size=4):
+        """Class initializer.
+
+        :param BaseOutput output: Output to be run by worker.
+        :param int batch_size: Number of rows sent by each batch.
+        :param int queue_size: Max number of batches waiting to be written.
+        """
+        self.output = output
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.filepath = None
+        self.filepaths = []
+        self._batch = []
+
+    @property
+    def name(self):
+        """Name used to compose output filename."""
+        return self.output.name
+
+    @property
+    def columns(self):
+        """Column names of rows given to :func:`out`."""
+        return self.output.columns
+
+    @columns.setter
+    def columns(self, value):
+        self._send(('columns', value))
+
+    def header(self, content):
+        """Send a header content to output worker.
+
+        :param mixed content: Content to be written
+        """
+        self._send(('header', content))
+
+    def out(self, content):
+        """Send a normal content to output worker (in batches).
+
+        :param mixed content: Content to be written
+        """
+        self._batch.append(content)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def out_many(self, contents):
+        """Send a batch of normal contents to output worker.
+
+        :param list contents: Contents to be written
+        """
+        self._batch.extend(contents)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def footer(self, content):
+        """Send a footer content to output worker.
+
+        :param mixed content: Content to be written
+        """
+        self._flush()
+        self._send(('footer', content))
+
+    def __enter__(self):
+        """Start output worker."""
+        self._batch = []
+        self._start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Send remaining rows, wait output worker to finish and raise its errors."""
+        try:
+            if exc_type is None:
+                self._flush()
+            self._send(('end', None))
+            self._finish()
+        except Exception:
+            # Errors from output worker must not hide the one raised by report
+            if exc_type is None:
+                raise
+
+    def _set_filepaths(self, filepaths):
+        self.filepaths = list(filepaths)
+        self.filepath = self.filepaths[0] if self.filepaths else None
+
+    def _flush(self):
+        if self._batch:
+            self._send(('rows', self._batch))
+            self._batch = []
+
+    @abstractmethod
+    def _start(self):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _send(self, message):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _finish(self):
+        raise NotImplementedError()
+
+
+class ThreadOutputWorker(BaseOutputWorker):
+    """Output worker running real output in a thread.
+
+    Outputs that release the GIL (file writes, compression) are written in parallel, pure
+    python writers (like XLSX) are only overlapped with the other ones.
+    """
+
+    def _start(self):
+        self.channel = Queue(maxsize=self.queue_size)
+        self._error = None
+        self.thread = threading.Thread(target=self._run, name='onmydesk-output')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self._set_filepaths(_consume_output(self.output, self.channel.get))
+        except Exception as e:
+            self._error = e
+
+    def _send(self, message):
+        while self.thread.is_alive():
+            try:
+                self.channel.put(message, timeout=_WAIT_TIMEOUT)
+                return
+            except Full:
+                pass
+
+        self._finish()
+
+    def _finish(self):
+        self.thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class ProcessOutputWorker(BaseOutputWorker):
+    """Output worker running real output in a child process.
+
+    Rows are pickled to be sent to child process, so it's worth to use with slow outputs
+    (like XLSX) that would be limited by the GIL in a thread.
+    """
+
+    def _start(self):
+        self.channel = multiprocessing.Queue(maxsize=self.queue_size)
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_run_output_process,
+                                               args=(self.output, self.channel, self.results))
+        self.process.daemon = True
+        self.process.start()
+
+    def _send(self, message):
+        while self.process.is_alive():
+            try:
+                self.channel.put(message, timeout=_WAIT_TIMEOUT)
+                return
+            except Full:
+                pass
+
+        self._finish()
+
+    def _finish(self):
+        status, result = self._get_result()
+        self.process.join()
+
+        if status == 'error':
+            raise result
+
+        self._set_filepaths(result)
+        self.output.filepath = self.filepath
+
+    def _get_result(self):
+        """Wait the result of output process, an error if it exits without one."""
+        while True:
+            try:
+                return self.results.get(timeout=_WAIT_TIMEOUT)
+            except Empty:
+                if not self.process.is_alive() and self.results.empty():
+                    return 'error', RuntimeError(
+                        'Output process exited with code {}'.format(self.process.exitcode))
+
+
+def output_workers(outputs, mode=FANOUT_THREAD, batch_size=1000, queue_size=4):
+    """Return outputs wrapped by output workers, each one writes in its own thread or process.
+
+    :param list outputs: A list of output objects.
+    :param str mode: :data:`FANOUT_THREAD` or :data:`FANOUT_PROCESS`.
+    :param int batch_size: Number of rows sent by each batch.
+    :param int queue_size: Max number of batches waiting to be written by each output.
+    :returns: List of output workers.
+    :rtype: list
+    """
+    worker_class = ProcessOutputWorker if mode == FANOUT_PROCESS else ThreadOutputWorker
+    return [worker_class(o, batch_size, queue_size) for o in outputs]
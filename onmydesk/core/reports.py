@@ -4,9 +4,10 @@ Base entity from library, used to centralize outputs and datasets.
 """
 
 from abc import ABCMeta, abstractmethod
+from itertools import islice
 from contextlib2 import ExitStack
 
-from onmydesk.core import datasets, outputs
+from onmydesk.core import datasets, outputs, pipeline
 from onmydesk.utils import with_metaclass
 
 
@@ -32,6 +33,50 @@ class BaseReport(object):
     output_filepaths = []
     """Output files filled by :func:`process`."""
 
+    sink_filepaths = []
+    """Output files already stored by a sink, filled by :func:`process` (they are sink
+    locations, not local files)."""
+
+    prefetch = False
+    """Fetch rows from dataset in a background thread while outputs are written. Lazy
+    datasets (querysets, keyset pages) query on a connection of that thread, outside any
+    transaction of the caller (see :class:`onmydesk.core.pipeline.PrefetchIterator`)."""
+
+    prefetch_batch_size = 1000
+    """Number of rows sent by each batch from prefetch thread."""
+
+    prefetch_queue_size = 4
+    """Max number of batches waiting to be written when using prefetch."""
+
+    pipeline_stats = {}
+    """Prefetch queue depth and stall counters filled by :func:`process` (see
+    :class:`onmydesk.core.pipeline.PrefetchIterator`)."""
+
+    fanout = None
+    """Run each output in its own worker receiving row batches:
+    :data:`onmydesk.core.pipeline.FANOUT_THREAD` or :data:`onmydesk.core.pipeline.FANOUT_PROCESS`.
+    Total time gets closer to the slowest output instead of the sum of all outputs."""
+
+    fanout_batch_size = 1000
+    """Number of rows sent by each batch to output workers."""
+
+    fanout_queue_size = 4
+    """Max number of batches waiting to be written by each output worker."""
+
+    batch_size = None
+    """Number of rows moved together from dataset to :func:`clean_batch` and outputs
+    (`out_many`). Setting it enables batch mode, which is also enabled (with 1000 rows)
+    when :func:`clean_batch` is overridden."""
+
+    sink = None
+    """Sink where output files are stored (see :mod:`onmydesk.core.sinks`), given to all
+    outputs. Without a sink, files are written in temporary directory."""
+
+    columnar = False
+    """Read rows from dataset in columnar batches (:class:`onmydesk.core.batches.RowBatch`)
+    given to :func:`clean_batch` and outputs (`out_many`), so computed columns, totals and
+    type conversions can be vectorized."""
+
     def __init__(self, params=None):
         """Class initializer.
 
@@ -39,22 +84,55 @@ class BaseReport(object):
         fetch data from database, for example).
         """
         self.output_filepaths = []
+        self.sink_filepaths = []
+        self.pipeline_stats = {}
         self.params = params
 
     def process(self):
         """Process report and store output filepaths in :attr:`output_filepaths`."""
+        # Outputs can be shared by reports (class attributes), so their sinks are restored
+        outputs_sinks = [output.sink for output in self.outputs]
+
         for output in self.outputs:
             output.name = self.name
+            if self.sink is not None:
+                output.sink = self.sink
+
+        try:
+            self._process()
+        finally:
+            for output, sink in zip(self.outputs, outputs_sinks):
+                output.sink = sink
 
+    def _process(self):
         with self.dataset as ds:
             with ExitStack() as stack:
-                outputs = [stack.enter_context(o) for o in self.outputs]
+                outputs = [stack.enter_context(o) for o in self._get_outputs()]
 
                 self._write_header(outputs)
-                self._write_content(outputs, ds.iterate(params=self.params))
+
+                items = self._get_items(ds)
+
+                # Column names are computed once by dataset and shared with outputs
+                for output in outputs:
+                    output.columns = ds.columns
+
+                write_content = self._get_content_writer()
+                write_content(outputs, items)
                 self._write_footer(outputs)
 
-                self.output_filepaths = [o.filepath for o in outputs]
+            # Output workers only know their filepaths after finishing
+            self.output_filepaths = [p for o in outputs for p in o.filepaths]
+            self.sink_filepaths = [p for output, o in zip(self.outputs, outputs)
+                                   if output.sink is not None for p in o.filepaths]
+
+    def _get_outputs(self):
+        """Return outputs to be written, wrapped by output workers when `fanout` is enabled."""
+        if not self.fanout:
+            return self.outputs
+
+        return pipeline.output_workers(self.outputs, self.fanout, self.fanout_batch_size,
+                                       self.fanout_queue_size)
 
     def _write_header(self, outputs):
         """Write a header in outputs.
@@ -65,16 +143,101 @@ class BaseReport(object):
             for output in outputs:
                 output.header(self.header)
 
-    def _write_content(self, outputs, items):
-        """Write a normal content in outputs.
+    def _get_items(self, dataset):
+        """Return items (rows or columnar batches) to be written, read from dataset.
+
+        :param BaseDataset dataset: Report dataset.
+        """
+        if self.columnar:
+            items = dataset.iterate_batches(params=self.params,
+                                            batch_size=self.batch_size or 1000)
+        else:
+            items = dataset.iterate(params=self.params)
+
+        if self.prefetch:
+            items = pipeline.PrefetchIterator(items, self.prefetch_batch_size,
+                                              self.prefetch_queue_size)
+            self.pipeline_stats = items.stats
+
+        return items
+
+    def _get_content_writer(self):
+        """Return method used to write content in outputs (by rows, batches or columnar batches)."""
+        if self.columnar:
+            return self._write_row_batches
+
+        if self.batch_size or self._has_clean_batch():
+            return self._write_batches
+
+        return self._write_rows
+
+    def _write_rows(self, outputs, items):
+        """Write a normal content in outputs, row by row.
 
         :param list outputs: A list of output objects.
         :param iterable items: Itens (rows) to be written in outputs.
         """
+        writers = [output.out for output in outputs]
+
+        # row_cleaner is only called for each row when it's overridden
+        if self._has_row_cleaner():
+            row_cleaner = self.row_cleaner
+            items = (row_cleaner(row) for row in items)
+
         for row in items:
-            row = self.row_cleaner(row)
-            for output in outputs:
-                output.out(row)
+            for write in writers:
+                write(row)
+
+    def _write_batches(self, outputs, items):
+        """Write a normal content in outputs, in batches of rows.
+
+        :param list outputs: A list of output objects.
+        :param iterable items: Itens (rows) to be written in outputs.
+        """
+        writers = [output.out_many for output in outputs]
+        batch_size = self.batch_size or 1000
+
+        items = iter(items)
+        batch = list(islice(items, batch_size))
+        while batch:
+            batch = self.clean_batch(batch)
+            for write in writers:
+                write(batch)
+            batch = list(islice(items, batch_size))
+
+    def _write_row_batches(self, outputs, batches):
+        """Write a normal content in outputs, from columnar batches.
+
+        :param list outputs: A list of output objects.
+        :param iterable batches: Batches (:class:`onmydesk.core.batches.RowBatch`) to be
+            written in outputs.
+        """
+        writers = [output.out_many for output in outputs]
+        columns = outputs[0].columns if outputs else None
+
+        for batch in batches:
+            batch = self.clean_batch(batch)
+
+            # Columns computed by clean_batch are given to outputs too (a list of rows
+            # keeps dataset columns)
+            if getattr(batch, 'columns', columns) != columns:
+                columns = batch.columns
+                for output in outputs:
+                    output.columns = columns
+
+            for write in writers:
+                write(batch)
+
+    def _has_row_cleaner(self):
+        """Return True if :func:`row_cleaner` was overridden by report."""
+        return self._is_overridden('row_cleaner')
+
+    def _has_clean_batch(self):
+        """Return True if :func:`clean_batch` was overridden by report."""
+        return self._is_overridden('clean_batch')
+
+    def _is_overridden(self, name):
+        return getattr(getattr(self, name), '__func__', None) is not BaseReport.__dict__[name]
 
     def _write_footer(self, outputs):
         """Write a footer content in outputs.
@@ -95,6 +258,29 @@ class BaseReport(object):
         """
         return row
 
+    def clean_batch(self, rows):
+        """Handle a batch of lines of the report (used on batch mode).
+
+        Overriding it avoids a :func:`row_cleaner` call for each row. E.g.::
+
+            def clean_batch(self, rows):
+                return [(name, '{:.2f}'.format(amount)) for name, amount in rows]
+
+        With `columnar` enabled, rows are a :class:`onmydesk.core.batches.RowBatch`. E.g.::
+
+            def clean_batch(self, batch):
+                batch['amount_cents'] = batch['amount'] * 100
+                return batch
+
+        :param list rows: Lines to be rendered in the report.
+        :returns: Lines after some processing with them.
+        """
+        if not self._has_row_cleaner():
+            return rows
+
+        row_cleaner = self.row_cleaner
+        return [row_cleaner(row) for row in rows]
+
     @classmethod
     def get_form(cls):
         """Return form to be used with this report in admin creation screen.
@@ -148,7 +334,232 @@ class SQLReport(BaseReport):
     db_alias = None
     """Database alias from django config to be used with queries"""
 
+    fetch_size = datasets.SQLDataset.fetch_size
+    """Number of rows fetched from database on each round trip."""
+
+    server_side_cursor = False
+    """Stream rows with a server side cursor (when database supports it)."""
+
+    itersize = datasets.SQLDataset.itersize
+    """Number of rows transferred by each fetch from a server side cursor."""
+
+    row_mode = datasets.SQLDataset.ROW_DICT
+    """Rows given to :func:`row_cleaner` and outputs, OrderedDicts (default) or tuples
+    (:attr:`onmydesk.core.datasets.SQLDataset.ROW_TUPLE`)."""
+
     @property
     def dataset(self):
         """Return SQLDataset to be used by this report."""
-        return datasets.SQLDataset(self.query, self.query_params, self.db_alias)
+        return datasets.SQLDataset(self.query, self.query_params, self.db_alias,
+                                   fetch_size=self.fetch_size,
+                                   server_side=self.server_side_cursor,
+                                   itersize=self.itersize,
+                                   row_mode=self.row_mode)
+
+
+class KeysetSQLReport(SQLReport):
+    """Report to be used with raw SQL's read in pages by a key column.
+
+    Useful on long running exports, each page is read by a short query. E.g.::
+
+        class LedgerReport(KeysetSQLReport):
+            query = 'SELECT id, account, amount FROM ledger'
+            key = 'id'
+
+    A failed export is resumed after the last row written (see :attr:`last_key`). E.g.::
+
+        resumed = LedgerReport()
+        resumed.start_after = report.last_key
+        resumed.process()
+
+    See :class:`onmydesk.core.datasets.KeysetSQLDataset`.
+    """
+
+    key = None
+    """Unique and increasing column from query result used to read pages."""
+
+    page_size = datasets.KeysetSQLDataset.page_size
+    """Number of rows read by each page query."""
+
+    start_after = None
+    """Key value to start after (used to resume an export)."""
+
+    last_key = None
+    """Key of the last row written in outputs, filled by :func:`process`. After a failed
+    :func:`process`, the export is resumed setting it as :attr:`start_after`. With
+    `fanout`, rows were sent to output workers but could be waiting to be written."""
+
+    @property
+    def dataset(self):
+        """Return KeysetSQLDataset to be used by this report."""
+        return datasets.KeysetSQLDataset(self.query, self.key, self.query_params,
+                                         self.db_alias,
+                                         page_size=self.page_size,
+                                         start_after=self.start_after,
+                                         row_mode=self.row_mode)
+
+    def _get_outputs(self):
+        """Return outputs followed by one that tracks the key of rows written before it."""
+        outputs = list(super(KeysetSQLReport, self)._get_outputs())
+        return outputs + [_KeyTracker(self)]
+
+    def _get_items(self, dataset):
+        """Return items read from dataset, keeping the key of the last one read by report.
+
+        Items are tracked after prefetch, so rows read ahead aren't counted.
+        """
+        self.last_key = self.start_after
+        self._read_key = self.start_after
+
+        items = super(KeysetSQLReport, self)._get_items(dataset)
+        return self._track_keys(items, dataset.columns.index(self.key))
+
+    def _track_keys(self, items, key_index):
+        for item in items:
+            if self.columnar:
+                if len(item):
+                    self._read_key = _to_python(item.arrays[key_index][-1])
+            else:
+                self._read_key = item[self.key] if isinstance(item, dict) else item[key_index]
+            yield item
+
+
+class _KeyTracker(outputs.BaseOutput):
+    """Output written after report outputs, so rows read until a write are written.
+
+    It fills :attr:`KeysetSQLReport.last_key`, cleaned rows aren't used (row cleaners can
+    change them), only the key of the last row read by report.
+    """
+
+    def __init__(self, report):
+        """Class initializer.
+
+        :param KeysetSQLReport report: Report with keys to be tracked.
+        """
+        super(_KeyTracker, self).__init__()
+        self.report = report
+
+    def header(self, content):
+        """Header isn't a row."""
+        pass
+
+    def out(self, content):
+        """Keep key of the last row read as written."""
+        self.report.last_key = self.report._read_key
+
+    def out_many(self, contents):
+        """Keep key of the last row read as written."""
+        self.report.last_key = self.report._read_key
+
+    def footer(self, content):
+        """Footer isn't a row."""
+        pass
+
+
+def _to_python(value):
+    """Return a python value from a NumPy one (e.g. a key from a columnar batch)."""
+    return value.item() if hasattr(value, 'item') else value
+
+
+class PartitionedSQLReport(SQLReport):
+    """Report to be used with raw SQL's fetched by partitions in worker processes.
+
+    Query must have placeholders to the params of each partition. E.g.::
+
+        class SalesReport(PartitionedSQLReport):
+            query = 'SELECT * FROM sales WHERE sale_date >= %s AND sale_date < %s'
+
+            def get_partitions(self):
+                return datasets.date_partitions(self.params['start_date'],
+                                                self.params['end_date'])
+
+    See :class:`onmydesk.core.datasets.PartitionedSQLDataset`.
+    """
+
+    partitions = []
+    """List with params of each partition."""
+
+    workers = None
+    """Number of worker processes, default is the number of CPUs."""
+
+    ordered = True
+    """Write rows in partitions order."""
+
+    def get_partitions(self):
+        """Return partitions to be used by this report.
+
+        :returns: List with params of each partition.
+        """
+        return self.partitions
+
+    @property
+    def dataset(self):
+        """Return PartitionedSQLDataset to be used by this report."""
+        return datasets.PartitionedSQLDataset(self.query, self.get_partitions(),
+                                              self.query_params, self.db_alias,
+                                              workers=self.workers,
+                                              ordered=self.ordered,
+                                              fetch_size=self.fetch_size,
+                                              row_mode=self.row_mode)
+
+
+class QuerySetReport(BaseReport):
+    """Report to be used with Django querysets.
+
+    E.g.::
+
+        class UsersReport(QuerySetReport):
+            queryset = User.objects.filter(is_active=True)
+            fields = ('username', 'email', 'profile__city')
+
+        report = UsersReport()
+        report.process()
+
+        print(report.output_filepaths) # --> Files with all active users.
+
+    To use report params, override :func:`get_queryset`.
+    """
+
+    queryset = None
+    """Queryset with report rows."""
+
+    fields = None
+    """Fields (lookups are allowed) to be fetched with `values_list`. Without them rows are
+    model instances and :func:`row_cleaner` must convert them."""
+
+    select_related = None
+    """Relations to be fetched with model instances."""
+
+    only = None
+    """Fields loaded on model instances."""
+
+    chunk_size = datasets.QuerySetDataset.chunk_size
+    """Number of rows fetched from database on each round trip."""
+
+    row_mode = datasets.QuerySetDataset.ROW_DICT
+    """Rows given to :func:`row_cleaner` and outputs when using fields, OrderedDicts
+    (default) or tuples (:attr:`onmydesk.core.datasets.BaseDataset.ROW_TUPLE`)."""
+
+    outputs = (outputs.TSVOutput(),)
+    """Outputs list, default TSV."""
+
+    db_alias = None
+    """Database alias from django config to be used with queries"""
+
+    def get_queryset(self):
+        """Return queryset to be used by this report.
+
+        :returns: Queryset with report rows.
+        """
+        return self.queryset.all()
+
+    @property
+    def dataset(self):
+        """Return QuerySetDataset to be used by this report."""
+        return datasets.QuerySetDataset(self.get_queryset(),
+                                        fields=self.fields,
+                                        chunk_size=self.chunk_size,
+                                        select_related=self.select_related,
+                                        only=self.only,
+                                        db_alias=self.db_alias,
+                                        row_mode=self.row_mode)
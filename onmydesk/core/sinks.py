@@ -0,0 +1,189 @@
+"""Sinks from library.
+
+Sinks are where outputs store their files. Without a sink, outputs write temporary files
+(handled later by `ONMYDESK_FILE_HANDLER`). With a sink, streaming outputs (CSV, TSV and
+JSON Lines) write their content directly to the final destination, and outputs that need
+a local file (like XLSX) copy it to the sink once it's finished. E.g.::
+
+    from onmydesk.core import outputs, reports, sinks
+
+
+    class SalesReport(reports.SQLReport):
+        query = 'SELECT * FROM sales'
+        outputs = (outputs.CSVOutput(compression=outputs.COMPRESSION_GZIP),)
+        sink = sinks.StorageSink(prefix='reports/')
+
+    report = SalesReport()
+    report.process()
+    print(report.output_filepaths)  # --> ['reports/sales-2016-05-16-a1b2c3d.csv.gz']
+"""
+
+import os
+import shutil
+from abc import ABCMeta, abstractmethod
+
+from onmydesk.utils import with_metaclass
+
+
+@with_metaclass(ABCMeta)
+class BaseSink(object):
+    """An abstract representation of a sink.
+
+    Outputs get a location for each file with :func:`get_location` (it's the value stored
+    as report result) and write its content to the binary file object returned by
+    :func:`open`. Closing this file object stores the file.
+    """
+
+    chunk_size = 1024 * 1024
+    """Size in bytes of chunks copied by :func:`save`."""
+
+    def get_location(self, filename):
+        """Return location where a file will be stored (a path, a storage name, an url).
+
+        :param str filename: Filename generated by output.
+        :returns: File location.
+        :rtype: str
+        """
+        return filename
+
+    @abstractmethod
+    def open(self, location):
+        """Return a binary file object to write a file at given location.
+
+        :param str location: Location returned by :func:`get_location`.
+        """
+        raise NotImplementedError()
+
+    def save(self, filepath, location):
+        """Copy a local file to given location and remove it.
+
+        :param str filepath: Local file path.
+        :param str location: Location returned by :func:`get_location`.
+        """
+        with open(filepath, 'rb') as source:
+            target = self.open(location)
+            try:
+                shutil.copyfileobj(source, target, self.chunk_size)
+            finally:
+                target.close()
+
+        os.remove(filepath)
+
+
+class LocalDirectorySink(BaseSink):
+    """Sink storing files in a local directory (useful for testing)."""
+
+    def __init__(self, directory):
+        """Class initializer.
+
+        :param str directory: Directory where files are stored, created if needed.
+        """
+        self.directory = directory
+
+    def get_location(self, filename):
+        """Return file path in sink directory.
+
+        :param str filename: Filename generated by output.
+        :returns: File path.
+        :rtype: str
+        """
+        return os.path.join(self.directory, filename)
+
+    def open(self, location):
+        """Return a binary file opened for writing.
+
+        :param str location: File path returned by :func:`get_location`.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        return open(location, 'wb')
+
+
+class StorageSink(BaseSink):
+    """Sink storing files in a Django storage (`default_storage` by default).
+
+    Storages that support writing by chunks (like multipart uploads to cloud storages)
+    receive the content while it's written.
+    """
+
+    def __init__(self, storage=None, prefix=''):
+        """Class initializer.
+
+        :param Storage storage: Django storage. Optional, default is `default_storage`.
+        :param str prefix: Prefix (directory) added to file names.
+        """
+        self.storage = storage
+        self.prefix = prefix
+
+    def get_storage(self):
+        """Return Django storage used by sink."""
+        if self.storage is None:
+            from django.core.files.storage import default_storage
+            return default_storage
+
+        return self.storage
+
+    def get_location(self, filename):
+        """Return an available name in storage.
+
+        :param str filename: Filename generated by output.
+        :returns: Storage name.
+        :rtype: str
+        """
+        return self.get_storage().get_available_name(self.prefix + filename)
+
+    def open(self, location):
+        """Return a storage file opened for writing.
+
+        :param str location: Storage name returned by :func:`get_location`.
+        """
+        storage = self.get_storage()
+
+        try:
+            # Local storages need the directory to exist
+            directory = os.path.dirname(storage.path(location))
+        except NotImplementedError:
+            directory = None
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        return storage.open(location, 'wb')
+
+
+class FileObjectSink(BaseSink):
+    """Sink writing to file objects created by a factory.
+
+    It can be used with any writer with chunked or multipart semantics, e.g. with
+    `smart_open`::
+
+        sink = FileObjectSink(lambda location: smart_open.open(location, 'wb'),
+                              location_format='s3://my-bucket/reports/{filename}')
+    """
+
+    def __init__(self, factory, location_format='{filename}'):
+        """Class initializer.
+
+        :param callable factory: Callable receiving a location and returning a binary file
+            object opened for writing.
+        :param str location_format: Format used to build locations from filenames.
+        """
+        self.factory = factory
+        self.location_format = location_format
+
+    def get_location(self, filename):
+        """Return location formatted with filename.
+
+        :param str filename: Filename generated by output.
+        :returns: File location.
+        :rtype: str
+        """
+        return self.location_format.format(filename=filename)
+
+    def open(self, location):
+        """Return file object created by factory.
+
+        :param str location: Location returned by :func:`get_location`.
+        """
+        return self.factory(location)
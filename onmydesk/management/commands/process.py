@@ -1,65 +1,314 @@
 """Command used to process pending reports."""
 
-import tempfile
-from os import path
+import multiprocessing
+import signal
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from timeit import default_timer as timer
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
 
-import filelock
 import traceback
 from onmydesk.models import Report
 from onmydesk.utils import log_prefix
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class StopWorker(BaseException):
+    """Raised to interrupt the report being processed (second stop signal).
+
+    It's not an `Exception`, so the report isn't marked as an error and it's requeued.
+    """
+
+    pass
+
+
+def init_worker():
+    """Prepare a pool worker process to process reports.
+
+    Workers are forked (see :func:`Command._get_executor`), so Django is already set up. Parent
+    process closes its connections before starting the pool, so workers don't inherit them
+    and open their own ones.
+    """
+    # Parent process handles stop signals
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def process_report(report_id):
+    """Process a report in a pool worker and return its result to parent process.
+
+    Errors are returned instead of raised, so a failing report doesn't affect others.
+
+    :param int report_id: Report id (already claimed).
+    :returns: Report id, status, elapsed seconds, error and traceback.
+    :rtype: dict
+    """
+    start = timer()
+    result = {'id': report_id, 'error': None, 'traceback': None}
+
+    try:
+        report = Report.objects.get(id=report_id)
+        try:
+            report.process()
+            report.save()
+        finally:
+            result['status'] = report.status
+    except Exception as e:
+        result['status'] = Report.STATUS_ERROR
+        result['error'] = str(e)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        close_old_connections()
+
+    result['elapsed'] = timer() - start
+    return result
+
 
 class Command(BaseCommand):
-    """Process pending reports."""
+    """Process pending reports.
+
+    Reports are claimed in database (see :func:`onmydesk.managers.ReportManager.claim`), so
+    many processes (on many hosts) can run this command at the same time without
+    processing a report twice.
+
+    With `--daemon` it keeps running, waiting for new reports. On SIGTERM or SIGINT it
+    stops after finishing the current report, a second signal interrupts the report and
+    requeues it (back to pending).
+
+    With `--concurrency` reports are processed in a pool of worker processes.
+    """
 
     help = 'Process pending reports'
 
+    #: Report being processed, a second stop signal only interrupts it
+    current_report = None
+
     def add_arguments(self, parser):
         """Add arguments to our command."""
         parser.add_argument('--ids', nargs='+', type=int,
                             help='Report ids to process')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Max number of reports to process, ignored with --ids '
+                                 '(default: 10)')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of worker processes (default: 1)')
+        parser.add_argument('--daemon', action='store_true', default=False,
+                            help='Keep running and processing new reports')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds waited when there are no reports, doubled while '
+                                 'idle (default: 1)')
+        parser.add_argument('--max-poll-interval', type=float, default=30.0,
+                            help='Max seconds waited when there are no reports (default: 30)')
+        parser.add_argument('--max-reports', type=int, default=None,
+                            help='Exit after processing this number of reports (daemon)')
+        parser.add_argument('--max-memory', type=int, default=None,
+                            help='Exit when memory (max RSS in MB) is above it (daemon)')
 
     def handle(self, *args, **options):
         """Entrypoint of our command."""
+        concurrency = options.get('concurrency') or 1
+        if options.get('daemon') and concurrency > 1:
+            raise CommandError('--concurrency is not supported with --daemon, '
+                               'run one daemon for each worker instead')
+
         try:
-            self._process_with_lock(options.get('ids'))
-        except filelock.Timeout:
-            self.stdout.write('Could not obtain lock to process reports')
+            self._run(options, concurrency)
         except Exception as e:
             traceback.print_exc()
             self.stdout.write('Error: {}'.format(str(e)))
 
-    def _process_with_lock(self, ids):
-        lock = filelock.FileLock(self._get_lock_filepath())
+    def _run(self, options, concurrency):
+        ids = options.get('ids')
 
-        with lock.acquire(timeout=10):
-            self._process_reports(ids)
+        # Given reports are all processed, whatever the limit
+        limit = len(ids) if ids else options.get('limit') or 10
 
-    def _process_reports(self, ids):
-        items = Report.objects.filter(status=Report.STATUS_PENDING)
-
-        if ids:
-            items = items.filter(id__in=ids)
+        if options.get('daemon'):
+            self._run_daemon(options)
+        elif concurrency > 1:
+            self._process_reports_concurrently(ids, limit, concurrency)
         else:
-            items = items[:10]
-
-        count = len(items)
-
-        self.stdout.write(log_prefix() + 'Found {} reports to process'.format(count))
-        for i, report in enumerate(items, start=1):
-            self.stdout.write(log_prefix() + 'Processing report #{} - {} of {}'.format(
-                report.id, i, count))
-
-            try:
-                report.process()
-                report.save()
-                self.stdout.write(log_prefix() + 'Report #{} processed'.format(report.id))
-            except Exception as e:
-                traceback.print_exc()
-                self.stderr.write(log_prefix() + 'Error processing report #{}: {}'.format(
-                    report.id, str(e)))
-
-    def _get_lock_filepath(self):
-        return path.join(tempfile.gettempdir(), 'onmydesk-report-processor-lock')
+            self._process_reports(ids, limit)
+
+    def _process_reports(self, ids, limit):
+        count = 0
+
+        # One report is claimed at a time, so other workers get the next ones
+        while count < limit:
+            claimed = Report.objects.claim(limit=1, ids=ids)
+            if not claimed:
+                break
+
+            count += 1
+            self._process_report(claimed[0])
+
+        self.stdout.write(log_prefix() + 'Processed {} reports'.format(count))
+
+    def _process_reports_concurrently(self, ids, limit, concurrency):
+        # All reports are claimed by parent process before starting the pool
+        report_ids = [r.id for r in Report.objects.claim(limit=limit, ids=ids)]
+        if not report_ids:
+            self.stdout.write(log_prefix() + 'Processed 0 reports')
+            return
+
+        # Worker processes must not inherit open connections
+        connections.close_all()
+
+        with self._get_executor(min(concurrency, len(report_ids))) as executor:
+            futures = dict((executor.submit(process_report, report_id), report_id)
+                           for report_id in report_ids)
+
+            for future in as_completed(futures):
+                self._write_result(self._get_result(future, futures[future]))
+
+        self.stdout.write(log_prefix() + 'Processed {} reports'.format(len(report_ids)))
+
+    def _get_executor(self, processes):
+        # Workers are forked from this process where Django is set up, spawned workers
+        # would import models (unpickling process_report) before setting it up
+        context = multiprocessing.get_context('fork')
+        return ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker)
+
+    def _get_result(self, future, report_id):
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            # A worker process died (e.g. killed by OOM killer), reports not finished
+            # would stay in processing forever
+            Report.objects.filter(id=report_id, status=Report.STATUS_PROCESSING).update(
+                status=Report.STATUS_ERROR)
+
+            return {'id': report_id, 'status': Report.STATUS_ERROR, 'elapsed': None,
+                    'error': 'Worker process died ({})'.format(e),
+                    'traceback': traceback.format_exc()}
+
+    def _write_result(self, result):
+        if result['error'] is None:
+            self.stdout.write(log_prefix() + 'Report #{} processed in {:.2f}s'.format(
+                result['id'], result['elapsed']))
+            return
+
+        self.stderr.write(result['traceback'])
+        self.stderr.write(log_prefix() + 'Error processing report #{}: {}'.format(
+            result['id'], result['error']))
+
+    def _process_report(self, report):
+        self.stdout.write(log_prefix() + 'Processing report #{}'.format(report.id))
+
+        try:
+            self.current_report = report
+            report.process()
+            report.save()
+            self.stdout.write(log_prefix() + 'Report #{} processed'.format(report.id))
+        except StopWorker:
+            self._requeue_report(report)
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            self.stderr.write(log_prefix() + 'Error processing report #{}: {}'.format(
+                report.id, str(e)))
+        finally:
+            self.current_report = None
+
+    def _requeue_report(self, report):
+        self.current_report = None
+
+        # Interrupted after processing, it's kept as processed
+        if report.status == Report.STATUS_PROCESSED:
+            report.save()
+            return
+
+        report.status = Report.STATUS_PENDING
+        report.save(update_fields=['status'])
+        self.stdout.write(log_prefix() + 'Report #{} requeued'.format(report.id))
+
+    def _run_daemon(self, options):
+        self.stopping = threading.Event()
+        handlers = self._install_signal_handlers()
+
+        self.stdout.write(log_prefix() + 'Waiting for reports')
+        try:
+            self._daemon_loop(options)
+        except StopWorker:
+            pass
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(log_prefix() + 'Stopped')
+
+    def _daemon_loop(self, options):
+        poll_interval = options.get('poll_interval') or 1.0
+        max_poll_interval = max(options.get('max_poll_interval') or 30.0, poll_interval)
+        max_reports = options.get('max_reports')
+        max_memory = options.get('max_memory')
+
+        interval = poll_interval
+        count = 0
+
+        while not self.stopping.is_set():
+            # Connections closed by database while idle aren't reused
+            close_old_connections()
+
+            claimed = Report.objects.claim(limit=1, ids=options.get('ids'))
+            if not claimed:
+                # Adaptive backoff while there is nothing to do
+                self._wait(interval)
+                interval = min(interval * 2, max_poll_interval)
+                continue
+
+            interval = poll_interval
+            count += 1
+            self._process_report(claimed[0])
+
+            if max_reports and count >= max_reports:
+                self.stdout.write(log_prefix() + 'Max reports reached ({})'.format(count))
+                break
+
+            if max_memory and self._get_memory() > max_memory:
+                self.stdout.write(log_prefix() + 'Max memory reached ({} MB)'.format(
+                    self._get_memory()))
+                break
+
+        self.stdout.write(log_prefix() + 'Processed {} reports'.format(count))
+
+    def _wait(self, seconds):
+        # Returns as soon as a stop signal is received
+        self.stopping.wait(seconds)
+
+    def _get_memory(self):
+        """Return max resident memory of this process (MB)."""
+        if resource is None:
+            return 0
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Linux gives it in KB and macOS in bytes
+        if sys.platform == 'darwin':
+            return max_rss // (1024 * 1024)
+        return max_rss // 1024
+
+    def _install_signal_handlers(self):
+        handlers = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            handlers[signum] = signal.signal(signum, self._handle_stop_signal)
+        return handlers
+
+    def _handle_stop_signal(self, signum, frame):
+        if self.stopping.is_set():
+            # Raised only while processing a report, where it's handled
+            if self.current_report is not None:
+                raise StopWorker()
+            return
+
+        self.stdout.write(log_prefix() + 'Stopping after current report (signal {})'.format(
+            signum))
+        self.stopping.set()
@@ -1,6 +1,146 @@
 """Managers."""
 
-from django.db import models
+from datetime import timedelta
+from functools import partial
+
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from . import settings as app_settings
+
+
+class ReportManager(models.Manager):
+    """Report manager adding methods to handle the queue of pending reports."""
+
+    def pending(self):
+        """Return reports pending to process, by priority and older first."""
+        return self.filter(status=self.model.STATUS_PENDING).order_by('priority', 'id')
+
+    def claim(self, limit=1, ids=None):
+        """Atomically move pending reports to processing and return them.
+
+        Any number of workers (on any number of hosts) can claim reports at the same time,
+        each report is returned to only one of them. Rows are locked with
+        `SELECT ... FOR UPDATE SKIP LOCKED` when database supports it (PostgreSQL, Oracle,
+        MySQL 8), otherwise a compare-and-set UPDATE is used (e.g. on SQLite).
+
+        Reports with lower priority values are claimed first. Among reports with the same
+        priority, the oldest report of the owner (see `ONMYDESK_FAIR_SHARE_BY`) with fewer
+        reports in processing is claimed, so an owner with many queued reports doesn't
+        starve the others. Report classes reaching their limit in
+        `ONMYDESK_MAX_CONCURRENT_BY_REPORT` are not claimed. Reports in processing for longer
+        than `ONMYDESK_PROCESSING_TIMEOUT` are taken as stuck and not counted.
+
+        :param int limit: Max number of reports to claim.
+        :param list ids: Claim only reports with these ids. Optional.
+        :returns: Claimed reports (with status processing), in claim order.
+        :rtype: list
+        """
+        queryset = self.pending()
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+
+        claimed = self._claim_ids(queryset, limit)
+        if not claimed:
+            return []
+
+        reports = self.in_bulk(claimed)
+        return [reports[i] for i in claimed]
+
+    def _claim_ids(self, queryset, limit):
+        """Claim up to `limit` reports from queryset, returning their ids."""
+        claim_one = self._get_claim_function()
+
+        claimed = []
+        skipped = []
+        while len(claimed) < limit:
+            candidates = self._get_candidates(queryset.exclude(id__in=skipped))
+            if not candidates:
+                break
+
+            report_id = claim_one(candidates)
+            if report_id is None:
+                # Other workers are claiming these ones, next reports are tried
+                skipped.extend(candidates)
+                continue
+
+            claimed.append(report_id)
+
+        return claimed
+
+    def _get_claim_function(self):
+        """Return function claiming one of given candidates, as supported by database."""
+        db = router.db_for_write(self.model)
+        if getattr(connections[db].features, 'has_select_for_update_skip_locked', False):
+            return partial(self._claim_skip_locked, db=db)
+
+        return self._claim_compare_and_set
+
+    def _get_candidates(self, queryset):
+        """Return ids of the next report of each owner and report class, best first."""
+        fair_share_by = app_settings.ONMYDESK_FAIR_SHARE_BY
+        max_concurrent = app_settings.ONMYDESK_MAX_CONCURRENT_BY_REPORT
+
+        processing = self._get_processing()
+        running = self._count_by(processing, fair_share_by) if fair_share_by else {}
+        running_by_report = self._count_by(processing, 'report') if max_concurrent else {}
+
+        fields = ['priority', 'report']
+        if fair_share_by and fair_share_by not in fields:
+            fields.append(fair_share_by)
+
+        candidates = []
+        for row in queryset.order_by().values(*fields).annotate(first_id=models.Min('id')):
+            limit = max_concurrent.get(row['report'])
+            if limit is not None and running_by_report.get(row['report'], 0) >= limit:
+                continue
+
+            share = running.get(row[fair_share_by], 0) if fair_share_by else 0
+            candidates.append((row['priority'], share, row['first_id']))
+
+        return [report_id for _, _, report_id in sorted(candidates)]
+
+    def _get_processing(self):
+        """Return reports in processing, except those stuck for longer than the timeout."""
+        processing = self.filter(status=self.model.STATUS_PROCESSING)
+
+        timeout = app_settings.ONMYDESK_PROCESSING_TIMEOUT
+        if timeout:
+            # update_date is stamped when report is claimed
+            processing = processing.filter(
+                update_date__gte=timezone.now() - timedelta(seconds=timeout))
+
+        return processing
+
+    def _count_by(self, queryset, field):
+        rows = queryset.order_by().values(field).annotate(count=models.Count('id'))
+        return dict((row[field], row['count']) for row in rows)
+
+    def _claim_skip_locked(self, candidates, db):
+        with transaction.atomic(using=db):
+            # Rows locked by other workers are skipped instead of waited
+            unlocked = set(self.filter(id__in=candidates, status=self.model.STATUS_PENDING)
+                           .select_for_update(skip_locked=True)
+                           .values_list('id', flat=True))
+
+            for report_id in candidates:
+                if report_id in unlocked:
+                    self.filter(id=report_id).update(
+                        status=self.model.STATUS_PROCESSING, update_date=timezone.now())
+                    return report_id
+
+        return None
+
+    def _claim_compare_and_set(self, candidates):
+        for report_id in candidates:
+            # Only one worker updates the row while it's still pending
+            updated = self.filter(id=report_id, status=self.model.STATUS_PENDING).update(
+                status=self.model.STATUS_PROCESSING, update_date=timezone.now())
+
+            if updated:
+                return report_id
+
+        return None
 
 
 class SchedulerManager(models.Manager):
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onmydesk', '0009_auto_20160516_1714'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='results',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onmydesk', '0010_report_results_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='priority',
+            field=models.SmallIntegerField(choices=[(-10, 'High'), (0, 'Normal'), (10, 'Low')], default=0, help_text='Lower values are processed first'),
+        ),
+        migrations.AlterIndexTogether(
+            name='report',
+            index_together=set([('status', 'priority', 'id')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('onmydesk', '0011_report_priority'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='insert_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creation Date'),
+        ),
+        # Composite index is created before removing the created_by one, foreign keys
+        # must always be indexed on MySQL
+        migrations.AlterIndexTogether(
+            name='report',
+            index_together=set([('status', 'priority', 'id'), ('created_by', 'insert_date')]),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='created_by',
+            field=models.ForeignKey(to=settings.AUTH_USER_MODEL, null=True, on_delete=models.CASCADE, db_index=False),
+        ),
+    ]
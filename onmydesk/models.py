@@ -14,7 +14,7 @@ from django.template import Context
 from django.template.loader import get_template
 
 from . import settings as app_settings
-from .managers import SchedulerManager
+from .managers import ReportManager, SchedulerManager
 from .utils import my_import, str_to_date
 
 
@@ -50,6 +50,8 @@ def output_file_handler(filepath):
 class Report(models.Model):
     """Report model to store generated reports."""
 
+    objects = ReportManager()
+
     STATUS_PENDING = 'pending'
     STATUS_PROCESSING = 'processing'
     STATUS_PROCESSED = 'processed'
@@ -62,19 +64,42 @@ class Report(models.Model):
         (STATUS_ERROR, 'Error'),
     )
 
+    PRIORITY_HIGH = -10
+    PRIORITY_NORMAL = 0
+    PRIORITY_LOW = 10
+
+    PRIORITY_CHOICES = (
+        (PRIORITY_HIGH, 'High'),
+        (PRIORITY_NORMAL, 'Normal'),
+        (PRIORITY_LOW, 'Low'),
+    )
+
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    priority = models.SmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_NORMAL,
+                                        help_text='Lower values are processed first')
     process_time = models.DecimalField(verbose_name='Process time (secs)', max_digits=10,
                                        decimal_places=4, null=True, blank=True)
     params = models.BinaryField(verbose_name='Report params', null=True, blank=True)
 
     report = models.CharField(max_length=255)
-    results = models.CharField(max_length=255, null=True, blank=True)
+    results = models.TextField(null=True, blank=True)
 
-    insert_date = models.DateTimeField('Creation Date', auto_now_add=True)
+    insert_date = models.DateTimeField('Creation Date', auto_now_add=True, db_index=True)
     update_date = models.DateTimeField('Update Date', auto_now=True)
 
+    # Indexed by (created_by, insert_date), see Meta
     created_by = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, db_index=False)
+
+    class Meta:
+        """Report model options."""
+
+        index_together = [
+            # Used to claim pending reports (see ReportManager.claim)
+            ('status', 'priority', 'id'),
+            # Used by admin, listing user reports newer first
+            ('created_by', 'insert_date'),
+        ]
 
     def __str__(self):
         """Return string representation of object."""
@@ -125,11 +150,7 @@ class Report(models.Model):
             report.process()
             self.process_time = Decimal(timer()) - start
 
-            results = []
-            for filepath in report.output_filepaths:
-                results.append(output_file_handler(filepath))
-
-            self.results = ';'.join(results)
+            self.results = ';'.join(self._get_results(report))
 
             self.status = Report.STATUS_PROCESSED
             self.save(update_fields=['status'])
@@ -138,6 +159,18 @@ class Report(models.Model):
             self.save(update_fields=['status'])
             raise e
 
+    def _get_results(self, report):
+        """Return results of a processed report (its output files, handled or not)."""
+        results = []
+        for filepath in report.output_filepaths:
+            # Files stored by a sink aren't local files to be handled
+            if filepath in report.sink_filepaths:
+                results.append(filepath)
+            else:
+                results.append(output_file_handler(filepath))
+
+        return results
+
     @property
     def result_links(self):
         """Return a list with links to access report results.
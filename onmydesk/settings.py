@@ -9,6 +9,11 @@ ONMYDESK_DOWNLOAD_LINK_HANDLER = getattr(settings, 'ONMYDESK_DOWNLOAD_LINK_HANDL
 
 ONMYDESK_FILE_HANDLER = getattr(settings, 'ONMYDESK_FILE_HANDLER', None)
 
+# Queue
+ONMYDESK_FAIR_SHARE_BY = getattr(settings, 'ONMYDESK_FAIR_SHARE_BY', 'created_by')
+ONMYDESK_MAX_CONCURRENT_BY_REPORT = getattr(settings, 'ONMYDESK_MAX_CONCURRENT_BY_REPORT', {})
+ONMYDESK_PROCESSING_TIMEOUT = getattr(settings, 'ONMYDESK_PROCESSING_TIMEOUT', 12 * 60 * 60)
+
 # E-mail notification
 ONMYDESK_NOTIFY_FROM = getattr(
     settings, 'ONMYDESK_NOTIFY_FROM',
@@ -1,8 +1,11 @@
 """Testing commands from library."""
 
+import os
 import sys
+from concurrent.futures import Future
 from datetime import date
 from django.core import management
+from django.core.management.base import CommandError
 from django.test import TestCase
 
 try:
@@ -114,3 +117,355 @@ class SchedulerProcesssTestCase(TestCase):
             self.assertEqual(Report.objects.all().count(), 0)
             management.call_command('scheduler_process')
             self.assertEqual(Report.objects.all().count(), 0)
+
+
+class ProcessBaseTestCase(TestCase):
+
+    def setUp(self):
+        def my_output_file_handler(filepath):
+            return filepath
+
+        self._patch('onmydesk.models.output_file_handler', my_output_file_handler)
+
+        self.report_instance = mock.MagicMock()
+        self.report_instance.output_filepaths = ['/tmp/flunfa.tsv']
+        self.report_class = mock.MagicMock(return_value=self.report_instance)
+        self.report_class.name = 'My Report'
+
+        self._patch('onmydesk.models.my_import', return_value=self.report_class)
+
+    def _patch(self, *args, **kwargs):
+        patcher = mock.patch(*args, **kwargs)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def _create_reports(self, count, status=Report.STATUS_PENDING):
+        return [Report.objects.create(report='my_report_class', status=status)
+                for i in range(count)]
+
+
+class ProcessTestCase(ProcessBaseTestCase):
+
+    def test_call_must_process_pending_reports(self):
+        reports = self._create_reports(2)
+        self._create_reports(1, status=Report.STATUS_PROCESSING)
+
+        out = StringIO()
+        management.call_command('process', stdout=out)
+
+        for report in reports:
+            report = Report.objects.get(id=report.id)
+            self.assertEqual(report.status, Report.STATUS_PROCESSED)
+            self.assertEqual(report.results, '/tmp/flunfa.tsv')
+
+        self.assertEqual(self.report_instance.process.call_count, 2)
+        self.assertIn('Processed 2 reports', out.getvalue())
+
+    def test_call_must_process_until_limit(self):
+        self._create_reports(3)
+
+        management.call_command('process', limit=2, stdout=StringIO())
+
+        self.assertEqual(Report.objects.pending().count(), 1)
+
+    def test_call_with_ids_must_process_only_given_reports(self):
+        reports = self._create_reports(2)
+
+        management.call_command('process', ids=[reports[1].id], stdout=StringIO())
+
+        self.assertEqual(list(Report.objects.pending()), reports[:1])
+
+    def test_call_with_ids_must_not_be_limited_by_limit(self):
+        reports = self._create_reports(4)
+
+        management.call_command('process', ids=[r.id for r in reports[1:]], limit=2,
+                                stdout=StringIO())
+
+        self.assertEqual(list(Report.objects.pending()), reports[:1])
+
+    def test_call_must_continue_after_report_error(self):
+        reports = self._create_reports(2)
+        self.report_instance.process.side_effect = [Exception('Query error'), None]
+
+        errout = StringIO()
+        with mock.patch('onmydesk.management.commands.process.traceback'):
+            management.call_command('process', stdout=StringIO(), stderr=errout)
+
+        self.assertIn('Error processing report #{}: Query error'.format(reports[0].id),
+                      errout.getvalue())
+        self.assertEqual(Report.objects.get(id=reports[0].id).status, Report.STATUS_ERROR)
+        self.assertEqual(Report.objects.get(id=reports[1].id).status,
+                         Report.STATUS_PROCESSED)
+
+
+class ProcessDaemonTestCase(ProcessBaseTestCase):
+
+    def setUp(self):
+        super(ProcessDaemonTestCase, self).setUp()
+        self.waits = []
+        self.wait_mocked = self._patch(
+            'onmydesk.management.commands.process.Command._wait', autospec=True,
+            side_effect=self._wait)
+
+    def _wait(self, command, seconds):
+        self.waits.append(seconds)
+        if len(self.waits) >= 4:
+            command.stopping.set()
+
+    def test_daemon_must_process_reports_and_back_off_while_idle(self):
+        reports = self._create_reports(2)
+
+        out = StringIO()
+        management.call_command('process', daemon=True, poll_interval=1,
+                                max_poll_interval=3, stdout=out)
+
+        for report in reports:
+            self.assertEqual(Report.objects.get(id=report.id).status,
+                             Report.STATUS_PROCESSED)
+
+        self.assertEqual(self.waits, [1, 2, 3, 3])
+        self.assertIn('Processed 2 reports', out.getvalue())
+
+    def test_daemon_must_exit_after_max_reports(self):
+        self._create_reports(3)
+
+        management.call_command('process', daemon=True, max_reports=2, stdout=StringIO())
+
+        self.assertEqual(Report.objects.pending().count(), 1)
+        self.assertEqual(self.waits, [])
+
+    def test_daemon_must_exit_when_memory_is_above_max_memory(self):
+        self._create_reports(2)
+
+        with mock.patch('onmydesk.management.commands.process.Command._get_memory',
+                        return_value=600):
+            management.call_command('process', daemon=True, max_memory=500,
+                                    stdout=StringIO())
+
+        self.assertEqual(Report.objects.pending().count(), 1)
+
+    def test_first_stop_signal_must_finish_current_report(self):
+        import os
+        import signal
+
+        reports = self._create_reports(2)
+        self.report_instance.process.side_effect = lambda: os.kill(os.getpid(),
+                                                                   signal.SIGTERM)
+
+        management.call_command('process', daemon=True, stdout=StringIO())
+
+        self.assertEqual(Report.objects.get(id=reports[0].id).status,
+                         Report.STATUS_PROCESSED)
+        self.assertEqual(Report.objects.get(id=reports[1].id).status,
+                         Report.STATUS_PENDING)
+        self.assertIsNot(signal.getsignal(signal.SIGTERM),
+                         self.report_instance.process.side_effect)
+
+    def test_second_stop_signal_must_requeue_current_report(self):
+        import os
+        import signal
+
+        reports = self._create_reports(1)
+
+        def process():
+            os.kill(os.getpid(), signal.SIGTERM)
+            os.kill(os.getpid(), signal.SIGINT)
+
+        self.report_instance.process.side_effect = process
+
+        out = StringIO()
+        management.call_command('process', daemon=True, stdout=out)
+
+        self.assertEqual(Report.objects.get(id=reports[0].id).status,
+                         Report.STATUS_PENDING)
+        self.assertIn('Report #{} requeued'.format(reports[0].id), out.getvalue())
+
+    def test_second_stop_signal_must_not_interrupt_when_not_processing_report(self):
+        from onmydesk.management.commands import process
+
+        command = process.Command(stdout=StringIO())
+        command.stopping = mock.MagicMock()
+        command.stopping.is_set.return_value = True
+
+        # Nothing is raised while waiting for reports
+        command._handle_stop_signal(process.signal.SIGINT, None)
+
+    def test_second_stop_signal_must_not_requeue_processed_report(self):
+        from onmydesk.management.commands import process
+
+        report = self._create_reports(1)[0]
+        report.status = Report.STATUS_PROCESSED
+        report.process = mock.MagicMock()
+
+        # Interrupted while saving the processed report
+        report.save = mock.MagicMock(side_effect=[process.StopWorker(), None])
+
+        out = StringIO()
+        command = process.Command(stdout=out)
+        with self.assertRaises(process.StopWorker):
+            command._process_report(report)
+
+        self.assertEqual(report.status, Report.STATUS_PROCESSED)
+        self.assertEqual(report.save.call_args_list, [mock.call(), mock.call()])
+        self.assertNotIn('requeued', out.getvalue())
+        self.assertIsNone(command.current_report)
+
+
+def kill_worker(report_id):
+    """Replace process_report in a real pool, the worker dies as killed by OOM killer."""
+    os._exit(1)
+
+
+class FakeExecutor(object):
+    """Executor running tasks synchronously in the same process."""
+
+    def __init__(self, processes, mp_context=None, initializer=None):
+        """Keep number of processes, tasks run in current process."""
+        self.processes = processes
+        self.closed = False
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def __enter__(self):
+        """Enter from context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Shut executor down."""
+        self.closed = True
+
+
+class ProcessConcurrencyTestCase(ProcessBaseTestCase):
+
+    def setUp(self):
+        super(ProcessConcurrencyTestCase, self).setUp()
+        self.pools = []
+
+        def get_executor(processes, **kwargs):
+            pool = FakeExecutor(processes, **kwargs)
+            self.pools.append(pool)
+            return pool
+
+        self.context_mocked = self._patch(
+            'onmydesk.management.commands.process.multiprocessing.get_context')
+        self.pool_mocked = self._patch(
+            'onmydesk.management.commands.process.ProcessPoolExecutor',
+            side_effect=get_executor)
+
+    def test_call_must_process_reports_in_pool(self):
+        reports = self._create_reports(3)
+
+        out = StringIO()
+        management.call_command('process', concurrency=2, stdout=out)
+
+        for report in reports:
+            report = Report.objects.get(id=report.id)
+            self.assertEqual(report.status, Report.STATUS_PROCESSED)
+            self.assertEqual(report.results, '/tmp/flunfa.tsv')
+            self.assertIn('Report #{} processed in '.format(report.id), out.getvalue())
+
+        self.assertEqual(len(self.pools), 1)
+        self.assertEqual(self.pools[0].processes, 2)
+        self.assertTrue(self.pools[0].closed)
+        self.assertIn('Processed 3 reports', out.getvalue())
+
+    def test_call_must_not_start_more_processes_than_reports(self):
+        self._create_reports(1)
+
+        management.call_command('process', concurrency=4, stdout=StringIO())
+
+        self.assertEqual(self.pools[0].processes, 1)
+
+    def test_call_must_not_start_pool_without_pending_reports(self):
+        out = StringIO()
+        management.call_command('process', concurrency=4, stdout=out)
+
+        self.assertFalse(self.pool_mocked.called)
+        self.assertIn('Processed 0 reports', out.getvalue())
+
+    def test_call_must_process_until_limit(self):
+        self._create_reports(3)
+
+        management.call_command('process', concurrency=2, limit=2, stdout=StringIO())
+
+        self.assertEqual(Report.objects.pending().count(), 1)
+
+    def test_call_with_ids_must_not_be_limited_by_limit(self):
+        reports = self._create_reports(4)
+
+        management.call_command('process', concurrency=2, ids=[r.id for r in reports[1:]],
+                                limit=2, stdout=StringIO())
+
+        self.assertEqual(list(Report.objects.pending()), reports[:1])
+
+    def test_call_must_isolate_report_errors(self):
+        reports = self._create_reports(2)
+        self.report_instance.process.side_effect = [Exception('Query error'), None]
+
+        errout = StringIO()
+        management.call_command('process', concurrency=2, stdout=StringIO(), stderr=errout)
+
+        self.assertEqual(Report.objects.get(id=reports[0].id).status, Report.STATUS_ERROR)
+        self.assertEqual(Report.objects.get(id=reports[1].id).status,
+                         Report.STATUS_PROCESSED)
+        self.assertIn('Error processing report #{}: Query error'.format(reports[0].id),
+                      errout.getvalue())
+        self.assertIn('Traceback', errout.getvalue())
+
+    def test_call_with_daemon_must_not_accept_concurrency(self):
+        self._create_reports(1)
+
+        with self.assertRaises(CommandError) as cm:
+            management.call_command('process', daemon=True, concurrency=2, stdout=StringIO())
+
+        self.assertIn('--concurrency is not supported with --daemon', str(cm.exception))
+
+        self.assertEqual(Report.objects.pending().count(), 1)
+
+    def test_call_must_close_connections_before_starting_pool(self):
+        self._create_reports(2)
+
+        with mock.patch('onmydesk.management.commands.process.connections') as connections_mocked:
+            management.call_command('process', concurrency=2, stdout=StringIO())
+
+        connections_mocked.close_all.assert_called_once_with()
+
+    def test_call_must_fork_pool_workers(self):
+        self._create_reports(2)
+
+        management.call_command('process', concurrency=2, stdout=StringIO())
+
+        # Spawned workers would import models before Django is set up
+        self.context_mocked.assert_called_once_with('fork')
+        self.assertEqual(self.pool_mocked.call_args[1]['mp_context'],
+                         self.context_mocked.return_value)
+
+    def test_init_worker_must_ignore_sigint(self):
+        from onmydesk.management.commands import process
+
+        with mock.patch.object(process.signal, 'signal') as signal_mocked:
+            process.init_worker()
+
+        signal_mocked.assert_called_once_with(process.signal.SIGINT, process.signal.SIG_IGN)
+
+
+class ProcessConcurrencyWorkerDeathTestCase(ProcessBaseTestCase):
+
+    def test_call_must_mark_reports_as_error_when_worker_dies(self):
+        from onmydesk.management.commands import process
+
+        reports = self._create_reports(2)
+
+        errout = StringIO()
+        with mock.patch.object(process, 'process_report', kill_worker):
+            management.call_command('process', concurrency=2, stdout=StringIO(),
+                                    stderr=errout)
+
+        for report in reports:
+            self.assertEqual(Report.objects.get(id=report.id).status, Report.STATUS_ERROR)
+            self.assertIn('Error processing report #{}: Worker process died'.format(report.id),
+                          errout.getvalue())
@@ -1,6 +1,12 @@
 """Testing core entities from library."""
 
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
 from datetime import date
+from unittest import skipIf
 try:
     from unittest import mock
 except ImportError:
@@ -9,9 +15,13 @@ from hashlib import sha224
 from collections import OrderedDict
 from slugify import slugify
 
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
-from onmydesk.core import datasets, outputs, reports
+from onmydesk.core import batches, datasets, outputs, pipeline, reports, sinks
+from onmydesk.models import Report
 
 
 class SQLDatasetTestCase(TestCase):
@@ -76,6 +86,109 @@ class SQLDatasetTestCase(TestCase):
 
         self.assertTrue(my_connection.cursor.called)
 
+    def test_iterate_must_fetch_rows_in_batches_with_fetch_size(self):
+        mocked_cursor = self._create_mocked_cursor()
+        mocked_cursor.fetchmany.side_effect = [
+            [('Alisson', 25)],
+            [('Joao', 12)],
+            [],
+        ]
+
+        with mock.patch('onmydesk.core.datasets.connection.cursor', return_value=mocked_cursor):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa', fetch_size=1)
+            with dataset:
+                results = list(dataset.iterate())
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(mocked_cursor.fetchmany.mock_calls, [mock.call(1)] * 3)
+
+    def test_iterate_with_server_side_must_use_chunked_cursor_with_itersize(self):
+        mocked_cursor = self._create_mocked_cursor()
+        mocked_connection = mock.MagicMock()
+        mocked_connection.settings_dict = {}
+        mocked_connection.chunked_cursor.return_value = mocked_cursor
+
+        with mock.patch('onmydesk.core.datasets.connection', mocked_connection):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa', server_side=True, itersize=50)
+            with dataset:
+                results = list(dataset.iterate())
+
+        self.assertEqual(len(results), 2)
+        self.assertFalse(mocked_connection.cursor.called)
+        self.assertEqual(mocked_cursor.fetchmany.mock_calls, [mock.call(50)] * 2)
+
+    def test_iterate_with_server_side_must_not_use_chunked_cursor_when_disabled(self):
+        mocked_cursor = self._create_mocked_cursor()
+        mocked_connection = mock.MagicMock()
+        mocked_connection.settings_dict = {'DISABLE_SERVER_SIDE_CURSORS': True}
+        mocked_connection.cursor.return_value = mocked_cursor
+
+        with mock.patch('onmydesk.core.datasets.connection', mocked_connection):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa', server_side=True)
+            with dataset:
+                results = list(dataset.iterate())
+
+        self.assertEqual(len(results), 2)
+        self.assertFalse(mocked_connection.chunked_cursor.called)
+        self.assertEqual(mocked_cursor.fetchmany.mock_calls,
+                         [mock.call(dataset.fetch_size)] * 2)
+
+    def test_iterate_with_server_side_must_fall_back_to_cursor_without_support(self):
+        mocked_cursor = self._create_mocked_cursor()
+        mocked_connection = mock.MagicMock(spec=['cursor'])
+        mocked_connection.cursor.return_value = mocked_cursor
+
+        with mock.patch('onmydesk.core.datasets.connection', mocked_connection):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa', server_side=True)
+            with dataset:
+                results = list(dataset.iterate())
+
+        self.assertEqual(len(results), 2)
+        self.assertTrue(mocked_connection.cursor.called)
+        self.assertEqual(mocked_cursor.fetchmany.mock_calls,
+                         [mock.call(dataset.fetch_size)] * 2)
+
+    def test_iterate_with_tuple_row_mode_must_return_tuples(self):
+        mocked_cursor = self._create_mocked_cursor()
+
+        with mock.patch('onmydesk.core.datasets.connection.cursor', return_value=mocked_cursor):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa',
+                                          row_mode=datasets.SQLDataset.ROW_TUPLE)
+            with dataset:
+                results = list(dataset.iterate())
+
+        self.assertEqual(results, [('Alisson', 25), ('Joao', 12)])
+
+    def test_iterate_must_fill_columns_when_called(self):
+        mocked_cursor = self._create_mocked_cursor()
+
+        with mock.patch('onmydesk.core.datasets.connection.cursor', return_value=mocked_cursor):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa')
+            with dataset:
+                self.assertIsNone(dataset.columns)
+                dataset.iterate()
+                self.assertEqual(dataset.columns, ('name', 'age'))
+
+    def test_iterate_batches_must_return_a_row_batch_by_fetch(self):
+        mocked_cursor = self._create_mocked_cursor()
+
+        with mock.patch('onmydesk.core.datasets.connection.cursor', return_value=mocked_cursor):
+            dataset = datasets.SQLDataset('SELECT * FROM flunfa')
+            with dataset:
+                results = list(dataset.iterate_batches(batch_size=10))
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].columns, ('name', 'age'))
+        self.assertEqual(list(results[0]), [('Alisson', 25), ('Joao', 12)])
+        mocked_cursor.fetchmany.assert_called_with(10)
+
+    def test_iterate_with_server_side_on_sqlite_must_return_rows(self):
+        dataset = datasets.SQLDataset('SELECT 1 AS one, 2 AS two', server_side=True)
+        with dataset:
+            results = list(dataset.iterate())
+
+        self.assertEqual(results, [OrderedDict([('one', 1), ('two', 2)])])
+
     def _create_mocked_cursor(self):
         mocked_cursor = mock.MagicMock()
 
@@ -84,13 +197,361 @@ class SQLDatasetTestCase(TestCase):
             ('age', 'Other info...'),
         ]
 
-        mocked_cursor.fetchone.side_effect = [
-            ('Alisson', 25),
-            ('Joao', 12),
+        mocked_cursor.fetchmany.side_effect = [
+            [('Alisson', 25), ('Joao', 12)],
+            [],
         ]
         return mocked_cursor
 
 
+class KeysetSQLDatasetTestCase(TestCase):
+
+    query = 'SELECT id, report FROM onmydesk_report WHERE report <> %s'
+
+    def setUp(self):
+        self.reports = [Report.objects.create(report='report_{}'.format(i)) for i in range(5)]
+        Report.objects.create(report='ignored')
+
+    def test_iterate_must_return_all_rows_ordered_by_key(self):
+        dataset = datasets.KeysetSQLDataset(self.query, 'id', ['ignored'], page_size=2)
+
+        with dataset:
+            results = list(dataset.iterate())
+
+        expected_result = [OrderedDict([('id', r.id), ('report', r.report)])
+                           for r in self.reports]
+
+        self.assertEqual(results, expected_result)
+        self.assertEqual(dataset.columns, ('id', 'report'))
+
+    def test_iterate_must_read_one_bounded_query_by_page(self):
+        dataset = datasets.KeysetSQLDataset(self.query, 'id', ['ignored'], page_size=2)
+
+        with CaptureQueriesContext(connection) as context:
+            list(dataset.iterate())
+
+        selects = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT')]
+
+        self.assertEqual(len(selects), 3)
+        self.assertTrue(all('LIMIT 2' in q for q in selects))
+
+    def test_iterate_must_fill_last_key_with_last_row_consumed(self):
+        dataset = datasets.KeysetSQLDataset(self.query, 'id', ['ignored'], page_size=2,
+                                            row_mode=datasets.KeysetSQLDataset.ROW_TUPLE)
+
+        rows = dataset.iterate()
+        next(rows)
+        consumed = next(rows)
+        last_read = next(rows)
+
+        # Last row read isn't consumed until the next one is requested
+        self.assertEqual(dataset.last_key, consumed[0])
+        self.assertEqual(last_read, (self.reports[2].id, self.reports[2].report))
+
+    def test_iterate_with_start_after_must_resume_after_key(self):
+        dataset = datasets.KeysetSQLDataset(self.query, 'id', ['ignored'], page_size=2,
+                                            start_after=self.reports[2].id,
+                                            row_mode=datasets.KeysetSQLDataset.ROW_TUPLE)
+
+        results = list(dataset.iterate())
+
+        self.assertEqual(results, [(r.id, r.report) for r in self.reports[3:]])
+
+    def test_iterate_batches_must_read_one_bounded_query_by_page(self):
+        dataset = datasets.KeysetSQLDataset(self.query, 'id', ['ignored'], page_size=2)
+
+        with CaptureQueriesContext(connection) as context:
+            results = list(dataset.iterate_batches(batch_size=3))
+
+        selects = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT')]
+
+        self.assertEqual(len(selects), 3)
+        self.assertTrue(all('LIMIT 2' in q for q in selects))
+        self.assertEqual([len(batch) for batch in results], [3, 2])
+        self.assertEqual([row for batch in results for row in batch],
+                         [(r.id, r.report) for r in self.reports])
+        self.assertEqual(dataset.last_key, self.reports[-1].id)
+
+
+class BaseDatasetTestCase(TestCase):
+
+    def test_iterate_batches_must_group_rows_from_iterate(self):
+        def iterate(self, params=None):
+            return [(i, i * 2) for i in range(5)]
+
+        dataset_class = type('MyDataset', (datasets.BaseDataset,), {'iterate': iterate})
+
+        results = list(dataset_class().iterate_batches(batch_size=2))
+
+        self.assertEqual([len(b) for b in results], [2, 2, 1])
+        self.assertEqual(list(results[-1]), [(4, 8)])
+
+
+class PartitionsTestCase(TestCase):
+
+    def test_id_range_partitions_must_cover_all_ids(self):
+        self.assertEqual(datasets.id_range_partitions(1, 10, 3),
+                         [(1, 5), (5, 9), (9, 11)])
+
+    def test_id_range_partitions_with_more_partitions_than_ids(self):
+        self.assertEqual(datasets.id_range_partitions(1, 2, 5), [(1, 2), (2, 3)])
+
+    def test_date_partitions_must_cover_all_dates(self):
+        self.assertEqual(datasets.date_partitions(date(2016, 5, 1), date(2016, 5, 5), days=2),
+                         [(date(2016, 5, 1), date(2016, 5, 3)),
+                          (date(2016, 5, 3), date(2016, 5, 5)),
+                          (date(2016, 5, 5), date(2016, 5, 6))])
+
+    def test_hash_partitions_must_return_count_and_remainders(self):
+        self.assertEqual(datasets.hash_partitions(3), [(3, 0), (3, 1), (3, 2)])
+
+
+class FakeAsyncResult(object):
+    """Result of a task sent to :class:`FakePool` (value is already computed)."""
+
+    def __init__(self, pool, value):
+        """Keep computed value, pool tracks which results are running."""
+        self.pool = pool
+        self.value = value
+
+    def ready(self):
+        # Last task sent finishes first
+        return self is self.pool.running[-1]
+
+    def wait(self, timeout=None):
+        pass
+
+    def get(self):
+        self.pool.running.remove(self)
+        return self.value
+
+
+class FakePool(object):
+    """Pool running tasks in the current process (it shares test database connection)."""
+
+    def __init__(self):
+        """Start a pool without running tasks."""
+        self.terminated = False
+        self.closed = False
+        self.running = []
+        self.max_running = 0
+
+    def apply_async(self, func, args):
+        result = FakeAsyncResult(self, func(*args))
+        self.running.append(result)
+        self.max_running = max(self.max_running, len(self.running))
+        return result
+
+    def close(self):
+        self.closed = True
+
+    def join(self):
+        pass
+
+    def terminate(self):
+        self.terminated = True
+
+
+class PartitionedSQLDatasetTestCase(TestCase):
+
+    query = 'SELECT id, report FROM onmydesk_report WHERE id >= %s AND id < %s'
+
+    def setUp(self):
+        self.reports = [Report.objects.create(report='report_{}'.format(i)) for i in range(5)]
+        self.partitions = datasets.id_range_partitions(self.reports[0].id, self.reports[-1].id, 2)
+
+        self.pool = FakePool()
+        patcher = mock.patch.object(datasets.PartitionedSQLDataset, '_create_pool',
+                                    return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_iterate_must_return_rows_from_all_partitions_in_order(self):
+        dataset = datasets.PartitionedSQLDataset(self.query, self.partitions)
+
+        with dataset:
+            results = list(dataset.iterate())
+
+        expected_result = [OrderedDict([('id', r.id), ('report', r.report)])
+                           for r in self.reports]
+
+        self.assertEqual(results, expected_result)
+        self.assertEqual(dataset.columns, ('id', 'report'))
+        self.assertTrue(self.pool.closed)
+
+    def test_iterate_with_ordered_false_must_return_rows_as_partitions_finish(self):
+        dataset = datasets.PartitionedSQLDataset(self.query, self.partitions, ordered=False,
+                                                 workers=2,
+                                                 row_mode=datasets.BaseDataset.ROW_TUPLE)
+
+        results = list(dataset.iterate())
+
+        self.assertEqual(sorted(results), [(r.id, r.report) for r in self.reports])
+        self.assertNotEqual(results, sorted(results))
+
+    def test_iterate_must_keep_one_partition_by_worker_in_flight(self):
+        partitions = datasets.id_range_partitions(self.reports[0].id, self.reports[-1].id, 5)
+        dataset = datasets.PartitionedSQLDataset(self.query, partitions, workers=2,
+                                                 row_mode=datasets.BaseDataset.ROW_TUPLE)
+
+        results = list(dataset.iterate())
+
+        self.assertEqual(results, [(r.id, r.report) for r in self.reports])
+        self.assertEqual(self.pool.max_running, 2)
+
+    def test_iterate_must_append_partition_params_to_query_params(self):
+        query = 'SELECT id FROM onmydesk_report WHERE report <> %s AND id >= %s AND id < %s'
+        dataset = datasets.PartitionedSQLDataset(query, self.partitions,
+                                                 query_params=['report_0'],
+                                                 row_mode=datasets.BaseDataset.ROW_TUPLE)
+
+        results = list(dataset.iterate())
+
+        self.assertEqual(results, [(r.id,) for r in self.reports[1:]])
+
+    def test_iterate_must_terminate_pool_if_iteration_is_interrupted(self):
+        dataset = datasets.PartitionedSQLDataset(self.query, self.partitions)
+
+        rows = dataset.iterate()
+        next(rows)
+        rows.close()
+
+        self.assertTrue(self.pool.terminated)
+
+    def test_iterate_without_partitions_must_return_no_rows(self):
+        dataset = datasets.PartitionedSQLDataset(self.query, [])
+
+        self.assertEqual(list(dataset.iterate()), [])
+
+
+class QuerySetDatasetTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='alisson', email='alisson@test.com')
+        Report.objects.create(report='my_report_class', created_by=self.user)
+        Report.objects.create(report='other_report_class', created_by=self.user)
+
+        self.queryset = Report.objects.order_by('id')
+
+    def test_iterate_with_fields_must_return_ordered_dicts(self):
+        dataset = datasets.QuerySetDataset(self.queryset,
+                                           fields=('report', 'created_by__username'))
+
+        with dataset:
+            results = list(dataset.iterate())
+
+        expected_result = [
+            OrderedDict([('report', 'my_report_class'), ('created_by__username', 'alisson')]),
+            OrderedDict([('report', 'other_report_class'), ('created_by__username', 'alisson')]),
+        ]
+
+        self.assertEqual(results, expected_result)
+        self.assertEqual(dataset.columns, ('report', 'created_by__username'))
+
+    def test_iterate_with_fields_and_tuple_row_mode_must_return_tuples(self):
+        dataset = datasets.QuerySetDataset(self.queryset, fields=('report',),
+                                           row_mode=datasets.QuerySetDataset.ROW_TUPLE)
+
+        results = list(dataset.iterate())
+
+        self.assertEqual(results, [('my_report_class',), ('other_report_class',)])
+
+    def test_iterate_without_fields_must_return_model_instances_with_projections(self):
+        dataset = datasets.QuerySetDataset(self.queryset, select_related=('created_by',),
+                                           only=('report', 'created_by__username'))
+
+        with self.assertNumQueries(1):
+            results = [(r.report, r.created_by.username) for r in dataset.iterate()]
+
+        self.assertEqual(results, [('my_report_class', 'alisson'),
+                                   ('other_report_class', 'alisson')])
+        self.assertIsNone(dataset.columns)
+
+    def test_iterate_must_use_queryset_iterator_with_chunk_size(self):
+        queryset = mock.MagicMock()
+
+        dataset = datasets.QuerySetDataset(queryset, fields=('report',), chunk_size=10)
+        dataset.iterate()
+
+        queryset.values_list.assert_called_once_with('report')
+        queryset.values_list.return_value.iterator.assert_called_once_with(chunk_size=10)
+
+    def test_iterate_must_use_db_alias(self):
+        queryset = mock.MagicMock()
+
+        dataset = datasets.QuerySetDataset(queryset, fields=('report',), db_alias='my-db-alias')
+        dataset.iterate()
+
+        queryset.using.assert_called_once_with('my-db-alias')
+
+
+class RowBatchTestCase(TestCase):
+
+    def setUp(self):
+        self.rows = [('Alisson', 38, 10.5), ('Joao', 13, None)]
+
+    def test_from_rows_must_store_rows_by_column(self):
+        batch = batches.RowBatch.from_rows(('name', 'age', 'amount'), self.rows)
+
+        self.assertEqual(batch.columns, ('name', 'age', 'amount'))
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch['name']), ['Alisson', 'Joao'])
+        self.assertEqual(list(batch.rows()), self.rows)
+
+    def test_from_rows_with_dicts_must_use_keys_as_columns(self):
+        rows = [OrderedDict([('name', 'Alisson'), ('age', 38)]),
+                OrderedDict([('name', 'Joao'), ('age', 13)])]
+
+        batch = batches.RowBatch.from_rows(None, rows)
+
+        self.assertEqual(batch.columns, ('name', 'age'))
+        self.assertEqual(list(batch), [('Alisson', 38), ('Joao', 13)])
+
+    def test_from_rows_without_columns_must_use_indexes(self):
+        batch = batches.RowBatch.from_rows(None, self.rows)
+
+        self.assertEqual(batch.columns, (0, 1, 2))
+
+    def test_rows_must_return_python_values(self):
+        batch = batches.RowBatch.from_rows(('name', 'age', 'amount'), self.rows)
+
+        name, age, amount = next(batch.rows())
+
+        self.assertIs(type(age), int)
+        self.assertIs(type(name), str)
+
+    def test_numeric_columns_must_be_numpy_arrays_when_available(self):
+        if batches.numpy is None:
+            self.skipTest('NumPy is not installed')
+
+        batch = batches.RowBatch.from_rows(('name', 'age', 'amount'), self.rows)
+
+        self.assertIsInstance(batch['age'], batches.numpy.ndarray)
+        self.assertEqual(batch['age'].dtype.kind, 'i')
+        self.assertEqual(batch['name'].dtype, object)
+        self.assertEqual(batch['amount'].dtype, object)
+
+    def test_columns_must_be_lists_without_numpy(self):
+        with mock.patch('onmydesk.core.batches.numpy', None):
+            batch = batches.RowBatch.from_rows(('name', 'age', 'amount'), self.rows)
+
+        self.assertEqual(batch['age'], [38, 13])
+
+    def test_setitem_must_add_computed_column(self):
+        batch = batches.RowBatch.from_rows(('name', 'age', 'amount'), self.rows)
+
+        batch['age_in_months'] = batch['age'] * 12 if batches.numpy else [456, 156]
+
+        self.assertEqual(batch.columns, ('name', 'age', 'amount', 'age_in_months'))
+        self.assertEqual(list(batch.rows())[0], ('Alisson', 38, 10.5, 456))
+
+    def test_setitem_with_wrong_length_must_raise_error(self):
+        batch = batches.RowBatch.from_rows(('name', 'age', 'amount'), self.rows)
+
+        with self.assertRaises(ValueError):
+            batch['other'] = [1]
+
+
 class BaseOutputTestCase(TestCase):
 
     @classmethod
@@ -228,14 +689,15 @@ class TSVOutputTestCase(TestCase):
 
             output.footer(('test footer',))
 
-        expected_calls = [
-            mock.call(['Name', 'Age']),
-            mock.call(['Alisson', '38']),
-            mock.call(['Joao', '13']),
-            mock.call(['test footer']),
+        # Values are converted by csv module itself
+        expected_rows = [
+            ['Name', 'Age'],
+            ['Alisson', 38],
+            ['Joao', 13],
+            ['test footer'],
         ]
 
-        self.assertEqual(self.writer.writerow.mock_calls, expected_calls)
+        self.assertEqual([list(c[1][0]) for c in self.writer.writerow.mock_calls], expected_rows)
 
     def test_process_with_dataset_with_ordered_dict_must_write_data_into_a_file(self):
         iterable_object = [
@@ -250,14 +712,400 @@ class TSVOutputTestCase(TestCase):
 
             output.footer(('test footer',))
 
-        expected_calls = [
-            mock.call(['Name', 'Age']),
-            mock.call(['Alisson', '38']),
-            mock.call(['Joao', '13']),
-            mock.call(['test footer']),
+        # Values are converted by csv module itself
+        expected_rows = [
+            ['Name', 'Age'],
+            ['Alisson', 38],
+            ['Joao', 13],
+            ['test footer'],
         ]
 
-        self.assertEqual(self.writer.writerow.mock_calls, expected_calls)
+        self.assertEqual([list(c[1][0]) for c in self.writer.writerow.mock_calls], expected_rows)
+
+
+class CompressedSVOutputTestCase(TestCase):
+
+    def _write(self, output):
+        with output:
+            output.header(('Name', 'Age'))
+            output.out_many([('Alisson', 38), ('Joao', 13)])
+
+        self.addCleanup(os.remove, output.filepath)
+
+    def test_compressed_outputs_must_write_readable_files(self):
+        import bz2
+        import gzip
+        import lzma
+
+        openers = {
+            outputs.COMPRESSION_GZIP: gzip.open,
+            outputs.COMPRESSION_BZ2: bz2.open,
+            outputs.COMPRESSION_XZ: lzma.open,
+        }
+
+        for compression, opener in openers.items():
+            output = outputs.TSVOutput(compression=compression)
+            self._write(output)
+
+            self.assertTrue(output.filepath.endswith(
+                '.tsv.{}'.format(outputs.COMPRESSION_EXTENSIONS[compression])))
+
+            with opener(output.filepath, 'rt') as f:
+                self.assertEqual(f.read().splitlines(),
+                                 ['Name\tAge', 'Alisson\t38', 'Joao\t13'])
+
+    def test_compressed_output_must_use_given_level(self):
+        output = outputs.CSVOutput(compression=outputs.COMPRESSION_GZIP, level=1)
+
+        with mock.patch('onmydesk.core.outputs.gzip.open') as gzip_open_mocked:
+            with output:
+                pass
+
+        gzip_open_mocked.assert_called_once_with(output.filepath, 'wt', compresslevel=1)
+
+    def test_unknown_compression_must_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            outputs.CSVOutput(compression='zip')
+
+
+class SVOutputConversionTestCase(TestCase):
+
+    def _read(self, output, rows):
+        with output:
+            output.header(('Name', 'Birth', 'Amount'))
+            output.out(rows[0])
+            output.out_many(rows[1:])
+
+        self.addCleanup(os.remove, output.filepath)
+
+        with open(output.filepath) as f:
+            return f.read().splitlines()
+
+    def test_out_must_write_values_converted_by_csv_module(self):
+        from decimal import Decimal
+
+        rows = [
+            ('Alisson', date(1978, 1, 23), Decimal('10.50')),
+            OrderedDict([('name', 'Joao'), ('birth', None), ('amount', 1.5)]),
+        ]
+
+        self.assertEqual(self._read(outputs.CSVOutput(), rows), [
+            'Name,Birth,Amount',
+            'Alisson,1978-01-23,10.50',
+            'Joao,,1.5',
+        ])
+
+    def test_out_with_date_format_and_null_value_must_convert_values(self):
+        rows = [
+            ('Alisson', date(1978, 1, 23), None),
+            ('Joao', None, 2),
+            ('Maria', date(2001, 2, 3), 3),
+        ]
+
+        output = outputs.CSVOutput(date_format='%d/%m/%Y', null_value='NULL')
+
+        self.assertEqual(self._read(output, rows), [
+            'Name,Birth,Amount',
+            'Alisson,23/01/1978,NULL',
+            'Joao,NULL,2',
+            'Maria,03/02/2001,3',
+        ])
+
+    def test_buffer_size_must_be_given_to_open(self):
+        output = outputs.TSVOutput(buffer_size=1024 * 1024)
+
+        with mock.patch('onmydesk.core.outputs.open', create=True) as open_mocked:
+            with output:
+                pass
+
+        open_mocked.assert_called_once_with(output.filepath, 'w+', buffering=1024 * 1024)
+
+    def test_buffer_size_with_compression_must_write_readable_file(self):
+        import gzip
+
+        output = outputs.TSVOutput(compression=outputs.COMPRESSION_GZIP, buffer_size=4096)
+        with output:
+            output.out_many([('Alisson', 38), ('Joao', 13)])
+
+        self.addCleanup(os.remove, output.filepath)
+
+        with gzip.open(output.filepath, 'rt') as f:
+            self.assertEqual(f.read().splitlines(), ['Alisson\t38', 'Joao\t13'])
+
+
+class SVOutputSplitTestCase(TestCase):
+
+    def _write(self, output, rows):
+        with output:
+            output.header(('Name', 'Age'))
+            output.out(rows[0])
+            output.out_many(rows[1:])
+            output.footer(('Total', 71))
+
+        parts = []
+        for filepath in output.filepaths:
+            self.addCleanup(os.remove, filepath)
+            with open(filepath) as f:
+                parts.append(f.read().splitlines())
+
+        return parts
+
+    def test_max_rows_must_split_in_parts_with_header(self):
+        output = outputs.CSVOutput(max_rows=2)
+        parts = self._write(output, [('Alisson', 38), ('Joao', 13), ('Maria', 20)])
+
+        self.assertEqual(parts, [
+            ['Name,Age', 'Alisson,38', 'Joao,13'],
+            ['Name,Age', 'Maria,20', 'Total,71'],
+        ])
+        self.assertEqual(output.filepath, output.filepaths[0])
+        self.assertTrue(output.filepaths[0].endswith('-part-0001.csv'))
+        self.assertTrue(output.filepaths[1].endswith('-part-0002.csv'))
+
+    def test_max_bytes_must_split_in_parts_not_larger_than_limit(self):
+        output = outputs.TSVOutput(max_bytes=24)
+        parts = self._write(output, [('Alisson', 38), ('Joao', 13), ('Maria', 20)])
+
+        # Header (9 bytes) + 'Alisson\t38' (11 bytes) + 'Joao\t13' (8 bytes) > 24
+        self.assertEqual(parts, [
+            ['Name\tAge', 'Alisson\t38'],
+            ['Name\tAge', 'Joao\t13'],
+            ['Name\tAge', 'Maria\t20', 'Total\t71'],
+        ])
+
+        # Footer isn't counted by limits
+        for filepath in output.filepaths[:-1]:
+            self.assertLessEqual(os.path.getsize(filepath), 24)
+
+    def test_max_rows_must_write_footer_in_last_part(self):
+        output = outputs.CSVOutput(max_rows=2)
+        parts = self._write(output, [('Alisson', 38), ('Joao', 13), ('Maria', 20),
+                                     ('Jose', 40)])
+
+        self.assertEqual(parts, [
+            ['Name,Age', 'Alisson,38', 'Joao,13'],
+            ['Name,Age', 'Maria,20', 'Jose,40', 'Total,71'],
+        ])
+
+    def test_max_bytes_must_count_bytes_of_non_ascii_lines(self):
+        output = outputs.CSVOutput(max_bytes=28)
+        parts = self._write(output, [('João', 13), ('Zoë', 20), ('Ana', 7)])
+
+        # Header (10 bytes) + 'João,13' (10 bytes) + 'Zoë,20' (9 bytes) > 28, but
+        # it would fit counting characters (9 + 8)
+        self.assertEqual(parts, [
+            ['Name,Age', 'João,13'],
+            ['Name,Age', 'Zoë,20', 'Ana,7', 'Total,71'],
+        ])
+
+    def test_split_output_must_register_all_parts_in_report(self):
+        dataset_mocked = mock.MagicMock()
+        dataset_mocked.__enter__.return_value = dataset_mocked
+        dataset_mocked.iterate.return_value = [('Alisson', 38), ('Joao', 13), ('Maria', 20)]
+
+        report_class = type('SplitReport', (reports.BaseReport,), dict(
+            name='Split report',
+            header=('Name', 'Age'),
+            dataset=dataset_mocked,
+            outputs=(outputs.CSVOutput(max_rows=1),),
+        ))
+
+        report = report_class()
+        report.process()
+
+        for filepath in report.output_filepaths:
+            self.addCleanup(os.remove, filepath)
+
+        self.assertEqual(len(report.output_filepaths), 3)
+        self.assertTrue(report.output_filepaths[2].endswith('-part-0003.csv'))
+
+
+class JSONLinesOutputTestCase(TestCase):
+
+    def _read(self, output, opener=open):
+        self.addCleanup(os.remove, output.filepath)
+
+        with opener(output.filepath, 'rt') as f:
+            return f.read().splitlines()
+
+    def test_out_must_write_rows_with_header_as_keys(self):
+        with outputs.JSONLinesOutput() as output:
+            output.header(('name', 'age'))
+            output.out(('Alisson', 38))
+            output.out_many([('Joao', 13), OrderedDict([('name', 'Maria'), ('age', 20)])])
+            output.footer(('Total', 71))
+
+        self.assertTrue(output.filepath.endswith('.jsonl'))
+        self.assertEqual(self._read(output), [
+            '{"name":"Alisson","age":38}',
+            '{"name":"Joao","age":13}',
+            '{"name":"Maria","age":20}',
+        ])
+
+    def test_out_must_prefer_columns_and_write_arrays_without_keys(self):
+        with outputs.JSONLinesOutput() as output:
+            output.out(('Alisson', 38))
+            output.columns = ('name', 'age')
+            output.out(('Joao', 13))
+
+        self.assertEqual(self._read(output), ['["Alisson",38]', '{"name":"Joao","age":13}'])
+
+    def test_out_must_write_dates_and_decimals(self):
+        from decimal import Decimal
+
+        rows = [('Alisson', date(1978, 1, 23), Decimal('10.50'))]
+
+        with outputs.JSONLinesOutput() as output:
+            output.out_many(rows)
+
+        with outputs.JSONLinesOutput(date_format='%d/%m/%Y',
+                                     decimal_as=outputs.JSONLinesOutput.DECIMAL_FLOAT) as other:
+            other.out_many(rows)
+
+        self.assertEqual(self._read(output), ['["Alisson","1978-01-23","10.50"]'])
+        self.assertEqual(self._read(other), ['["Alisson","23/01/1978",10.5]'])
+
+    def test_out_with_compression_must_write_compressed_file(self):
+        import gzip
+
+        with outputs.JSONLinesOutput(compression=outputs.COMPRESSION_GZIP) as output:
+            output.header(('name',))
+            output.out(('Alisson',))
+
+        self.assertTrue(output.filepath.endswith('.jsonl.gz'))
+        self.assertEqual(self._read(output, gzip.open), ['{"name":"Alisson"}'])
+
+
+class ParquetOutputTestCase(TestCase):
+
+    def _read(self, output):
+        self.addCleanup(os.remove, output.filepath)
+        return outputs.pyarrow.parquet.ParquetFile(output.filepath)
+
+    def test_enter_without_pyarrow_must_raise_import_error(self):
+        with mock.patch('onmydesk.core.outputs.pyarrow', None):
+            with self.assertRaises(ImportError):
+                with outputs.ParquetOutput():
+                    pass
+
+    @skipIf(outputs.pyarrow is None, 'pyarrow is not installed')
+    def test_out_must_write_row_groups_with_inferred_schema(self):
+        with outputs.ParquetOutput(row_group_size=2) as output:
+            output.header(('name', 'age'))
+            output.out(('Alisson', 38))
+            output.out_many([OrderedDict([('name', 'Joao'), ('age', 13)]), ('Maria', 20)])
+            output.footer(('Total', 71))
+
+        parquet_file = self._read(output)
+
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        self.assertEqual(parquet_file.read().to_pydict(),
+                         {'name': ['Alisson', 'Joao', 'Maria'], 'age': [38, 13, 20]})
+
+    @skipIf(outputs.pyarrow is None, 'pyarrow is not installed')
+    def test_out_many_with_row_batch_must_write_its_columns(self):
+        batch = batches.RowBatch.from_rows(('name', 'age'), [('Alisson', 38), ('Joao', 13)])
+
+        with outputs.ParquetOutput() as output:
+            output.columns = ('name', 'age')
+            output.out_many(batch)
+
+        self.assertEqual(self._read(output).read().to_pydict(),
+                         {'name': ['Alisson', 'Joao'], 'age': [38, 13]})
+
+    @skipIf(outputs.pyarrow is None, 'pyarrow is not installed')
+    def test_out_many_with_row_batches_must_write_row_groups_of_row_group_size(self):
+        rows = [('Alisson', 38), ('Joao', 13), ('Maria', 20), ('Jose', 40), ('Ana', 7),
+                ('Pedro', 9), ('Rita', 31)]
+
+        with outputs.ParquetOutput(row_group_size=3) as output:
+            output.columns = ('name', 'age')
+            output.out_many(batches.RowBatch.from_rows(output.columns, rows[:2]))
+            output.out_many(batches.RowBatch.from_rows(output.columns, rows[2:4]))
+            output.out(rows[4])
+            output.out_many(batches.RowBatch.from_rows(output.columns, rows[5:]))
+
+        parquet_file = self._read(output)
+
+        self.assertEqual([parquet_file.metadata.row_group(i).num_rows
+                          for i in range(parquet_file.metadata.num_row_groups)], [3, 3, 1])
+        self.assertEqual(parquet_file.read().to_pydict(),
+                         {'name': [r[0] for r in rows], 'age': [r[1] for r in rows]})
+
+    @skipIf(outputs.pyarrow is None, 'pyarrow is not installed')
+    def test_out_with_schema_must_use_given_types(self):
+        schema = [('name', outputs.pyarrow.string()), ('age', outputs.pyarrow.float64())]
+
+        with outputs.ParquetOutput(schema=schema) as output:
+            output.out(('Alisson', None))
+            output.out(('Joao', 13))
+
+        table = self._read(output).read()
+        self.assertEqual(str(table.schema.field('age').type), 'double')
+        self.assertEqual(table.to_pydict()['age'], [None, 13.0])
+
+
+class SQLiteOutputTestCase(TestCase):
+
+    def _query(self, output, sql):
+        import sqlite3
+
+        self.addCleanup(os.remove, output.filepath)
+
+        db = sqlite3.connect(output.filepath)
+        try:
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
+
+    def test_out_must_insert_rows_in_batches_with_types(self):
+        from decimal import Decimal
+
+        with outputs.SQLiteOutput(table='sales', batch_size=2, transaction_size=3) as output:
+            output.header(('name', 'birth', 'amount', 'age'))
+            output.out(('Alisson', date(1978, 1, 23), Decimal('10.50'), None))
+            output.out_many([
+                OrderedDict([('name', 'Joao'), ('birth', None), ('amount', Decimal('1')),
+                             ('age', 13)]),
+                ('Maria', date(2001, 2, 3), Decimal('2.5'), 20),
+            ])
+            output.footer(('Total', None, Decimal('14'), 33))
+
+        self.assertTrue(output.filepath.endswith('.sqlite3'))
+        self.assertFalse(os.path.exists(output.filepath + '-wal'))
+
+        rows = self._query(output, 'SELECT * FROM sales ORDER BY name')
+        self.assertEqual(rows, [
+            ('Alisson', '1978-01-23', 10.5, None),
+            ('Joao', None, 1, 13),
+            ('Maria', '2001-02-03', 2.5, 20),
+        ])
+
+    def test_exit_must_create_indexes_after_load(self):
+        with outputs.SQLiteOutput(indexes=['name', ('age', 'name')]) as output:
+            output.columns = ('name', 'age')
+            output.out(('Alisson', 38))
+
+        indexes = self._query(
+            output, "SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name")
+        self.assertEqual(indexes, [('report_idx_0',), ('report_idx_1',)])
+
+    def test_exit_without_rows_must_create_empty_table(self):
+        with outputs.SQLiteOutput() as output:
+            output.header(('name', 'age'))
+
+        self.assertEqual(self._query(output, 'SELECT COUNT(*) FROM report'), [(0,)])
+
+
+class BaseOutputOutManyTestCase(TestCase):
+
+    def test_out_many_must_call_out_for_each_content(self):
+        output = mock.MagicMock()
+
+        outputs.BaseOutput.out_many(output, [('Alisson', 38), ('Joao', 13)])
+
+        self.assertEqual(output.out.mock_calls,
+                         [mock.call(('Alisson', 38)), mock.call(('Joao', 13))])
 
 
 class CSVOutputTestCase(TestCase):
@@ -315,14 +1163,31 @@ class CSVOutputTestCase(TestCase):
 
             output.footer(('test footer',))
 
-        expected_calls = [
-            mock.call(['Name', 'Age']),
-            mock.call(['Alisson', '38']),
-            mock.call(['Joao', '13']),
-            mock.call(['test footer']),
+        # Values are converted by csv module itself
+        expected_rows = [
+            ['Name', 'Age'],
+            ['Alisson', 38],
+            ['Joao', 13],
+            ['test footer'],
         ]
 
-        self.assertEqual(self.writer_mocked.writerow.mock_calls, expected_calls)
+        self.assertEqual([list(c[1][0]) for c in self.writer_mocked.writerow.mock_calls], expected_rows)
+
+    def test_out_many_must_write_rows_at_once_in_csv_writer(self):
+        with outputs.CSVOutput() as output:
+            output.out_many([('Alisson', 38), OrderedDict([('name', 'Joao'), ('age', 13)])])
+
+        (rows,), _ = self.writer_mocked.writerows.call_args
+        self.assertEqual([list(r) for r in rows], [['Alisson', 38], ['Joao', 13]])
+
+    def test_out_many_with_row_batch_must_write_its_rows(self):
+        batch = batches.RowBatch.from_rows(('name', 'age'), [('Alisson', 38), ('Joao', 13)])
+
+        with outputs.CSVOutput() as output:
+            output.out_many(batch)
+
+        (rows,), _ = self.writer_mocked.writerows.call_args
+        self.assertEqual([list(r) for r in rows], [['Alisson', 38], ['Joao', 13]])
 
     def test_process_with_ordered_dict_dataset_must_write_into_a_file(self):
         iterable_object = [
@@ -337,14 +1202,15 @@ class CSVOutputTestCase(TestCase):
 
             output.footer(('test footer',))
 
-        expected_calls = [
-            mock.call(['Name', 'Age']),
-            mock.call(['Alisson', '38']),
-            mock.call(['Joao', '13']),
-            mock.call(['test footer']),
+        # Values are converted by csv module itself
+        expected_rows = [
+            ['Name', 'Age'],
+            ['Alisson', 38],
+            ['Joao', 13],
+            ['test footer'],
         ]
 
-        self.assertEqual(self.writer_mocked.writerow.mock_calls, expected_calls)
+        self.assertEqual([list(c[1][0]) for c in self.writer_mocked.writerow.mock_calls], expected_rows)
 
 
 class XLSXOutputTestCase(TestCase):
@@ -382,6 +1248,13 @@ class XLSXOutputTestCase(TestCase):
         self.workbook_const_mocked.assert_called_once_with(
             output.filepath)
 
+    def test_constant_memory_must_call_lib_constructor_with_constant_memory_option(self):
+        with outputs.XLSXOutput(constant_memory=True) as output:
+            output.out(('Alisson', 38))
+
+        self.workbook_const_mocked.assert_called_once_with(
+            output.filepath, {'constant_memory': True})
+
     def test_call_out_must_call_workbook_add_worksheet(self):
         with outputs.XLSXOutput() as output:
             output.out(('Alisson', 38))
@@ -509,6 +1382,265 @@ class XLSXOutputTestCase(TestCase):
 
         self.assertTrue(self.workbook_mocked.close.called)
 
+    def test_first_rows_width_strategy_must_measure_only_first_rows(self):
+        with outputs.XLSXOutput(width_strategy=outputs.XLSXOutput.WIDTH_FIRST_ROWS,
+                                width_rows=1) as output:
+            output.header(['Name', 'Age'])
+            output.out(['Alisson dos Reis', 38])
+            output.out(['Alisson dos Reis Perez', 38])
+            output.footer(['Total of all the ages', 76])
+
+            widths = output.get_column_widths()
+
+        self.assertEqual(widths[0], len('Total of all the ages'))
+        self.assertEqual(widths[1], output.min_width)
+
+    def test_sample_width_strategy_must_measure_a_sample_of_rows(self):
+        with outputs.XLSXOutput(width_strategy=outputs.XLSXOutput.WIDTH_SAMPLE,
+                                width_rows=10) as output:
+            for i in range(1000):
+                output.out(['x' * (i % 20), i])
+
+            self.assertEqual(len(output.reservoir), 10)
+            widths = output.get_column_widths()
+
+        self.assertGreaterEqual(widths[0], output.min_width)
+        self.assertLessEqual(widths[0], 19)
+
+    def test_sample_width_strategy_must_measure_all_rows_if_they_fit_in_sample(self):
+        with outputs.XLSXOutput(width_strategy=outputs.XLSXOutput.WIDTH_SAMPLE) as output:
+            output.out(['Alisson dos Reis Perez', 38])
+            output.out(['Joao', 13])
+
+            widths = output.get_column_widths()
+
+        self.assertEqual(widths, {0: len('Alisson dos Reis Perez'), 1: output.min_width})
+
+    def test_fixed_width_strategy_must_use_given_widths_by_position_or_name(self):
+        with outputs.XLSXOutput(width_strategy=outputs.XLSXOutput.WIDTH_FIXED,
+                                column_widths={0: 30, 'Age': 5}) as output:
+            output.header(['Name', 'Age', 'City'])
+            output.out(['Alisson dos Reis Perez dos Santos', 38, 'Rio de Janeiro - RJ'])
+
+        self.assertEqual(self.worksheet_mocked.set_column.mock_calls, [
+            mock.call(0, 0, 30),
+            mock.call(1, 1, 5),
+        ])
+
+
+class PrefetchIteratorTestCase(TestCase):
+
+    def test_iterate_must_return_all_rows_in_order(self):
+        rows = [(i, 'row {}'.format(i)) for i in range(25)]
+
+        results = list(pipeline.PrefetchIterator(iter(rows), batch_size=4, queue_size=2))
+
+        self.assertEqual(results, rows)
+
+    def test_iterate_must_fill_stats(self):
+        rows = pipeline.PrefetchIterator(iter(range(10)), batch_size=4, queue_size=2)
+        list(rows)
+
+        self.assertEqual(rows.stats['batches'], 3)
+        self.assertEqual(rows.stats['rows'], 10)
+        self.assertLessEqual(rows.stats['queue_depth_max'], 2)
+        for key in ('queue_depth_avg', 'producer_stalls', 'consumer_stalls'):
+            self.assertIn(key, rows.stats)
+
+    def test_iterate_must_raise_error_from_dataset(self):
+        def my_rows():
+            yield 1
+            raise ValueError('Database error')
+
+        with self.assertRaises(ValueError):
+            list(pipeline.PrefetchIterator(my_rows(), batch_size=1))
+
+    def test_iterate_must_not_hang_when_reader_thread_dies(self):
+        class ThreadKilled(BaseException):
+            pass
+
+        def my_rows():
+            yield 1
+            raise ThreadKilled()
+
+        with self.assertRaises(ThreadKilled):
+            list(pipeline.PrefetchIterator(my_rows(), batch_size=1))
+
+    def test_iterate_must_close_connections_of_reader_thread(self):
+        closed_by = []
+
+        def close(connection):
+            closed_by.append(threading.current_thread().name)
+
+        with mock.patch.object(type(connections['default']), 'close', autospec=True,
+                               side_effect=close):
+            list(pipeline.PrefetchIterator(iter(range(10)), batch_size=4))
+
+        self.assertIn('onmydesk-prefetch', closed_by)
+
+    def test_iterate_must_stop_reader_thread_if_consumer_stops(self):
+        rows = pipeline.PrefetchIterator(iter(range(1000)), batch_size=1, queue_size=1)
+
+        iterator = iter(rows)
+        next(iterator)
+        iterator.close()
+
+        self.assertLess(rows.stats['rows'], 1000)
+
+
+class ThreadOutputWorkerTestCase(TestCase):
+
+    def setUp(self):
+        self.output_mocked = mock.MagicMock()
+        self.output_mocked.filepath = '/tmp/flunfa.tsv'
+        self.output_mocked.filepaths = ['/tmp/flunfa.tsv']
+
+    def test_worker_must_write_header_rows_and_footer_in_output(self):
+        with pipeline.ThreadOutputWorker(self.output_mocked, batch_size=2) as output:
+            output.header(('Name', 'Age'))
+            output.out(('Alisson', 38))
+            output.out(('Joao', 13))
+            output.out(('Maria', 20))
+            output.footer(('Total', 71))
+
+        self.assertEqual(self.output_mocked.mock_calls, [
+            mock.call.__enter__(),
+            mock.call.header(('Name', 'Age')),
+            mock.call.out_many([('Alisson', 38), ('Joao', 13)]),
+            mock.call.out_many([('Maria', 20)]),
+            mock.call.footer(('Total', 71)),
+            mock.call.__exit__(None, None, None),
+        ])
+        self.assertEqual(output.filepath, '/tmp/flunfa.tsv')
+
+    def test_worker_must_set_columns_on_output(self):
+        with pipeline.ThreadOutputWorker(self.output_mocked) as output:
+            output.columns = ('name', 'age')
+
+        self.assertEqual(self.output_mocked.columns, ('name', 'age'))
+
+    def test_worker_must_raise_error_from_output(self):
+        self.output_mocked.out_many.side_effect = ValueError('Disk full')
+
+        with self.assertRaises(ValueError):
+            with pipeline.ThreadOutputWorker(self.output_mocked, batch_size=1,
+                                             queue_size=1) as output:
+                for i in range(100):
+                    output.out((i,))
+
+
+class ProcessOutputWorkerTestCase(TestCase):
+
+    def test_worker_must_write_output_in_child_process(self):
+        csv_output = outputs.CSVOutput()
+
+        with pipeline.ProcessOutputWorker(csv_output, batch_size=2) as output:
+            output.header(('Name', 'Age'))
+            output.out(('Alisson', 38))
+            output.out(('Joao', 13))
+            output.out(('Maria', 20))
+
+        self.addCleanup(os.remove, output.filepath)
+
+        self.assertEqual(csv_output.filepath, output.filepath)
+        with open(output.filepath) as f:
+            self.assertEqual(f.read().splitlines(),
+                             ['Name,Age', 'Alisson,38', 'Joao,13', 'Maria,20'])
+
+    def test_worker_must_raise_error_from_output(self):
+        output_mocked = mock.MagicMock()
+        output_mocked.out_many.side_effect = ValueError('Disk full')
+
+        with self.assertRaises(ValueError):
+            with pipeline.ProcessOutputWorker(output_mocked) as output:
+                output.out(('Alisson', 38))
+
+
+class XLSXOutputConstantMemoryTestCase(TestCase):
+
+    def test_constant_memory_file_must_keep_formats_frozen_pane_and_widths(self):
+        with outputs.XLSXOutput(constant_memory=True) as output:
+            output.header(['Name', 'Age'])
+            output.out(['Alisson dos Reis Perez', 38])
+            output.out(['Joao', 13])
+            output.footer(['Total', 51])
+
+        self.addCleanup(os.remove, output.filepath)
+
+        with zipfile.ZipFile(output.filepath) as xlsx:
+            sheet = xlsx.read('xl/worksheets/sheet1.xml').decode('utf-8')
+
+        self.assertIn('state="frozen"', sheet)
+        self.assertIn('<col min="1" max="1" width="22.7', sheet)
+        self.assertIn('<c r="A1" s="1"', sheet)  # Header format
+        self.assertIn('<c r="A4" s="2"', sheet)  # Footer format
+        self.assertIn('Alisson dos Reis Perez', sheet)  # Inline strings (constant memory)
+
+
+class XLSXOutputRolloverTestCase(TestCase):
+
+    def _write(self, output):
+        with output:
+            output.header(['Name', 'Age'])
+            output.out(['Alisson', 38])
+            output.out(['Joao', 13])
+            output.out(['Maria', 20])
+            output.footer(['Total', 71])
+
+        for filepath in output.filepaths:
+            self.addCleanup(os.remove, filepath)
+
+    def _read_sheets(self, filepath):
+        with zipfile.ZipFile(filepath) as xlsx:
+            return [xlsx.read(n).decode('utf-8') for n in sorted(xlsx.namelist())
+                    if n.startswith('xl/worksheets/sheet')]
+
+    def test_rollover_sheet_must_add_sheets_with_header(self):
+        output = outputs.XLSXOutput(constant_memory=True, max_rows=3)
+        self._write(output)
+
+        self.assertEqual(output.filepaths, [output.filepath])
+
+        sheets = self._read_sheets(output.filepath)
+        self.assertEqual(len(sheets), 2)
+        self.assertIn('Joao', sheets[0])
+        self.assertIn('Maria', sheets[1])
+        for sheet in sheets:
+            self.assertIn('<c r="A1" s="1"', sheet)  # Header repeated
+            self.assertIn('state="frozen"', sheet)
+
+    def test_rollover_file_must_create_part_files(self):
+        output = outputs.XLSXOutput(constant_memory=True, max_rows=2,
+                                    rollover=outputs.XLSXOutput.ROLLOVER_FILE)
+        self._write(output)
+
+        # Header and one row by file, footer goes to the last one
+        self.assertEqual(len(output.filepaths), 4)
+        self.assertEqual(output.filepaths[0], output.filepath)
+        for part, filepath in enumerate(output.filepaths, 1):
+            self.assertTrue(filepath.endswith('-part-{:04d}.xlsx'.format(part)))
+
+        for filepath, name in zip(output.filepaths, ['Alisson', 'Joao', 'Maria', 'Total']):
+            sheets = self._read_sheets(filepath)
+            self.assertEqual(len(sheets), 1)
+            self.assertIn(name, sheets[0])
+            self.assertIn('<c r="A1" s="1"', sheets[0])
+
+    def test_rollover_must_respect_max_bytes(self):
+        output = outputs.XLSXOutput(constant_memory=True, max_bytes=22)
+        self._write(output)
+
+        # Header (7 chars) with 'Alisson', 38 and 'Joao', 13 (22 chars) in the first sheet
+        sheets = self._read_sheets(output.filepath)
+        self.assertEqual(len(sheets), 2)
+        self.assertIn('Joao', sheets[0])
+        self.assertIn('Maria', sheets[1])
+
+    def test_gen_part_filename_must_add_part_number_before_extension(self):
+        output = outputs.XLSXOutput()
+        self.assertEqual(output.gen_part_filename('/tmp/report-2016-05-16-a1b2c3d.xlsx', 2),
+                         '/tmp/report-2016-05-16-a1b2c3d-part-0002.xlsx')
+
 
 class BaseReportTestCase(TestCase):
 
@@ -544,6 +1676,7 @@ class BaseReportTestCase(TestCase):
     def _create_output(self):
         self.output_mocked = mock.MagicMock()
         self.output_mocked.name = None
+        self.output_mocked.filepaths = ['/tmp/report.tsv']
         self.output_mocked.__enter__.return_value = self.output_mocked
 
     def _patch(self, *args, **kwargs):
@@ -597,6 +1730,113 @@ class BaseReportTestCase(TestCase):
 
         self.assertEqual(self.output_mocked.out.mock_calls, calls)
 
+    def test_process_must_set_dataset_columns_on_outputs(self):
+        self.dataset_mocked.columns = ('name', 'age')
+
+        self.report.process()
+
+        self.assertEqual(self.output_mocked.columns, ('name', 'age'))
+
+    def test_has_row_cleaner_must_be_false_if_it_is_not_overridden(self):
+        self.assertFalse(self.report._has_row_cleaner())
+
+    def test_has_row_cleaner_must_be_true_if_it_is_overridden(self):
+        def my_row_cleaner(self, row):
+            return row
+
+        self.my_report_class.row_cleaner = my_row_cleaner
+
+        self.assertTrue(self.my_report_class()._has_row_cleaner())
+
+    def test_process_with_prefetch_must_write_all_rows_and_fill_stats(self):
+        self.report.prefetch = True
+        self.report.prefetch_batch_size = 1
+
+        self.report.process()
+
+        calls = [mock.call(i) for i in self.rows]
+        self.assertEqual(self.output_mocked.out.mock_calls, calls)
+        self.assertEqual(self.report.pipeline_stats['rows'], len(self.rows))
+
+    def test_process_with_thread_fanout_must_write_rows_in_all_outputs(self):
+        other_output_mocked = mock.MagicMock()
+        other_output_mocked.filepaths = ['/tmp/other-report.tsv']
+        other_output_mocked.__enter__.return_value = other_output_mocked
+
+        self.report.outputs = [self.output_mocked, other_output_mocked]
+        self.report.fanout = pipeline.FANOUT_THREAD
+
+        self.report.process()
+
+        for output in (self.output_mocked, other_output_mocked):
+            output.header.assert_called_once_with(self.header)
+            output.out_many.assert_called_once_with(self.rows)
+            output.footer.assert_called_once_with(self.footer)
+
+        self.assertEqual(self.report.output_filepaths,
+                         ['/tmp/report.tsv', '/tmp/other-report.tsv'])
+
+    def test_process_with_process_fanout_must_write_all_outputs(self):
+        self.report.outputs = [outputs.CSVOutput(), outputs.TSVOutput()]
+        self.report.fanout = pipeline.FANOUT_PROCESS
+
+        self.report.process()
+
+        self.assertEqual(len(self.report.output_filepaths), 2)
+        for filepath in self.report.output_filepaths:
+            self.addCleanup(os.remove, filepath)
+            with open(filepath) as f:
+                self.assertEqual(len(f.read().splitlines()), 4)
+
+    def test_process_with_batch_size_must_write_batches_in_outputs(self):
+        self.report.batch_size = 1
+
+        self.report.process()
+
+        calls = [mock.call([i]) for i in self.rows]
+        self.assertEqual(self.output_mocked.out_many.mock_calls, calls)
+        self.assertFalse(self.output_mocked.out.called)
+
+    def test_process_must_use_clean_batch_if_it_is_overridden(self):
+        def my_clean_batch(self, rows):
+            return [(name.upper(), age) for name, age in rows]
+
+        self.my_report_class.clean_batch = my_clean_batch
+
+        self.report = self.my_report_class(params=self.params)
+        self.report.process()
+
+        self.output_mocked.out_many.assert_called_once_with([('ALISSON', 38), ('JOAO', 13)])
+
+    def test_clean_batch_must_use_row_cleaner_by_default(self):
+        def my_row_cleaner(self, row):
+            return ('Marcondes', 18)
+
+        self.my_report_class.row_cleaner = my_row_cleaner
+
+        self.report = self.my_report_class(params=self.params)
+
+        self.assertEqual(self.report.clean_batch(self.rows), [('Marcondes', 18)] * 2)
+
+    def test_process_with_columnar_must_write_row_batches_from_dataset(self):
+        batch = batches.RowBatch.from_rows(('name', 'age'), self.rows)
+        self.dataset_mocked.iterate_batches.return_value = [batch]
+
+        def my_clean_batch(self, batch):
+            batch['age'] = [i + 1 for i in batch['age']]
+            return batch
+
+        self.my_report_class.clean_batch = my_clean_batch
+        self.my_report_class.columnar = True
+
+        self.report = self.my_report_class(params=self.params)
+        self.report.process()
+
+        self.dataset_mocked.iterate_batches.assert_called_once_with(params=self.params,
+                                                                    batch_size=1000)
+        written = self.output_mocked.out_many.call_args[0][0]
+        self.assertEqual(list(written), [('Alisson', 39), ('Joao', 14)])
+
     def test_process_must_set_report_name_on_outputs(self):
         self.assertIsNone(self.output_mocked.name)
 
@@ -605,6 +1845,133 @@ class BaseReportTestCase(TestCase):
 
         self.assertEqual(self.output_mocked.name, self.report.name)
 
+    def test_process_with_sink_must_set_sink_on_outputs_while_processing(self):
+        sink = sinks.LocalDirectorySink('/tmp/reports')
+        self.output_mocked.sink = None
+
+        sinks_used = []
+        self.output_mocked.header.side_effect = lambda header: sinks_used.append(
+            self.output_mocked.sink)
+
+        self.report = self.my_report_class(params=self.params)
+        self.report.sink = sink
+        self.report.process()
+
+        self.assertEqual(sinks_used, [sink])
+        self.assertIsNone(self.output_mocked.sink)
+        self.assertEqual(self.report.sink_filepaths, ['/tmp/report.tsv'])
+
+    def test_process_without_sink_must_not_return_sink_filepaths(self):
+        self.output_mocked.sink = None
+
+        self.report = self.my_report_class(params=self.params)
+        self.report.process()
+
+        self.assertEqual(self.report.output_filepaths, ['/tmp/report.tsv'])
+        self.assertEqual(self.report.sink_filepaths, [])
+
+
+class SinksTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.tmpdir = os.path.join(self.directory, 'tmp')
+        os.makedirs(self.tmpdir)
+        patcher = mock.patch('onmydesk.core.outputs.tempfile.gettempdir',
+                             return_value=self.tmpdir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, output, sink):
+        output.sink = sink
+        with output:
+            output.header(('Name', 'Age'))
+            output.out(('Alisson', 38))
+
+        # Nothing is left in temporary directory
+        self.assertEqual(os.listdir(self.tmpdir), [])
+        return output
+
+    def test_local_directory_sink_must_receive_streamed_files(self):
+        import gzip
+
+        sink = sinks.LocalDirectorySink(os.path.join(self.directory, 'reports'))
+
+        output = self._write(outputs.CSVOutput(), sink)
+        compressed = self._write(outputs.CSVOutput(compression=outputs.COMPRESSION_GZIP), sink)
+
+        self.assertEqual(os.path.dirname(output.filepath), sink.directory)
+        with open(output.filepath) as f:
+            self.assertEqual(f.read().splitlines(), ['Name,Age', 'Alisson,38'])
+        with gzip.open(compressed.filepath, 'rt') as f:
+            self.assertEqual(f.read().splitlines(), ['Name,Age', 'Alisson,38'])
+
+    def test_local_directory_sink_must_receive_finished_local_files(self):
+        sink = sinks.LocalDirectorySink(self.directory)
+
+        output = self._write(outputs.XLSXOutput(), sink)
+
+        self.assertEqual(output.filepaths, [output.filepath])
+        self.assertEqual(os.path.dirname(output.filepath), self.directory)
+        self.assertTrue(zipfile.is_zipfile(output.filepath))
+
+    def test_storage_sink_must_store_files_in_storage(self):
+        from django.core.files.storage import FileSystemStorage
+
+        storage = FileSystemStorage(location=self.directory)
+        sink = sinks.StorageSink(storage, prefix='reports/')
+
+        output = self._write(outputs.TSVOutput(), sink)
+
+        self.assertTrue(output.filepath.startswith('reports/'))
+        with storage.open(output.filepath) as f:
+            self.assertEqual(f.read().splitlines(), [b'Name\tAge', b'Alisson\t38'])
+
+    def test_reports_sharing_outputs_must_not_share_sinks(self):
+        dataset = mock.MagicMock()
+        dataset.__enter__.return_value = dataset
+        dataset.iterate.side_effect = lambda params: iter([('Alisson', 38)])
+        shared_outputs = (outputs.TSVOutput(),)
+
+        sink = sinks.LocalDirectorySink(os.path.join(self.directory, 'reports'))
+        report_with_sink = type('ReportA', (reports.BaseReport,),
+                                dict(name='a', dataset=dataset, outputs=shared_outputs,
+                                     sink=sink))()
+        report_without_sink = type('ReportB', (reports.BaseReport,),
+                                   dict(name='b', dataset=dataset, outputs=shared_outputs))()
+
+        report_with_sink.process()
+        report_without_sink.process()
+
+        filepath, = report_without_sink.output_filepaths
+        self.assertEqual(os.path.dirname(report_with_sink.output_filepaths[0]),
+                         sink.directory)
+        self.assertEqual(os.path.dirname(filepath), self.tmpdir)
+        self.assertEqual(report_without_sink.sink_filepaths, [])
+
+    def test_file_object_sink_must_write_in_file_objects_from_factory(self):
+        import io
+
+        written = {}
+
+        class Writer(io.BytesIO):
+            def __init__(self, location):
+                super(Writer, self).__init__()
+                self.location = location
+
+            def close(self):
+                written[self.location] = self.getvalue()
+                super(Writer, self).close()
+
+        sink = sinks.FileObjectSink(Writer, location_format='s3://bucket/{filename}')
+
+        output = self._write(outputs.JSONLinesOutput(), sink)
+
+        self.assertTrue(output.filepath.startswith('s3://bucket/'))
+        self.assertEqual(written, {output.filepath: b'{"Name":"Alisson","Age":38}\n'})
+
 
 class SQLReportTestCase(TestCase):
 
@@ -625,6 +1992,7 @@ class SQLReportTestCase(TestCase):
     def _create_output(self):
         self.output_mocked = mock.MagicMock()
         self.output_mocked.filepath = '/tmp/asjkdlajksdlakjdlakjsdljalksdjla.tsv'
+        self.output_mocked.filepaths = [self.output_mocked.filepath]
         self.output_mocked.__enter__ = mock.MagicMock(
             return_value=self.output_mocked)
 
@@ -657,7 +2025,25 @@ class SQLReportTestCase(TestCase):
         report.dataset
 
         self.sqldataset_class_mocked.assert_called_once_with(
-            report.query, report.query_params, 'my-db-alias')
+            report.query, report.query_params, 'my-db-alias',
+            fetch_size=report.fetch_size,
+            server_side=False,
+            itersize=report.itersize,
+            row_mode=report.row_mode)
+
+    def test_dataset_attr_must_return_dataset_with_server_side_cursor_from_report(self):
+        report = self._create_report()
+        report.server_side_cursor = True
+        report.itersize = 500
+
+        report.dataset
+
+        self.sqldataset_class_mocked.assert_called_once_with(
+            report.query, report.query_params, None,
+            fetch_size=report.fetch_size,
+            server_side=True,
+            itersize=500,
+            row_mode=report.row_mode)
 
     def _create_report(self):
         report = reports.SQLReport()
@@ -667,3 +2053,223 @@ class SQLReportTestCase(TestCase):
         report.footer = ('Footer',)
 
         return report
+
+
+class SQLReportColumnarTestCase(TestCase):
+
+    def setUp(self):
+        User.objects.create(username='alisson', first_name='Alisson')
+        User.objects.create(username='joao', first_name='Joao')
+
+    def _process(self, output):
+        def clean_batch(self, batch):
+            batch['name_size'] = [len(name) for name in batch['first_name']]
+            return batch
+
+        report = type('UsersReport', (reports.SQLReport,), dict(
+            name='Users', columnar=True, outputs=(output,), clean_batch=clean_batch,
+            query='SELECT username, first_name FROM auth_user ORDER BY id'))()
+        report.process()
+
+        filepath, = report.output_filepaths
+        self.addCleanup(os.remove, filepath)
+        return filepath
+
+    def test_process_must_write_computed_columns_in_jsonlines(self):
+        import json
+
+        filepath = self._process(outputs.JSONLinesOutput())
+
+        with open(filepath) as f:
+            rows = [json.loads(line) for line in f]
+
+        self.assertEqual(rows, [
+            {'username': 'alisson', 'first_name': 'Alisson', 'name_size': 7},
+            {'username': 'joao', 'first_name': 'Joao', 'name_size': 4},
+        ])
+
+    @skipIf(outputs.pyarrow is None, 'pyarrow is not installed')
+    def test_process_must_write_computed_columns_in_parquet(self):
+        filepath = self._process(outputs.ParquetOutput())
+
+        table = outputs.pyarrow.parquet.read_table(filepath)
+        self.assertEqual(table.column_names, ['username', 'first_name', 'name_size'])
+        self.assertEqual(table.column('name_size').to_pylist(), [7, 4])
+
+    def test_process_must_write_computed_columns_in_sqlite(self):
+        import sqlite3
+
+        filepath = self._process(outputs.SQLiteOutput())
+
+        conn = sqlite3.connect(filepath)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT username, name_size FROM report').fetchall(),
+                         [('alisson', 7), ('joao', 4)])
+
+
+class KeysetSQLReportResumeTestCase(TransactionTestCase):
+    """Reports are processed with prefetch threads, so they need committed rows."""
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user_{}'.format(i)) for i in range(6)]
+
+    def _create_report(self, fail_on=None, **attrs):
+        attrs.update(self._get_cleaners(fail_on, attrs.get('columnar')))
+        attrs.update(name='Users', key='id', page_size=2,
+                     query='SELECT id, username FROM auth_user',
+                     outputs=(outputs.CSVOutput(),))
+
+        return type('UsersReport', (reports.KeysetSQLReport,), attrs)()
+
+    def _get_cleaners(self, fail_on, columnar):
+        """Return cleaners raising an error on the row of user `fail_on`."""
+        def row_cleaner(self, row):
+            if row['username'] == fail_on:
+                raise ValueError('Bad row')
+            return row
+
+        def clean_batch(self, batch):
+            if fail_on in list(batch['username']):
+                raise ValueError('Bad batch')
+            return batch
+
+        return {'clean_batch': clean_batch} if columnar else {'row_cleaner': row_cleaner}
+
+    def _read(self, report):
+        filepath, = report.output_filepaths
+        self.addCleanup(os.remove, filepath)
+        with open(filepath) as f:
+            return [line.split(',')[1] for line in f.read().splitlines()]
+
+    def _process_and_resume(self, **attrs):
+        report = self._create_report(fail_on='user_4', **attrs)
+        with self.assertRaises(ValueError):
+            report.process()
+
+        resumed = self._create_report(**attrs)
+        resumed.start_after = report.last_key
+        resumed.process()
+
+        return report, resumed
+
+    def test_process_failed_must_be_resumed_from_last_key(self):
+        report, resumed = self._process_and_resume()
+
+        self.assertEqual(report.last_key, self.users[3].id)
+        self.assertEqual(self._read(resumed), ['user_4', 'user_5'])
+        self.assertEqual(resumed.last_key, self.users[-1].id)
+
+    def test_process_failed_with_prefetch_and_batches_must_be_resumed_from_last_key(self):
+        # Prefetch reads all rows ahead, a batch of 3 rows fails
+        report, resumed = self._process_and_resume(prefetch=True, prefetch_batch_size=10,
+                                                   batch_size=3)
+
+        self.assertEqual(report.last_key, self.users[2].id)
+        self.assertEqual(self._read(resumed), ['user_3', 'user_4', 'user_5'])
+
+    def test_process_failed_with_columnar_must_be_resumed_from_last_key(self):
+        report, resumed = self._process_and_resume(columnar=True, batch_size=2)
+
+        self.assertEqual(report.last_key, self.users[3].id)
+        self.assertIsInstance(report.last_key, int)
+        self.assertEqual(self._read(resumed), ['user_4', 'user_5'])
+
+
+class KeysetSQLReportTestCase(TestCase):
+
+    def test_dataset_attr_must_return_dataset_with_report_attributes(self):
+        report = reports.KeysetSQLReport()
+        report.query = 'SELECT * FROM test_table'
+        report.key = 'id'
+        report.page_size = 50
+        report.start_after = 10
+
+        with mock.patch('onmydesk.core.reports.datasets.KeysetSQLDataset') as dataset_class_mocked:
+            report.dataset
+
+        dataset_class_mocked.assert_called_once_with(
+            report.query, 'id', report.query_params, None,
+            page_size=50,
+            start_after=10,
+            row_mode=report.row_mode)
+
+
+class PartitionedSQLReportTestCase(TestCase):
+
+    def test_dataset_attr_must_return_dataset_with_report_partitions(self):
+        report = reports.PartitionedSQLReport()
+        report.query = 'SELECT * FROM test_table WHERE id >= %s AND id < %s'
+        report.get_partitions = mock.MagicMock(return_value=[(1, 10), (10, 20)])
+        report.workers = 4
+        report.ordered = False
+
+        with mock.patch('onmydesk.core.reports.datasets.PartitionedSQLDataset') as dataset_class_mocked:
+            report.dataset
+
+        dataset_class_mocked.assert_called_once_with(
+            report.query, [(1, 10), (10, 20)], report.query_params, None,
+            workers=4,
+            ordered=False,
+            fetch_size=report.fetch_size,
+            row_mode=report.row_mode)
+
+
+class QuerySetReportPrefetchTestCase(TransactionTestCase):
+
+    def test_process_with_prefetch_must_write_queryset_rows(self):
+        User.objects.create(username='alisson')
+        User.objects.create(username='joao')
+
+        report = type('UsersReport', (reports.QuerySetReport,),
+                      dict(name='Users', queryset=User.objects.order_by('id'),
+                           fields=('username',), prefetch=True,
+                           outputs=(outputs.CSVOutput(),)))()
+        report.process()
+
+        filepath, = report.output_filepaths
+        self.addCleanup(os.remove, filepath)
+        with open(filepath) as f:
+            self.assertEqual(f.read().splitlines(), ['alisson', 'joao'])
+
+
+class QuerySetReportTestCase(TestCase):
+
+    def setUp(self):
+        self.queryset_dataset_class_mocked = self.patch(
+            'onmydesk.core.reports.datasets.QuerySetDataset')
+
+    def patch(self, *args, **kwargs):
+        patcher = mock.patch(*args, **kwargs)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def test_dataset_attr_must_return_dataset_with_report_attributes(self):
+        report = reports.QuerySetReport()
+        report.queryset = mock.MagicMock()
+        report.fields = ('username', 'email')
+        report.select_related = ('profile',)
+        report.only = ('username',)
+        report.chunk_size = 100
+        report.db_alias = 'my-db-alias'
+
+        report.dataset
+
+        self.queryset_dataset_class_mocked.assert_called_once_with(
+            report.queryset.all.return_value,
+            fields=('username', 'email'),
+            chunk_size=100,
+            select_related=('profile',),
+            only=('username',),
+            db_alias='my-db-alias',
+            row_mode=report.row_mode)
+
+    def test_dataset_attr_must_use_get_queryset(self):
+        queryset = mock.MagicMock()
+
+        report = reports.QuerySetReport()
+        report.get_queryset = mock.MagicMock(return_value=queryset)
+
+        report.dataset
+
+        self.assertEqual(self.queryset_dataset_class_mocked.call_args[0][0], queryset)
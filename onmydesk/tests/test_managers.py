@@ -1,9 +1,216 @@
 """Testing managers from library."""
 
-from datetime import date
+from datetime import date, timedelta
 from django.test import TestCase
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
 
-from onmydesk.models import Scheduler
+from onmydesk.models import Report, Scheduler
+
+
+class ReportManagerTestCase(TestCase):
+
+    def setUp(self):
+        self.reports = [Report.objects.create(report='my_report_class') for i in range(3)]
+        Report.objects.create(report='my_report_class', status=Report.STATUS_PROCESSED)
+
+    def test_pending_must_return_pending_reports_older_first(self):
+        self.assertEqual(list(Report.objects.pending()), self.reports)
+
+    def test_claim_must_move_reports_to_processing(self):
+        claimed = Report.objects.claim(limit=2)
+
+        self.assertEqual(claimed, self.reports[:2])
+        for report in claimed:
+            self.assertEqual(report.status, Report.STATUS_PROCESSING)
+
+        self.assertEqual(list(Report.objects.pending()), self.reports[2:])
+
+    def test_claim_must_not_return_claimed_reports_again(self):
+        first = Report.objects.claim(limit=2)
+        second = Report.objects.claim(limit=2)
+        third = Report.objects.claim(limit=2)
+
+        self.assertEqual(first + second, self.reports)
+        self.assertEqual(third, [])
+
+    def test_claim_with_ids_must_claim_only_given_reports(self):
+        claimed = Report.objects.claim(limit=10, ids=[self.reports[1].id])
+        self.assertEqual(claimed, [self.reports[1]])
+
+    def test_claim_must_skip_reports_claimed_by_other_worker(self):
+        other_worker_claimed = []
+        original_update = Report.objects.filter(id=self.reports[0].id).update
+
+        def update_claimed_by_other_worker(**kwargs):
+            # Other worker claims first report between select and update
+            other_worker_claimed.append(original_update(**kwargs))
+            return 0
+
+        queryset = mock.MagicMock()
+        queryset.update.side_effect = update_claimed_by_other_worker
+
+        original_filter = Report.objects.filter
+
+        def filter_mocked(*args, **kwargs):
+            if kwargs.get('id') == self.reports[0].id:
+                return queryset
+            return original_filter(*args, **kwargs)
+
+        with mock.patch.object(Report.objects, 'filter', side_effect=filter_mocked):
+            claimed = Report.objects.claim(limit=1)
+
+        self.assertEqual(other_worker_claimed, [1])
+        self.assertEqual(claimed, [self.reports[1]])
+
+    def test_claim_with_skip_locked_support_must_use_select_for_update(self):
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True,
+                               create=True):
+            with mock.patch('onmydesk.managers.models.QuerySet.select_for_update',
+                            autospec=True, side_effect=lambda qs, **kwargs: qs) as sfu_mocked:
+                claimed = Report.objects.claim(limit=2)
+
+        self.assertEqual(claimed, self.reports[:2])
+        self.assertEqual(sfu_mocked.call_args[1], {'skip_locked': True})
+
+    def test_claim_with_skip_locked_support_must_skip_locked_reports(self):
+        def select_for_update(queryset, **kwargs):
+            # First report is locked by other worker
+            return queryset.exclude(id=self.reports[0].id)
+
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True,
+                               create=True):
+            with mock.patch('onmydesk.managers.models.QuerySet.select_for_update',
+                            autospec=True, side_effect=select_for_update):
+                claimed = Report.objects.claim(limit=1)
+
+        self.assertEqual([r.id for r in claimed], [self.reports[1].id])
+
+
+class ReportManagerSchedulingTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user{}'.format(i)) for i in range(2)]
+
+    def _patch(self, *args, **kwargs):
+        patcher = mock.patch(*args, **kwargs)
+        thing = patcher.start()
+        self.addCleanup(patcher.stop)
+        return thing
+
+    def _create_reports(self, count, **kwargs):
+        kwargs.setdefault('report', 'my_report_class')
+        return [Report.objects.create(**kwargs) for i in range(count)]
+
+    def assertReports(self, reports, expected):
+        self.assertEqual([r.id for r in reports], [r.id for r in expected])
+
+    def test_claim_must_claim_lower_priority_values_first(self):
+        normal = self._create_reports(1)
+        low = self._create_reports(1, priority=Report.PRIORITY_LOW)
+        high = self._create_reports(1, priority=Report.PRIORITY_HIGH)
+
+        self.assertReports(Report.objects.claim(limit=3), high + normal + low)
+
+    def test_claim_must_share_workers_between_users(self):
+        heavy_user_reports = self._create_reports(3, created_by=self.users[0])
+        other_reports = self._create_reports(2, created_by=self.users[1])
+
+        claimed = Report.objects.claim(limit=5)
+
+        self.assertReports(claimed, [
+            heavy_user_reports[0], other_reports[0],
+            heavy_user_reports[1], other_reports[1],
+            heavy_user_reports[2],
+        ])
+
+    def test_claim_must_consider_reports_processing_by_other_workers(self):
+        self._create_reports(1, created_by=self.users[0], status=Report.STATUS_PROCESSING)
+        heavy_user_reports = self._create_reports(2, created_by=self.users[0])
+        other_reports = self._create_reports(1, created_by=self.users[1])
+
+        claimed = Report.objects.claim(limit=2)
+
+        self.assertReports(claimed, other_reports + heavy_user_reports[:1])
+
+    def test_claim_must_not_share_workers_over_priorities(self):
+        self._create_reports(1, created_by=self.users[0], status=Report.STATUS_PROCESSING)
+        high = self._create_reports(1, created_by=self.users[0],
+                                    priority=Report.PRIORITY_HIGH)
+        self._create_reports(1, created_by=self.users[1])
+
+        self.assertReports(Report.objects.claim(limit=1), high)
+
+    def test_claim_must_share_workers_between_report_classes(self):
+        self._patch('onmydesk.managers.app_settings.ONMYDESK_FAIR_SHARE_BY', 'report')
+
+        first_class_reports = self._create_reports(2, report='first_report_class')
+        second_class_reports = self._create_reports(1, report='second_report_class')
+
+        claimed = Report.objects.claim(limit=3)
+
+        self.assertReports(claimed, [
+            first_class_reports[0], second_class_reports[0], first_class_reports[1],
+        ])
+
+    def test_claim_without_fair_share_must_claim_older_first(self):
+        self._patch('onmydesk.managers.app_settings.ONMYDESK_FAIR_SHARE_BY', None)
+
+        reports = self._create_reports(2, created_by=self.users[0])
+        reports += self._create_reports(1, created_by=self.users[1])
+
+        self.assertReports(Report.objects.claim(limit=3), reports)
+
+    def test_claim_must_respect_max_concurrent_by_report(self):
+        self._patch('onmydesk.managers.app_settings.ONMYDESK_MAX_CONCURRENT_BY_REPORT',
+                    {'huge_report_class': 2})
+
+        self._create_reports(1, report='huge_report_class', status=Report.STATUS_PROCESSING)
+        huge_reports = self._create_reports(3, report='huge_report_class')
+        other_reports = self._create_reports(1, created_by=self.users[0])
+
+        claimed = Report.objects.claim(limit=5)
+
+        self.assertReports(claimed, other_reports + huge_reports[:1])
+        self.assertReports(list(Report.objects.pending()), huge_reports[1:])
+
+    def _create_stuck_reports(self, count, **kwargs):
+        reports = self._create_reports(count, status=Report.STATUS_PROCESSING, **kwargs)
+        # update_date is auto_now, so it's changed with a queryset update
+        Report.objects.filter(id__in=[r.id for r in reports]).update(
+            update_date=timezone.now() - timedelta(hours=13))
+        return reports
+
+    def test_claim_must_not_count_reports_stuck_in_processing_for_max_concurrent(self):
+        self._patch('onmydesk.managers.app_settings.ONMYDESK_MAX_CONCURRENT_BY_REPORT',
+                    {'huge_report_class': 1})
+
+        self._create_stuck_reports(1, report='huge_report_class')
+        huge_reports = self._create_reports(2, report='huge_report_class')
+
+        self.assertReports(Report.objects.claim(limit=2), huge_reports[:1])
+
+    def test_claim_must_not_count_reports_stuck_in_processing_for_fair_share(self):
+        self._create_stuck_reports(2, created_by=self.users[0])
+        heavy_user_reports = self._create_reports(1, created_by=self.users[0])
+        self._create_reports(1, created_by=self.users[1])
+
+        self.assertReports(Report.objects.claim(limit=1), heavy_user_reports)
+
+    def test_claim_without_processing_timeout_must_count_every_report_in_processing(self):
+        self._patch('onmydesk.managers.app_settings.ONMYDESK_MAX_CONCURRENT_BY_REPORT',
+                    {'huge_report_class': 1})
+        self._patch('onmydesk.managers.app_settings.ONMYDESK_PROCESSING_TIMEOUT', None)
+
+        self._create_stuck_reports(1, report='huge_report_class')
+        self._create_reports(1, report='huge_report_class')
+
+        self.assertEqual(Report.objects.claim(limit=1), [])
 
 
 class SchedulerManagerTestCase(TestCase):
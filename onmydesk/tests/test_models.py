@@ -4,6 +4,8 @@ import base64
 import pickle
 from datetime import datetime, date
 from decimal import Decimal, getcontext
+from unittest import skipIf
+
 from django.test import TestCase
 try:
     from unittest import mock
@@ -11,6 +13,8 @@ except ImportError:
     import mock
 from django import forms
 from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
 
 from onmydesk.models import (Report, Scheduler, ReportNotSavedException,
                              output_file_handler)
@@ -89,6 +93,18 @@ class ReportTestCase(TestCase):
         self.assertEqual(
             report.results, ';'.join(self.report_instance.output_filepaths))
 
+    def test_process_must_not_handle_files_stored_by_sink(self):
+        self.patch('onmydesk.models.output_file_handler', lambda filepath: 'handled')
+
+        self.report_instance.output_filepaths = ['/tmp/flunfa.tsv', 'reports/flunfa.csv']
+        self.report_instance.sink_filepaths = ['reports/flunfa.csv']
+
+        report = Report(report='my_report_class')
+        report.save()
+        report.process()
+
+        self.assertEqual(report.results, 'handled;reports/flunfa.csv')
+
     def test_process_with_params_must_call_report_constructor_with_these_params(self):
         report = Report(report='my_report_class')
 
@@ -216,6 +232,56 @@ class ReportTestCase(TestCase):
         return thing
 
 
+@skipIf(connection.vendor != 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class ReportIndexesTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='joao')
+
+    def _explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            # Last column is the detail, e.g. "SEARCH onmydesk_report USING INDEX ..."
+            return [row[-1] for row in cursor.fetchall()]
+
+    def _get_index(self, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Report._meta.db_table)
+
+        for name, constraint in constraints.items():
+            if constraint['index'] and constraint['columns'] == columns:
+                return name
+
+        self.fail('No index with columns {}'.format(columns))
+
+    def assertUsesIndex(self, queryset, columns):
+        plan = self._explain(queryset)
+        index = self._get_index(columns)
+
+        self.assertTrue(any(index in detail for detail in plan), plan)
+        self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+
+    def test_pending_reports_must_use_status_index(self):
+        self.assertUsesIndex(Report.objects.pending(), ['status', 'priority', 'id'])
+
+    def test_processing_reports_by_user_must_use_status_index(self):
+        queryset = Report.objects.filter(status=Report.STATUS_PROCESSING)
+        plan = self._explain(queryset.values('created_by').annotate(count=Count('id')))
+
+        index = self._get_index(['status', 'priority', 'id'])
+        self.assertTrue(any(index in detail for detail in plan), plan)
+
+    def test_admin_reports_list_must_use_created_by_and_insert_date_index(self):
+        # Same queryset of ReportAdmin.get_queryset (admin isn't installed on tests)
+        queryset = Report.objects.filter(created_by=self.user).order_by('-insert_date')
+
+        self.assertUsesIndex(queryset[:100], ['created_by_id', 'insert_date'])
+
+    def test_reports_list_must_use_insert_date_index(self):
+        self.assertUsesIndex(Report.objects.order_by('-insert_date')[:100], ['insert_date'])
+
+
 class SchedulerTestCase(TestCase):
 
     def setUp(self):
@@ -24,6 +24,9 @@ setup(
         'awesome-slugify==1.6.5',
         'contextlib2==0.5.3',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],  # Used by ParquetOutput
+    },
     keywords=['report', 'reporting', 'django'],
     classifiers=[
         'Development Status :: 3 - Alpha',